@@ -7,6 +7,7 @@ from sqlalchemy import pool
 from alembic import context
 
 from app.users.models import User
+from app.audit.models import AuditLog
 from app.config import Base
 from app.config.settings import get_settings
 
@@ -62,7 +63,18 @@ def run_migrations_online() -> None:
     In this scenario we need to create an Engine
     and associate a connection with the context.
 
+    A caller that already holds a connection (the integration test harness)
+    passes it as ``config.attributes["connection"]`` and it is used as is.
+
     """
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        context.configure(connection=connection, target_metadata=target_metadata)
+
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
     # Get the database URL from settings
     settings = get_settings()
     database_url = settings.DATABASE_URL
@@ -0,0 +1,65 @@
+"""user search indexes
+
+Revision ID: 31ee0292bea4
+Revises: ee12503af886
+Create Date: 2026-10-19 11:02:41.318205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '31ee0292bea4'
+down_revision: Union[str, Sequence[str], None] = 'ee12503af886'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# lower() expression indexes used by UserRepo.search_users:
+# text_pattern_ops btrees serve `LIKE 'term%'`, trigram GIN serves `LIKE '%term%'`
+SEARCH_COLUMNS = ('email', 'name', 'surname')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # CONCURRENTLY can't run inside the migration transaction, but keeps the
+    # users table writable while building on large installs
+    with op.get_context().autocommit_block():
+        for column in SEARCH_COLUMNS:
+            op.create_index(
+                f'ix_users_{column}_lower_prefix',
+                'users',
+                [sa.text(f'lower({column}) text_pattern_ops')],
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+            op.create_index(
+                f'ix_users_{column}_lower_trgm',
+                'users',
+                [sa.text(f'lower({column}) gin_trgm_ops')],
+                postgresql_using='gin',
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for column in SEARCH_COLUMNS:
+            op.drop_index(
+                f'ix_users_{column}_lower_trgm',
+                table_name='users',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+            op.drop_index(
+                f'ix_users_{column}_lower_prefix',
+                table_name='users',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
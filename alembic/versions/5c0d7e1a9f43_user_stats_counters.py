@@ -0,0 +1,114 @@
+"""user stats counters
+
+Revision ID: 5c0d7e1a9f43
+Revises: 31ee0292bea4
+Create Date: 2026-10-19 11:40:12.902113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c0d7e1a9f43'
+down_revision: Union[str, Sequence[str], None] = '31ee0292bea4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Statement-level triggers with transition tables: a bulk DELETE from the
+# cleanup task touches each (status, role) counter once, not once per row.
+# Signups per day only ever grow, deletes don't rewrite history.
+STATS_FUNCTION = """
+CREATE OR REPLACE FUNCTION users_maintain_stats() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO user_status_counts (status, role, count)
+        SELECT status, COALESCE(role, 'user'), count(*) FROM new_rows GROUP BY 1, 2
+        ON CONFLICT (status, role) DO UPDATE
+            SET count = user_status_counts.count + EXCLUDED.count;
+
+        INSERT INTO user_signups_daily (day, signups)
+        SELECT (created_at AT TIME ZONE 'UTC')::date, count(*) FROM new_rows GROUP BY 1
+        ON CONFLICT (day) DO UPDATE
+            SET signups = user_signups_daily.signups + EXCLUDED.signups;
+
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO user_status_counts (status, role, count)
+        SELECT status, role, sum(delta) FROM (
+            SELECT status, COALESCE(role, 'user') AS role, -1 AS delta FROM old_rows
+            UNION ALL
+            SELECT status, COALESCE(role, 'user'), 1 FROM new_rows
+        ) changes
+        GROUP BY 1, 2
+        HAVING sum(delta) <> 0
+        ON CONFLICT (status, role) DO UPDATE
+            SET count = user_status_counts.count + EXCLUDED.count;
+
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO user_status_counts (status, role, count)
+        SELECT status, COALESCE(role, 'user'), -count(*) FROM old_rows GROUP BY 1, 2
+        ON CONFLICT (status, role) DO UPDATE
+            SET count = user_status_counts.count + EXCLUDED.count;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_status_counts',
+    sa.Column('status', postgresql.ENUM(name='userstatus', create_type=False), nullable=False),
+    sa.Column('role', postgresql.ENUM(name='userrole', create_type=False), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('status', 'role')
+    )
+    op.create_table('user_signups_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('signups', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+
+    op.execute(STATS_FUNCTION)
+    op.execute("""
+        CREATE TRIGGER users_stats_insert AFTER INSERT ON users
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION users_maintain_stats()
+    """)
+    op.execute("""
+        CREATE TRIGGER users_stats_update AFTER UPDATE ON users
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION users_maintain_stats()
+    """)
+    op.execute("""
+        CREATE TRIGGER users_stats_delete AFTER DELETE ON users
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION users_maintain_stats()
+    """)
+
+    # backfill from the existing rows, in the same transaction as the triggers
+    op.execute("""
+        INSERT INTO user_status_counts (status, role, count)
+        SELECT status, COALESCE(role, 'user'), count(*) FROM users GROUP BY 1, 2
+    """)
+    op.execute("""
+        INSERT INTO user_signups_daily (day, signups)
+        SELECT (created_at AT TIME ZONE 'UTC')::date, count(*) FROM users GROUP BY 1
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP TRIGGER IF EXISTS users_stats_delete ON users')
+    op.execute('DROP TRIGGER IF EXISTS users_stats_update ON users')
+    op.execute('DROP TRIGGER IF EXISTS users_stats_insert ON users')
+    op.execute('DROP FUNCTION IF EXISTS users_maintain_stats()')
+    op.drop_table('user_signups_daily')
+    op.drop_table('user_status_counts')
@@ -0,0 +1,39 @@
+"""user events outbox
+
+Revision ID: 9d2a4b7c1e05
+Revises: 5c0d7e1a9f43
+Create Date: 2026-10-19 13:12:37.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d2a4b7c1e05'
+down_revision: Union[str, Sequence[str], None] = '5c0d7e1a9f43'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_events',
+    sa.Column('id', sa.BigInteger(), sa.Identity(always=False), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('type', sa.String(length=32), nullable=False),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('published_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_user_events_unpublished', 'user_events', ['id'], unique=False, postgresql_where=sa.text('published_at IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_events_unpublished', table_name='user_events', postgresql_where=sa.text('published_at IS NULL'))
+    op.drop_table('user_events')
@@ -0,0 +1,159 @@
+"""user soft delete
+
+Revision ID: b41f6c8d2e17
+Revises: 9d2a4b7c1e05
+Create Date: 2026-10-19 14:05:51.663120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41f6c8d2e17'
+down_revision: Union[str, Sequence[str], None] = '9d2a4b7c1e05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Same triggers as 5c0d7e1a9f43, but only live rows count: setting deleted_at
+# moves a user out of the counters, and purging an already deleted row
+# doesn't decrement them a second time.
+STATS_FUNCTION = """
+CREATE OR REPLACE FUNCTION users_maintain_stats() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO user_status_counts (status, role, count)
+        SELECT status, COALESCE(role, 'user'), count(*) FROM new_rows
+        WHERE deleted_at IS NULL GROUP BY 1, 2
+        ON CONFLICT (status, role) DO UPDATE
+            SET count = user_status_counts.count + EXCLUDED.count;
+
+        INSERT INTO user_signups_daily (day, signups)
+        SELECT (created_at AT TIME ZONE 'UTC')::date, count(*) FROM new_rows GROUP BY 1
+        ON CONFLICT (day) DO UPDATE
+            SET signups = user_signups_daily.signups + EXCLUDED.signups;
+
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO user_status_counts (status, role, count)
+        SELECT status, role, sum(delta) FROM (
+            SELECT status, COALESCE(role, 'user') AS role, -1 AS delta FROM old_rows
+            WHERE deleted_at IS NULL
+            UNION ALL
+            SELECT status, COALESCE(role, 'user'), 1 FROM new_rows
+            WHERE deleted_at IS NULL
+        ) changes
+        GROUP BY 1, 2
+        HAVING sum(delta) <> 0
+        ON CONFLICT (status, role) DO UPDATE
+            SET count = user_status_counts.count + EXCLUDED.count;
+
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO user_status_counts (status, role, count)
+        SELECT status, COALESCE(role, 'user'), -count(*) FROM old_rows
+        WHERE deleted_at IS NULL GROUP BY 1, 2
+        ON CONFLICT (status, role) DO UPDATE
+            SET count = user_status_counts.count + EXCLUDED.count;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+"""
+
+# 5c0d7e1a9f43's version, for downgrade
+PREVIOUS_STATS_FUNCTION = """
+CREATE OR REPLACE FUNCTION users_maintain_stats() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO user_status_counts (status, role, count)
+        SELECT status, COALESCE(role, 'user'), count(*) FROM new_rows GROUP BY 1, 2
+        ON CONFLICT (status, role) DO UPDATE
+            SET count = user_status_counts.count + EXCLUDED.count;
+
+        INSERT INTO user_signups_daily (day, signups)
+        SELECT (created_at AT TIME ZONE 'UTC')::date, count(*) FROM new_rows GROUP BY 1
+        ON CONFLICT (day) DO UPDATE
+            SET signups = user_signups_daily.signups + EXCLUDED.signups;
+
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO user_status_counts (status, role, count)
+        SELECT status, role, sum(delta) FROM (
+            SELECT status, COALESCE(role, 'user') AS role, -1 AS delta FROM old_rows
+            UNION ALL
+            SELECT status, COALESCE(role, 'user'), 1 FROM new_rows
+        ) changes
+        GROUP BY 1, 2
+        HAVING sum(delta) <> 0
+        ON CONFLICT (status, role) DO UPDATE
+            SET count = user_status_counts.count + EXCLUDED.count;
+
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO user_status_counts (status, role, count)
+        SELECT status, COALESCE(role, 'user'), -count(*) FROM old_rows GROUP BY 1, 2
+        ON CONFLICT (status, role) DO UPDATE
+            SET count = user_status_counts.count + EXCLUDED.count;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # nullable without default: no table rewrite
+    op.add_column('users', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute(STATS_FUNCTION)
+
+    # built before the old index goes, so email stays unique throughout
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_users_email_live',
+            'users',
+            ['email'],
+            unique=True,
+            postgresql_where=sa.text('deleted_at IS NULL'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_users_deleted_at',
+            'users',
+            ['deleted_at'],
+            postgresql_where=sa.text('deleted_at IS NOT NULL'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            'ix_users_email',
+            table_name='users',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # emails are only unique among live users, and the old triggers would count the deleted rows
+    op.execute('DELETE FROM users WHERE deleted_at IS NOT NULL')
+    op.execute(PREVIOUS_STATS_FUNCTION)
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_users_email',
+            'users',
+            ['email'],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index('ix_users_deleted_at', table_name='users', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_users_email_live', table_name='users', postgresql_concurrently=True, if_exists=True)
+
+    op.drop_column('users', 'deleted_at')
@@ -0,0 +1,31 @@
+"""user activity columns
+
+Revision ID: c5a9e2f7b318
+Revises: b41f6c8d2e17
+Create Date: 2026-10-19 14:48:09.117342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a9e2f7b318'
+down_revision: Union[str, Sequence[str], None] = 'b41f6c8d2e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # deliberately unindexed: the write-behind flushes stay HOT updates
+    op.add_column('users', sa.Column('last_login_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('users', sa.Column('last_seen_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'last_seen_at')
+    op.drop_column('users', 'last_login_at')
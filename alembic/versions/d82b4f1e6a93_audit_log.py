@@ -0,0 +1,69 @@
+"""audit log
+
+Revision ID: d82b4f1e6a93
+Revises: c5a9e2f7b318
+Create Date: 2026-10-19 15:26:44.508231
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd82b4f1e6a93'
+down_revision: Union[str, Sequence[str], None] = 'c5a9e2f7b318'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# append-only: rows can be inserted and read, never changed or removed
+APPEND_ONLY_FUNCTION = """
+CREATE OR REPLACE FUNCTION audit_log_append_only() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    RAISE EXCEPTION 'audit_log is append-only, % is not allowed', TG_OP;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('audit_log',
+    sa.Column('id', sa.BigInteger(), sa.Identity(always=False), nullable=False),
+    sa.Column('occurred_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('action', sa.String(length=64), nullable=False),
+    sa.Column('actor_id', sa.UUID(), nullable=True),
+    sa.Column('target_id', sa.UUID(), nullable=True),
+    sa.Column('ip', sa.String(length=45), nullable=True),
+    sa.Column('request_id', sa.String(length=64), nullable=True),
+    sa.Column('details', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_audit_log_action', 'audit_log', ['action', 'id'], unique=False)
+    op.create_index('ix_audit_log_actor_id', 'audit_log', ['actor_id', 'id'], unique=False)
+    op.create_index('ix_audit_log_target_id', 'audit_log', ['target_id', 'id'], unique=False)
+
+    op.execute(APPEND_ONLY_FUNCTION)
+    op.execute("""
+        CREATE TRIGGER audit_log_append_only BEFORE UPDATE OR DELETE ON audit_log
+        FOR EACH STATEMENT EXECUTE FUNCTION audit_log_append_only()
+    """)
+    op.execute("""
+        CREATE TRIGGER audit_log_no_truncate BEFORE TRUNCATE ON audit_log
+        FOR EACH STATEMENT EXECUTE FUNCTION audit_log_append_only()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP TRIGGER IF EXISTS audit_log_no_truncate ON audit_log')
+    op.execute('DROP TRIGGER IF EXISTS audit_log_append_only ON audit_log')
+    op.execute('DROP FUNCTION IF EXISTS audit_log_append_only()')
+    op.drop_index('ix_audit_log_target_id', table_name='audit_log')
+    op.drop_index('ix_audit_log_actor_id', table_name='audit_log')
+    op.drop_index('ix_audit_log_action', table_name='audit_log')
+    op.drop_table('audit_log')
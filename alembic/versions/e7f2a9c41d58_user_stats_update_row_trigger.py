@@ -0,0 +1,75 @@
+"""user stats update row trigger
+
+Revision ID: e7f2a9c41d58
+Revises: d82b4f1e6a93
+Create Date: 2026-10-19 17:12:36.284519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7f2a9c41d58'
+down_revision: Union[str, Sequence[str], None] = 'd82b4f1e6a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The statement-level UPDATE trigger of 5c0d7e1a9f43 ran on every UPDATE of
+# users, the activity flushes included, materializing both transition tables
+# for a GROUP BY that found nothing to change. Transition tables can't be
+# combined with a column list, so updates are counted per row instead, and
+# only when status, role or deleted_at is set and a counter actually moves.
+# users_maintain_stats keeps its UPDATE branch for the downgrade.
+STATS_UPDATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION users_maintain_stats_row() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF OLD.deleted_at IS NULL THEN
+        INSERT INTO user_status_counts (status, role, count)
+        VALUES (OLD.status, COALESCE(OLD.role, 'user'), -1)
+        ON CONFLICT (status, role) DO UPDATE
+            SET count = user_status_counts.count + EXCLUDED.count;
+    END IF;
+
+    IF NEW.deleted_at IS NULL THEN
+        INSERT INTO user_status_counts (status, role, count)
+        VALUES (NEW.status, COALESCE(NEW.role, 'user'), 1)
+        ON CONFLICT (status, role) DO UPDATE
+            SET count = user_status_counts.count + EXCLUDED.count;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(STATS_UPDATE_FUNCTION)
+    op.execute('DROP TRIGGER IF EXISTS users_stats_update ON users')
+    op.execute("""
+        CREATE TRIGGER users_stats_update AFTER UPDATE OF status, role, deleted_at ON users
+        FOR EACH ROW
+        WHEN (
+            OLD.status IS DISTINCT FROM NEW.status
+            OR OLD.role IS DISTINCT FROM NEW.role
+            OR (OLD.deleted_at IS NULL) <> (NEW.deleted_at IS NULL)
+        )
+        EXECUTE FUNCTION users_maintain_stats_row()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP TRIGGER IF EXISTS users_stats_update ON users')
+    op.execute("""
+        CREATE TRIGGER users_stats_update AFTER UPDATE ON users
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION users_maintain_stats()
+    """)
+    op.execute('DROP FUNCTION IF EXISTS users_maintain_stats_row()')
@@ -0,0 +1,190 @@
+"""
+In-process audit buffer.
+
+`audit.record(...)` appends a row to a list and returns; it never waits on the
+database. A background task started from the app lifespan inserts the buffer
+every AUDIT_FLUSH_SECONDS (earlier once AUDIT_FLUSH_ROWS are pending) as
+multi-row INSERTs, in record order.
+
+Rows are not dropped: a failed insert keeps them buffered for the next flush,
+and whatever can't be inserted at shutdown, or doesn't fit in the buffer
+while the database is down, is spilled to a JSON lines file under
+AUDIT_SPILL_DIR. Workers insert spilled files on startup. Only a hard crash
+loses rows, at most one flush interval of them.
+"""
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+from uuid import UUID
+import asyncio
+import glob
+import json
+import logging
+import os
+import uuid
+
+from app.config.log import request_id_var
+from app.config.settings import get_settings
+
+from .models import AuditLog
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+SessionFactory = Callable[[], AsyncSession]
+
+
+def _client_ip(request) -> Optional[str]:
+    if request is None or request.client is None:
+        return None
+    return request.client.host
+
+
+def _dump(row: dict) -> str:
+    return json.dumps({**row, "occurred_at": row["occurred_at"].isoformat()}, default=str)
+
+
+def _load(line: str) -> dict:
+    row = json.loads(line)
+    row["occurred_at"] = datetime.fromisoformat(row["occurred_at"])
+    for key in ("actor_id", "target_id"):
+        if row[key] is not None:
+            row[key] = UUID(row[key])
+    return row
+
+
+class AuditBuffer:
+    def __init__(
+        self,
+        batch_size: int,
+        flush_rows: int,
+        max_pending: int,
+        spill_dir: str,
+    ):
+        self.batch_size = batch_size
+        self.flush_rows = flush_rows
+        self.max_pending = max_pending
+        self.spill_dir = spill_dir
+        self._pending: List[dict] = []
+        self._due = asyncio.Event()
+        # one flush at a time keeps the insert order
+        self._lock = asyncio.Lock()
+
+    def record(
+        self,
+        action: str,
+        actor_id: Optional[UUID] = None,
+        target_id: Optional[UUID] = None,
+        request=None,
+        **details,
+    ) -> None:
+        self._pending.append(
+            {
+                "occurred_at": datetime.now(timezone.utc),
+                "action": str(action),
+                "actor_id": actor_id,
+                "target_id": target_id,
+                "ip": _client_ip(request),
+                "request_id": request_id_var.get(),
+                "details": details,
+            }
+        )
+        if len(self._pending) >= self.flush_rows:
+            self._due.set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def _insert(self, session_factory: SessionFactory, rows: List[dict]) -> None:
+        async with session_factory() as session:
+            for start in range(0, len(rows), self.batch_size):
+                await session.execute(
+                    insert(AuditLog.__table__).values(rows[start : start + self.batch_size])
+                )
+            # one transaction: a failed batch leaves nothing half inserted
+            await session.commit()
+
+    async def flush(self, session_factory: SessionFactory) -> int:
+        """Insert everything buffered, returns the number of rows written"""
+        async with self._lock:
+            rows, self._pending = self._pending, []
+            self._due.clear()
+            if not rows:
+                return 0
+            try:
+                await self._insert(session_factory, rows)
+                return len(rows)
+            except BaseException as ex:
+                # keep the order: failed rows go before anything recorded meanwhile
+                self._pending[:0] = rows
+                if isinstance(ex, Exception):
+                    logger.warning(
+                        "could not write audit log, keeping %d rows buffered: %s", len(rows), ex
+                    )
+                    if len(self._pending) > self.max_pending:
+                        self.spill()
+                    return 0
+                raise
+
+    def spill(self) -> Optional[str]:
+        """Write the buffer to a new spill file and empty it"""
+        rows, self._pending = self._pending, []
+        if not rows:
+            return None
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f"audit-{uuid.uuid4().hex}.jsonl")
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.writelines(_dump(row) + "\n" for row in rows)
+        logger.error("spilled %d audit rows to %s", len(rows), path)
+        return path
+
+    async def recover(self, session_factory: SessionFactory) -> int:
+        """Insert rows spilled by any worker, each file is claimed by one worker"""
+        recovered = 0
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, "audit-*.jsonl"))):
+            claimed = path + ".loading"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            with open(claimed, encoding="utf-8") as fh:
+                rows = [_load(line) for line in fh if line.strip()]
+            try:
+                await self._insert(session_factory, rows)
+            except Exception as ex:
+                os.rename(claimed, path)
+                logger.warning("could not recover audit spill %s: %s", path, ex)
+                continue
+            os.remove(claimed)
+            recovered += len(rows)
+        return recovered
+
+    async def close(self, session_factory: SessionFactory, attempts: int = 3) -> None:
+        """Final flush at shutdown, spills what the database doesn't take"""
+        for attempt in range(attempts):
+            await self.flush(session_factory)
+            if not self._pending:
+                return
+            await asyncio.sleep(0.5 * 2**attempt)
+        self.spill()
+
+    async def run(self, session_factory: SessionFactory, interval: float) -> None:
+        """Flush every `interval` seconds, or as soon as enough rows are pending, until cancelled"""
+        while True:
+            try:
+                await asyncio.wait_for(self._due.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush(session_factory)
+
+
+# this worker's buffer, flushed from the app lifespan
+audit = AuditBuffer(
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_rows=settings.AUDIT_FLUSH_ROWS,
+    max_pending=settings.AUDIT_MAX_PENDING,
+    spill_dir=settings.AUDIT_SPILL_DIR,
+)
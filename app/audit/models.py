@@ -0,0 +1,33 @@
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, DateTime, BigInteger, Identity, Index
+
+from app.config.database import Base
+
+from uuid import UUID
+from typing import Optional
+from datetime import datetime
+
+
+# Append-only: a trigger (migration d82b4f1e6a93) rejects UPDATE and DELETE.
+# Rows are buffered in-process and inserted in batches, so `id` is the insert
+# order and `occurred_at` the time the action happened.
+
+
+class AuditLog(Base):
+    __tablename__ = "audit_log"
+    __table_args__ = (
+        # keyset pagination per actor / per target, newest first
+        Index("ix_audit_log_actor_id", "actor_id", "id"),
+        Index("ix_audit_log_target_id", "target_id", "id"),
+        Index("ix_audit_log_action", "action", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    occurred_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    action: Mapped[str] = mapped_column(String(64), nullable=False)
+    actor_id: Mapped[Optional[UUID]] = mapped_column(PG_UUID(as_uuid=True), nullable=True)
+    target_id: Mapped[Optional[UUID]] = mapped_column(PG_UUID(as_uuid=True), nullable=True)
+    ip: Mapped[Optional[str]] = mapped_column(String(45), nullable=True)
+    request_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    details: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
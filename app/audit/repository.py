@@ -0,0 +1,34 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from uuid import UUID
+from typing import List, Optional
+
+from .models import AuditLog
+
+
+class AuditRepo:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def fetch_page(
+        self,
+        limit: int,
+        before: Optional[int] = None,
+        action: Optional[str] = None,
+        actor_id: Optional[UUID] = None,
+        target_id: Optional[UUID] = None,
+    ) -> List[AuditLog]:
+        # newest first, `before` is the keyset cursor; each filter has an (x, id) index
+        stmt = select(AuditLog).order_by(AuditLog.id.desc()).limit(limit)
+        if before is not None:
+            stmt = stmt.where(AuditLog.id < before)
+        if action is not None:
+            stmt = stmt.where(AuditLog.action == action)
+        if actor_id is not None:
+            stmt = stmt.where(AuditLog.actor_id == actor_id)
+        if target_id is not None:
+            stmt = stmt.where(AuditLog.target_id == target_id)
+
+        result = await self.db.execute(stmt)
+        return result.scalars().all()
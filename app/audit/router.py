@@ -0,0 +1,38 @@
+from fastapi.routing import APIRouter
+from fastapi import Depends, Query
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_db
+from app.config.dependencies import require_admin
+from app.core import AuditAction
+
+from .repository import AuditRepo
+from .schemas import AuditPage
+
+from uuid import UUID
+from typing import Optional
+
+router = APIRouter(prefix="/admin/audit", tags=["admin"])
+
+
+@router.get(
+    "/",
+    response_model=AuditPage,
+    summary="Audit log",
+    description="Admin and authentication actions, newest first. Entries are written in batches, so the newest second may not be visible yet. Page with `before=<next_cursor>`, filter by `action`, `actor_id` or `target_id`. Only accessible to administrators.",
+    dependencies=[Depends(require_admin)],
+)
+async def audit_log(
+    before: Optional[int] = Query(None, description="id of the last entry of the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    action: Optional[AuditAction] = None,
+    actor_id: Optional[UUID] = None,
+    target_id: Optional[UUID] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    entries = await AuditRepo(db).fetch_page(
+        limit, before=before, action=action, actor_id=actor_id, target_id=target_id
+    )
+    next_cursor = entries[-1].id if len(entries) == limit else None
+    return {"entries": entries, "next_cursor": next_cursor}
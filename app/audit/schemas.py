@@ -0,0 +1,25 @@
+from pydantic import BaseModel, Field, ConfigDict
+
+from typing import List, Optional
+from uuid import UUID
+from datetime import datetime
+
+
+class AuditEntry(BaseModel):
+    id: int
+    occurred_at: datetime
+    action: str
+    actor_id: Optional[UUID] = None
+    target_id: Optional[UUID] = None
+    ip: Optional[str] = None
+    request_id: Optional[str] = None
+    details: dict
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class AuditPage(BaseModel):
+    entries: List[AuditEntry]
+    next_cursor: Optional[int] = Field(
+        None, description="Pass as `before` to fetch the next (older) page, null on the last page."
+    )
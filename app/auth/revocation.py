@@ -0,0 +1,194 @@
+"""
+Token revocation: logout of one session and of all sessions of a user.
+
+Redis is the shared record: revoked token ids live in a sorted set scored by
+the token's `exp`, "revoke everything issued before" markers per user in a
+second sorted set scored by that cutoff. Both are pruned once nothing they
+cover can still be valid.
+
+Every API worker mirrors them in memory (a Bloom filter in front of a set for
+token ids, a dict for user cutoffs), so the per-request check in
+get_current_user is a local lookup. Workers learn about new revocations over
+pub/sub and reload the full state every REVOCATION_RESYNC_SECONDS, which also
+covers messages missed while disconnected. A revocation applies immediately on
+the worker that handled it and within one pub/sub round trip elsewhere.
+"""
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from typing import Dict, Optional
+from uuid import UUID
+import asyncio
+import json
+import logging
+import time
+
+from app.config.jwt import REFRESH_TOKEN_EXPIRE
+from app.config.redis import get_redis
+from app.config.settings import get_settings
+from app.core.bloom import BloomFilter
+from app.core.ids import uuid7_timestamp_ms
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+REVOKED_KEY = "auth:revoked"
+REVOKED_BEFORE_KEY = "auth:revoked_before"
+CHANNEL = "auth:revocations"
+
+# no token issued earlier than this can still be unexpired
+MAX_TOKEN_LIFETIME_MS = REFRESH_TOKEN_EXPIRE * 24 * 60 * 60 * 1000
+
+
+def issued_ms(payload: dict) -> int:
+    """Issue time in ms, from the uuid7 jti when present (iat is whole seconds)"""
+    try:
+        ms = uuid7_timestamp_ms(UUID(payload["jti"]))
+        if ms is not None:
+            return ms
+    except (KeyError, ValueError, TypeError):
+        pass
+    return int(payload.get("iat", 0)) * 1000
+
+
+class RevocationList:
+    """In-process copy of the revocations"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._tokens: Dict[str, float] = {}
+        self._users: Dict[str, int] = {}
+
+    def add_token(self, jti: str, exp: float) -> None:
+        if jti not in self._tokens:
+            self._bloom.add(jti)
+        self._tokens[jti] = exp
+
+    def add_user(self, user_id: str, before_ms: int) -> None:
+        if before_ms > self._users.get(user_id, 0):
+            self._users[user_id] = before_ms
+
+    def replace(self, tokens: Dict[str, float], users: Dict[str, int]) -> None:
+        # rebuilt rather than cleared: a Bloom filter can't forget expired ids
+        bloom = BloomFilter(max(self.capacity, 2 * len(tokens)), self.error_rate)
+        for jti in tokens:
+            bloom.add(jti)
+        self._bloom, self._tokens, self._users = bloom, dict(tokens), dict(users)
+
+    def is_revoked(self, payload: dict) -> bool:
+        jti = payload.get("jti")
+        # the filter answers "no" for almost every live token without touching the set
+        if jti and jti in self._bloom and jti in self._tokens:
+            return True
+        if self._users:
+            before = self._users.get(payload.get("sub"))
+            if before is not None and issued_ms(payload) <= before:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+
+revocations = RevocationList(
+    settings.REVOCATION_BLOOM_CAPACITY, settings.REVOCATION_BLOOM_ERROR_RATE
+)
+
+
+def is_revoked(payload: dict) -> bool:
+    return revocations.is_revoked(payload)
+
+
+async def revoke_token(payload: dict, redis: Optional[Redis] = None) -> bool:
+    """Revoke one token until it expires. False if the token has no jti."""
+    jti, exp = payload.get("jti"), payload.get("exp")
+    if not jti or exp is None:
+        return False
+
+    revocations.add_token(jti, exp)
+
+    redis = redis or get_redis()
+    if redis is None:
+        return True
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(REVOKED_KEY, {jti: exp})
+            pipe.zremrangebyscore(REVOKED_KEY, "-inf", time.time())
+            pipe.publish(CHANNEL, json.dumps({"jti": jti, "exp": exp}))
+            await pipe.execute()
+    except RedisError as ex:
+        # still revoked on this worker, other workers pick it up on a later revoke or resync
+        logger.warning("could not publish token revocation: %s", ex)
+    return True
+
+
+async def revoke_all_sessions(user_id: UUID, redis: Optional[Redis] = None) -> int:
+    """Revoke every token of the user issued up to now, returns the cutoff in ms"""
+    before_ms = time.time_ns() // 1_000_000
+    revocations.add_user(str(user_id), before_ms)
+
+    redis = redis or get_redis()
+    if redis is None:
+        return before_ms
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(REVOKED_BEFORE_KEY, {str(user_id): before_ms}, gt=True)
+            pipe.zremrangebyscore(REVOKED_BEFORE_KEY, "-inf", before_ms - MAX_TOKEN_LIFETIME_MS)
+            pipe.publish(CHANNEL, json.dumps({"user": str(user_id), "before": before_ms}))
+            await pipe.execute()
+    except RedisError as ex:
+        logger.warning("could not publish session revocation for %s: %s", user_id, ex)
+    return before_ms
+
+
+def apply_message(data: str) -> None:
+    try:
+        message = json.loads(data)
+        if "jti" in message:
+            revocations.add_token(message["jti"], float(message["exp"]))
+        elif "user" in message:
+            revocations.add_user(message["user"], int(message["before"]))
+    except (ValueError, KeyError, TypeError):
+        logger.warning("ignoring malformed revocation message %r", data)
+
+
+async def load_snapshot(redis: Redis) -> None:
+    now = time.time()
+    tokens = await redis.zrangebyscore(REVOKED_KEY, now, "+inf", withscores=True)
+    users = await redis.zrangebyscore(
+        REVOKED_BEFORE_KEY, now * 1000 - MAX_TOKEN_LIFETIME_MS, "+inf", withscores=True
+    )
+    revocations.replace(dict(tokens), {user: int(ms) for user, ms in users})
+
+
+async def run_listener(redis: Optional[Redis] = None, retry_seconds: float = 1.0) -> None:
+    """Keep this worker's revocation list in sync until cancelled"""
+    redis = redis or get_redis()
+    if redis is None:
+        return
+
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            # subscribe before loading, so nothing published in between is lost
+            await pubsub.subscribe(CHANNEL)
+            await load_snapshot(redis)
+            synced = time.monotonic()
+            retry_seconds = 1.0
+
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None:
+                    apply_message(message["data"])
+                if time.monotonic() - synced >= settings.REVOCATION_RESYNC_SECONDS:
+                    await load_snapshot(redis)
+                    synced = time.monotonic()
+        except (RedisError, OSError) as ex:
+            logger.warning("revocation sync lost, retrying in %.0fs: %s", retry_seconds, ex)
+            await asyncio.sleep(retry_seconds)
+            retry_seconds = min(retry_seconds * 2, 30.0)
+        finally:
+            await pubsub.aclose()
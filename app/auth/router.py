@@ -8,16 +8,38 @@ from .schemas import (
     LoginRequest,
     LoginResponse,
     VerifyRequest,
+    ResendCodeRequest,
+    IntrospectRequest,
+    IntrospectResponse,
 )
 from .utils import set_auth_cookies, send_verification_email
-from .services import refresh_access_token
+from .services import (
+    refresh_access_token,
+    resend_verification,
+    introspect_tokens,
+    logout,
+    logout_all,
+    issue_tokens,
+)
 
+from app.audit.buffer import audit
+from app.users.activity import activity
 from app.users.services import UserService
-from app.core import UserStatus
-from app.config import get_db, create_refresh_token, create_access_token
+from app.core import AuditAction, UserStatus
+from app.config import get_db
+from app.config.dependencies import require_service_token, get_current_user
+from app.config.jwt import get_keyset
+from app.config.settings import get_settings
+
+from functools import lru_cache
+import hashlib
+import json
 
+settings = get_settings()
 
 router = APIRouter(prefix="/auth", tags=["auth"])
+# served from the site root, where JWT libraries look for it
+jwks_router = APIRouter(tags=["auth"])
 
 
 @router.post(
@@ -69,15 +91,34 @@ async def verify(
             detail="Invalid or expired verification code",
         )
 
-    tokens = {
-        "access_token": create_access_token(user_id=user.id, email=user.email),
-        "refresh_token": create_refresh_token(user.id),
-    }
+    tokens = await issue_tokens(user.id, user.email)
     set_auth_cookies(response, tokens)
 
     return RegisterResponse(verified=True, message="Email verified successfully")
 
 
+@router.post(
+    "/resend-code",
+    response_model=RegisterResponse,
+    summary="Resend verification code",
+    description="Send a new verification code to a pending account. Limited to one email per address per cooldown window; repeated requests inside the window get 429 with a Retry-After header. The response doesn't reveal whether the address is registered.",
+)
+async def resend_code(request: ResendCodeRequest):
+    retry_after = await resend_verification(request.email)
+
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="verification code already sent, try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    return RegisterResponse(
+        verified=False,
+        message=f"If {request.email} is pending verification, a new code was sent",
+    )
+
+
 @router.post(
     "/login",
     response_model=LoginResponse,
@@ -85,27 +126,35 @@ async def verify(
     description="Authenticate user with email and password credentials. Returns access and refresh tokens stored in HTTP-only cookies. User must have VERIFIED status to successfully login.",
 )
 async def login(
-    request: LoginRequest, response: Response, db: AsyncSession = Depends(get_db)
+    request: LoginRequest,
+    response: Response,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db),
 ):
     user = await UserService(db).authenticate_user(
         email=request.email, password=request.password
     )
 
     if not user:
+        audit.record(
+            AuditAction.LOGIN_FAILED, request=http_request, email=request.email, reason="credentials"
+        )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid email or pass"
         )
 
     if user.status != UserStatus.VERIFIED:
+        audit.record(
+            AuditAction.LOGIN_FAILED, actor_id=user.id, request=http_request, reason="unverified"
+        )
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="activate ur account"
         )
 
-    tokens = {
-        "access_token": create_access_token(user_id=user.id, email=user.email),
-        "refresh_token": create_refresh_token(user.id),
-    }
+    tokens = await issue_tokens(user.id, user.email)
     set_auth_cookies(response, tokens)
+    activity.logged_in(user.id)
+    audit.record(AuditAction.LOGIN_SUCCEEDED, actor_id=user.id, request=http_request)
 
     return LoginResponse(success=True, message="login successful")
 
@@ -113,9 +162,63 @@ async def login(
 @router.post(
     "/refresh",
     summary="Refresh access token",
-    description="Generate a new access token using the refresh token stored in cookies. This endpoint allows users to maintain their session without re-authenticating.",
+    description="Exchange the refresh token stored in cookies for a new access and refresh token. Each refresh token works once: presenting one that was already exchanged ends the whole session, on every device holding its tokens.",
 )
 async def refresh(
     response: Response, request: Request, result: dict = Depends(refresh_access_token)
 ):
     return result
+
+
+@router.post(
+    "/logout",
+    summary="Log out",
+    description="Revoke the access and refresh token of the current session and clear the auth cookies. Revoked tokens are rejected everywhere until they would have expired. Succeeds even if the tokens are already expired or missing.",
+)
+async def logout_session(request: Request, response: Response):
+    await logout(request, response)
+    return {"message": "Logged out"}
+
+
+@router.post(
+    "/logout-all",
+    summary="Log out of all sessions",
+    description="Revoke every access and refresh token issued to the current user so far, on all devices, and clear the auth cookies of this one.",
+)
+async def logout_everywhere(response: Response, user=Depends(get_current_user)):
+    await logout_all(user.id, response)
+    return {"message": "Logged out of all sessions"}
+
+
+@router.post(
+    "/introspect",
+    response_model=IntrospectResponse,
+    summary="Validate tokens in batch",
+    description=f"Service-to-service endpoint for gateways and other services. Validates up to {settings.INTROSPECTION_MAX_TOKENS} access or refresh tokens in one call and returns, in request order, whether each one is active along with its claims and the user it belongs to. All users are loaded with a single query. Requires `Authorization: Bearer <service token>`.",
+    dependencies=[Depends(require_service_token)],
+    tags=["service"],
+)
+async def introspect(request: IntrospectRequest, db: AsyncSession = Depends(get_db)):
+    return {"results": await introspect_tokens(db, request.tokens)}
+
+
+@lru_cache
+def jwks_document() -> tuple:
+    body = json.dumps(get_keyset().jwks(), separators=(",", ":")).encode()
+    return body, f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+@jwks_router.get(
+    "/.well-known/jwks.json",
+    summary="Token signing keys",
+    description="Public keys (JWK Set) for verifying access and refresh tokens offline. Tokens carry the `kid` of the key that signed them. Cacheable; during rotation the next key is published here before it starts signing. Empty while the service still signs with the shared HS256 secret.",
+)
+async def jwks(request: Request):
+    body, etag = jwks_document()
+    headers = {
+        "Cache-Control": f"public, max-age={settings.JWKS_CACHE_SECONDS}",
+        "ETag": etag,
+    }
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,6 +1,11 @@
 from pydantic import Field, BaseModel, EmailStr
 
-from typing import Optional
+from typing import Optional, List, Any, Dict
+
+from app.config.settings import get_settings
+from app.users.schemas import UserResponse
+
+settings = get_settings()
 
 
 class RegisterRequest(BaseModel):
@@ -31,3 +36,24 @@ class ResendCodeRequest(BaseModel):
 class VerifyRequest(BaseModel):
     email: EmailStr = Field(...)
     code: str = Field(..., min_length=6, max_length=6)
+
+
+class IntrospectRequest(BaseModel):
+    tokens: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.INTROSPECTION_MAX_TOKENS,
+        description="access or refresh tokens to validate, results keep this order",
+    )
+
+
+class IntrospectionResult(BaseModel):
+    active: bool
+    token_type: Optional[str] = None
+    reason: Optional[str] = Field(None, description="why the token is not active")
+    claims: Optional[Dict[str, Any]] = None
+    user: Optional[UserResponse] = None
+
+
+class IntrospectResponse(BaseModel):
+    results: List[IntrospectionResult]
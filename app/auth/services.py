@@ -1,6 +1,7 @@
 from fastapi import Request, Response, HTTPException, status, Depends
 
 from sqlalchemy.ext.asyncio import AsyncSession
+from redis.exceptions import RedisError
 
 from ..config import (
     get_db,
@@ -8,12 +9,39 @@ from ..config import (
     create_access_token,
     create_refresh_token,
 )
+from ..config.database import AsyncSessionLocal
+from ..config.jwt import decode_token
+from ..config.redis import get_redis
+from ..config.settings import get_settings
+from ..core.ids import uuid7
+from ..core.singleflight import SingleFlight
 from ..users.repository import UserRepo
+from ..users.services import UserService
 
-from .utils import set_auth_cookies
+from .revocation import is_revoked, revoke_token
+from .sessions import (
+    REUSED,
+    ROTATED,
+    end_all_sessions,
+    end_session,
+    get_session_store,
+    revoke_access,
+)
+from .utils import set_auth_cookies, clear_auth_cookies, send_verification_email
 
+from typing import List
+import logging
+import math
+import time
 import uuid
 
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_resend_flight = SingleFlight()
+# used when redis is not configured or unreachable, per worker only
+_local_cooldowns: dict[str, float] = {}
+
 
 async def refresh_access_token(
     request: Request,
@@ -29,7 +57,7 @@ async def refresh_access_token(
         )
 
     payload = verify_refresh_token(refresh_token)
-    if not payload:
+    if not payload or is_revoked(payload):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired refresh token",
@@ -42,19 +70,226 @@ async def refresh_access_token(
             detail="Invalid token payload",
         )
 
-    user_repo = UserRepo(db)
-    user = await user_repo.get_user_by_id(uuid.UUID(user_id_str))
-    if not user:
+    sid = payload.get("sid")
+    if sid is None:
+        # issued before session families: check the user once and open a family
+        user_repo = UserRepo(db)
+        user = await user_repo.get_user_by_id(uuid.UUID(user_id_str))
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+            )
+        tokens = await issue_tokens(user.id, user.email)
+    else:
+        tokens = await rotate_tokens(sid, payload)
+
+    set_auth_cookies(response, tokens)
+
+    return {"message": "Tokens refreshed successfully"}
+
+
+def _access_exp() -> float:
+    return time.time() + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60 + 1
+
+
+async def issue_tokens(user_id: uuid.UUID, email: str) -> dict:
+    """Open a new session family and return its first token pair"""
+    sid, refresh_jti, access_jti = (str(uuid7()) for _ in range(3))
+
+    evicted = await get_session_store().create(
+        sid,
+        str(user_id),
+        email,
+        refresh_jti,
+        access_jti,
+        _access_exp(),
+        max_sessions=settings.SESSION_MAX_PER_USER,
+    )
+    await revoke_access(evicted)
+
+    return {
+        "access_token": create_access_token(user_id, email, sid=sid, jti=access_jti),
+        "refresh_token": create_refresh_token(user_id, sid=sid, jti=refresh_jti),
+    }
+
+
+async def rotate_tokens(sid: str, payload: dict) -> dict:
+    """Swap the presented refresh token for a new pair, without touching the database"""
+    refresh_jti, access_jti = str(uuid7()), str(uuid7())
+
+    outcome, record = await get_session_store().rotate(
+        sid, payload["sub"], payload.get("jti"), refresh_jti, access_jti, _access_exp()
+    )
+
+    if outcome == REUSED:
+        await revoke_access([(record["a"], record["x"])])
+        logger.warning(
+            "refresh token reused, session revoked",
+            extra={"user_id": payload["sub"], "sid": sid},
+        )
+    if outcome != ROTATED:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
+            detail="Session expired or revoked",
         )
 
-    new_access_token = create_access_token(user.id, user.email)
-    new_refresh_token = create_refresh_token(user.id)
+    user_id = uuid.UUID(payload["sub"])
+    return {
+        "access_token": create_access_token(user_id, record["e"], sid=sid, jti=access_jti),
+        "refresh_token": create_refresh_token(user_id, sid=sid, jti=refresh_jti),
+    }
 
-    tokens = {"access_token": new_access_token, "refresh_token": new_refresh_token}
 
-    set_auth_cookies(response, tokens)
+async def logout(request: Request, response: Response) -> int:
+    """Revoke the access and refresh token of this session, returns how many were revoked"""
+    revoked = 0
+    for cookie in ("access_token", "refresh_token"):
+        token = request.cookies.get(cookie)
+        payload = decode_token(token) if token else None
+        if payload is None:
+            continue
+        if await revoke_token(payload):
+            revoked += 1
+        if cookie == "refresh_token" and payload.get("sid"):
+            await end_session(uuid.UUID(payload["sub"]), payload["sid"])
 
-    return {"message": "Tokens refreshed successfully"}
+    clear_auth_cookies(response)
+    return revoked
+
+
+async def logout_all(user_id: uuid.UUID, response: Response) -> None:
+    await end_all_sessions(user_id)
+    clear_auth_cookies(response)
+
+
+async def acquire_cooldown(key: str, seconds: int) -> int:
+    """Start a cooldown window for `key`.
+
+    Returns 0 when the window was started by this call, otherwise the seconds
+    left on the running one.
+    """
+    redis = get_redis()
+    if redis is not None:
+        try:
+            if await redis.set(key, 1, nx=True, ex=seconds):
+                return 0
+            return max(await redis.ttl(key), 1)
+        except RedisError as ex:
+            logger.warning("cooldown falling back to local state: %s", ex)
+
+    now = time.monotonic()
+    expires = _local_cooldowns.get(key, 0.0)
+    if expires > now:
+        return math.ceil(expires - now)
+
+    if len(_local_cooldowns) > 10_000:
+        for stale in [k for k, v in _local_cooldowns.items() if v <= now]:
+            del _local_cooldowns[stale]
+    _local_cooldowns[key] = now + seconds
+    return 0
+
+
+async def release_cooldown(key: str) -> None:
+    _local_cooldowns.pop(key, None)
+    redis = get_redis()
+    if redis is not None:
+        try:
+            await redis.delete(key)
+        except RedisError:
+            pass
+
+
+async def resend_verification(email: str) -> int:
+    """Send a fresh verification code, at most once per cooldown window.
+
+    Concurrent requests for the same email share one flight, so they cause a
+    single code generation and a single email. Returns 0 when a code was sent
+    (or nothing had to be sent), otherwise the seconds until the next attempt
+    is allowed.
+    """
+    return await _resend_flight.do(email.lower(), lambda: _resend(email))
+
+
+async def _resend(email: str) -> int:
+    key = f"auth:resend-cooldown:{email.lower()}"
+
+    retry_after = await acquire_cooldown(key, settings.RESEND_CODE_COOLDOWN_SECONDS)
+    if retry_after:
+        return retry_after
+
+    # own session: the flight outlives the request that started it and
+    # serves the others waiting on it
+    async with AsyncSessionLocal() as session:
+        result = await UserService(session).resend_verification_code(email)
+    if result is None:
+        # unknown or already verified, keep the cooldown so probing is as cheap
+        return 0
+
+    _, code = result
+    if not await send_verification_email(email=email, code=code):
+        # let the user retry right away instead of waiting out the window
+        await release_cooldown(key)
+
+    return 0
+
+
+def _family_ended(payload: dict, current: dict) -> bool:
+    """A refresh token is only good while its family's record still names it"""
+    sid = payload.get("sid")
+    return payload.get("type") == "refresh" and sid in current and current[sid] != payload.get("jti")
+
+
+async def introspect_tokens(db: AsyncSession, tokens: List[str]) -> List[dict]:
+    """Validate a batch of tokens with one user lookup for all of them."""
+    decoded = []
+    for token in tokens:
+        payload = decode_token(token)
+        user_id = None
+        if payload is not None:
+            try:
+                user_id = uuid.UUID(payload.get("sub") or "")
+            except ValueError:
+                pass
+        decoded.append((payload, user_id))
+
+    ids = {user_id for _, user_id in decoded if user_id is not None}
+    users = {user.id: user for user in await UserRepo(db).get_users_by_ids(list(ids))}
+    # rotation and logout end a family without denylisting its refresh tokens:
+    # only the one its record names is still good
+    sids = {
+        payload["sid"]
+        for payload, _ in decoded
+        if payload is not None and payload.get("type") == "refresh" and payload.get("sid")
+    }
+    current = await get_session_store().refresh_jtis(list(sids))
+
+    results = []
+    for payload, user_id in decoded:
+        if payload is None:
+            results.append({"active": False, "reason": "invalid_or_expired"})
+        elif is_revoked(payload):
+            results.append(
+                {"active": False, "token_type": payload.get("type"), "reason": "revoked"}
+            )
+        elif user_id is None:
+            results.append({"active": False, "reason": "invalid_subject"})
+        elif user_id not in users:
+            results.append(
+                {"active": False, "token_type": payload.get("type"), "reason": "user_not_found"}
+            )
+        elif _family_ended(payload, current):
+            results.append(
+                {"active": False, "token_type": "refresh", "reason": "session_ended"}
+            )
+        else:
+            results.append(
+                {
+                    "active": True,
+                    "token_type": payload.get("type"),
+                    "claims": payload,
+                    "user": users[user_id],
+                }
+            )
+
+    return results
@@ -0,0 +1,279 @@
+"""
+Login sessions ("families") for refresh-token rotation.
+
+Every login opens a family identified by `sid`, carried in both tokens. The
+family record is five short fields: user id, email, the jti of the one refresh
+token that may still be used, and jti/exp of the matching access token.
+
+Refreshing is a single compare-and-swap on that record: the presented refresh
+jti must be the current one, and is replaced by the jti of the new token. A
+refresh token that was already rotated away means it leaked (or the client
+replayed it), so the whole family is deleted and its access token revoked.
+Users are capped at SESSION_MAX_PER_USER families, the least recently
+refreshed ones are evicted first.
+
+Redis holds the families when configured, otherwise a per-process dict.
+"""
+
+from redis.asyncio import Redis
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+import time
+
+from app.config.redis import get_redis
+from app.config.settings import get_settings
+
+from .revocation import revoke_all_sessions, revoke_token
+
+settings = get_settings()
+
+ROTATED = "rotated"
+REUSED = "reused"
+MISSING = "missing"
+
+SESSION_PREFIX = "auth:session:"
+USER_SESSIONS_PREFIX = "auth:user_sessions:"
+
+# (access jti, access exp) of sessions that were closed
+Closed = List[Tuple[str, float]]
+
+
+def session_ttl() -> int:
+    return settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
+
+
+# KEYS: session, user's sessions
+# ARGV: sid, user, email, refresh jti, access jti, access exp, ttl, now, max sessions
+CREATE_SCRIPT = """
+redis.call('HSET', KEYS[1], 'u', ARGV[2], 'e', ARGV[3], 'r', ARGV[4], 'a', ARGV[5], 'x', ARGV[6])
+redis.call('EXPIRE', KEYS[1], ARGV[7])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[8] - ARGV[7])
+redis.call('ZADD', KEYS[2], ARGV[8], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[7])
+
+local closed = {}
+local extra = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[9])
+if extra > 0 then
+    local popped = redis.call('ZPOPMIN', KEYS[2], extra)
+    -- member, score pairs
+    for i = 1, #popped, 2 do
+        local sid = popped[i]
+        if sid ~= ARGV[1] then
+            local key = '""" + SESSION_PREFIX + """' .. sid
+            local access = redis.call('HMGET', key, 'a', 'x')
+            if access[1] then
+                table.insert(closed, access[1])
+                table.insert(closed, access[2])
+            end
+            redis.call('DEL', key)
+        end
+    end
+end
+return closed
+"""
+
+# KEYS: session, user's sessions
+# ARGV: sid, presented refresh jti, new refresh jti, new access jti, access exp, ttl, now
+ROTATE_SCRIPT = """
+local rec = redis.call('HMGET', KEYS[1], 'u', 'e', 'r', 'a', 'x')
+if not rec[3] then
+    return {'missing'}
+end
+if rec[3] ~= ARGV[2] then
+    redis.call('DEL', KEYS[1])
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    return {'reused', rec[1], rec[2], rec[4], rec[5]}
+end
+redis.call('HSET', KEYS[1], 'r', ARGV[3], 'a', ARGV[4], 'x', ARGV[5])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+redis.call('ZADD', KEYS[2], ARGV[7], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+return {'rotated', rec[1], rec[2], rec[4], rec[5]}
+"""
+
+# KEYS: user's sessions, ARGV: sid or '' for all of the user's sessions
+CLOSE_SCRIPT = """
+local sids = {ARGV[1]}
+if ARGV[1] == '' then
+    sids = redis.call('ZRANGE', KEYS[1], 0, -1)
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('ZREM', KEYS[1], ARGV[1])
+end
+
+local closed = {}
+for _, sid in ipairs(sids) do
+    local key = '""" + SESSION_PREFIX + """' .. sid
+    local access = redis.call('HMGET', key, 'a', 'x')
+    if access[1] then
+        table.insert(closed, access[1])
+        table.insert(closed, access[2])
+    end
+    redis.call('DEL', key)
+end
+return closed
+"""
+
+
+def _pairs(flat: list) -> Closed:
+    return [(flat[i], float(flat[i + 1])) for i in range(0, len(flat), 2)]
+
+
+class MemorySessionStore:
+    """Per-process store, used when redis isn't configured.
+
+    No method awaits between reading and writing, so each one is atomic
+    with respect to other requests on the event loop.
+    """
+
+    def __init__(self):
+        # sid -> (expires, record)
+        self._sessions: Dict[str, Tuple[float, dict]] = {}
+        # user -> {sid: last refreshed}
+        self._users: Dict[str, Dict[str, float]] = {}
+
+    def _live(self, sid: str) -> Optional[dict]:
+        entry = self._sessions.get(sid)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            self._drop(sid)
+            return None
+        return entry[1]
+
+    def _drop(self, sid: str) -> Optional[dict]:
+        entry = self._sessions.pop(sid, None)
+        if entry is None:
+            return None
+        sessions = self._users.get(entry[1]["u"], {})
+        sessions.pop(sid, None)
+        return entry[1]
+
+    async def create(
+        self, sid: str, user_id: str, email: str, refresh_jti: str,
+        access_jti: str, access_exp: float, max_sessions: int,
+    ) -> Closed:
+        now = time.time()
+        self._sessions[sid] = (
+            now + session_ttl(),
+            {"u": user_id, "e": email, "r": refresh_jti, "a": access_jti, "x": access_exp},
+        )
+        sessions = self._users.setdefault(user_id, {})
+        sessions[sid] = now
+
+        closed = []
+        for old in sorted(sessions, key=sessions.get)[: max(0, len(sessions) - max_sessions)]:
+            record = self._drop(old)
+            if record is not None:
+                closed.append((record["a"], record["x"]))
+        return closed
+
+    async def rotate(
+        self, sid: str, user_id: str, presented_jti: str, refresh_jti: str,
+        access_jti: str, access_exp: float,
+    ) -> Tuple[str, Optional[dict]]:
+        record = self._live(sid)
+        if record is None:
+            return MISSING, None
+        if record["r"] != presented_jti:
+            self._drop(sid)
+            return REUSED, dict(record)
+
+        previous = dict(record)
+        record.update(r=refresh_jti, a=access_jti, x=access_exp)
+        now = time.time()
+        self._sessions[sid] = (now + session_ttl(), record)
+        self._users.setdefault(user_id, {})[sid] = now
+        return ROTATED, previous
+
+    async def refresh_jtis(self, sids: List[str]) -> Dict[str, Optional[str]]:
+        result = {}
+        for sid in sids:
+            record = self._live(sid)
+            result[sid] = record["r"] if record is not None else None
+        return result
+
+    async def close(self, user_id: str, sid: Optional[str] = None) -> Closed:
+        sids = [sid] if sid else list(self._users.pop(user_id, {}))
+        closed = []
+        for current in sids:
+            record = self._drop(current)
+            if record is not None:
+                closed.append((record["a"], record["x"]))
+        return closed
+
+
+class RedisSessionStore:
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self._create = redis.register_script(CREATE_SCRIPT)
+        self._rotate = redis.register_script(ROTATE_SCRIPT)
+        self._close = redis.register_script(CLOSE_SCRIPT)
+
+    @staticmethod
+    def _keys(sid: str, user_id: str) -> List[str]:
+        return [SESSION_PREFIX + sid, USER_SESSIONS_PREFIX + user_id]
+
+    async def create(
+        self, sid: str, user_id: str, email: str, refresh_jti: str,
+        access_jti: str, access_exp: float, max_sessions: int,
+    ) -> Closed:
+        closed = await self._create(
+            keys=self._keys(sid, user_id),
+            args=[sid, user_id, email, refresh_jti, access_jti, access_exp,
+                  session_ttl(), time.time(), max_sessions],
+        )
+        return _pairs(closed)
+
+    async def rotate(
+        self, sid: str, user_id: str, presented_jti: str, refresh_jti: str,
+        access_jti: str, access_exp: float,
+    ) -> Tuple[str, Optional[dict]]:
+        result = await self._rotate(
+            keys=self._keys(sid, user_id),
+            args=[sid, presented_jti, refresh_jti, access_jti, access_exp,
+                  session_ttl(), time.time()],
+        )
+        if result[0] == MISSING:
+            return MISSING, None
+        _, user, email, access, access_exp = result
+        return result[0], {"u": user, "e": email, "a": access, "x": float(access_exp)}
+
+    async def refresh_jtis(self, sids: List[str]) -> Dict[str, Optional[str]]:
+        """The refresh jti each family still accepts, None for ended ones"""
+        if not sids:
+            return {}
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for sid in sids:
+                pipe.hget(SESSION_PREFIX + sid, "r")
+            jtis = await pipe.execute()
+        return dict(zip(sids, jtis))
+
+    async def close(self, user_id: str, sid: Optional[str] = None) -> Closed:
+        closed = await self._close(keys=[USER_SESSIONS_PREFIX + user_id], args=[sid or ""])
+        return _pairs(closed)
+
+
+@lru_cache
+def get_session_store():
+    redis = get_redis()
+    return RedisSessionStore(redis) if redis is not None else MemorySessionStore()
+
+
+async def revoke_access(closed: Closed) -> None:
+    """Revoke the access tokens of closed sessions, they'd otherwise live until exp"""
+    for jti, exp in closed:
+        if exp > time.time():
+            await revoke_token({"jti": jti, "exp": exp})
+
+
+async def end_session(user_id: UUID, sid: str) -> None:
+    await revoke_access(await get_session_store().close(str(user_id), sid))
+
+
+async def end_all_sessions(user_id: UUID) -> None:
+    """Log the user out everywhere, including tokens issued before sessions existed"""
+    await revoke_all_sessions(user_id)
+    await get_session_store().close(str(user_id))
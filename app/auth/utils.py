@@ -1,9 +1,12 @@
 from fastapi.responses import Response
 from ..config.settings import get_settings
+from ..core.tracing import start_span
+import logging
 import resend
 
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 
 def set_auth_cookies(response: Response, tokens: dict) -> Response:
@@ -64,18 +67,20 @@ async def send_verification_email(email: str, code: str):
 
         resend.api_key = settings.RESEND_API_KEY
 
-        resend.Emails.send(
-            {
-                "from": settings.FROM_EMAIL,
-                "to": email,
-                "subject": subject,
-                "html": html_content,
-            }
-        )
-
-        print(f"✅ Verification email sent to {email} with code: {code}")
+        with start_span("email.send_verification", kind="client"):
+            resend.Emails.send(
+                {
+                    "from": settings.FROM_EMAIL,
+                    "to": email,
+                    "subject": subject,
+                    "html": html_content,
+                }
+            )
+
+        logger.info("verification email sent", extra={"email": email})
+        logger.debug("verification code issued", extra={"email": email, "code": code})
         return True
 
     except Exception as ex:
-        print(f"❌ Email send failed: {ex}")
+        logger.error("verification email failed", extra={"email": email, "error": str(ex)})
         return False
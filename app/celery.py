@@ -1,26 +1,58 @@
-from celery import Celery
+from celery import Celery, signals
 from celery.schedules import crontab
 
 from app.users.models import User
+from app.config.log import setup_logging
+from app.config.settings import get_settings
+
+settings = get_settings()
 
 
 celery = Celery(
     "tasks",
     broker="redis://redis:6379/0",
     backend="redis://redis:6379/0",
-    include=["app.tasks"],
+    include=["app.tasks.cleanup", "app.tasks.stats", "app.tasks.events"],
 )
 
 celery.autodiscover_tasks(["app.tasks"])
 
 # Configure Celery Beat schedule
 celery.conf.beat_schedule = {
-    "delete-unverified-users-daily-at-midnight": {
+    "reap-expired-users-every-minute": {
+        "task": "reap_expired_users",
+        "schedule": 60.0,  # deletes only users whose deadline has passed, in small batches
+    },
+    "delete-unverified-users-weekly": {
         "task": "delete_unverified_users",
         "schedule": crontab(
-            hour=0, minute=0
-        ),  # run every day at midnight delete unverified users for 2+ days
+            hour=3, minute=0, day_of_week=0
+        ),  # safety net full scan for signups that never made it into the expiry index
+    },
+    "purge-deleted-users-off-peak": {
+        "task": "purge_deleted_users",
+        "schedule": crontab(
+            minute="*/15", hour="1-5"
+        ),  # deletes are a deleted_at stamp, rows are removed in small batches at night
+    },
+    "relay-user-events-every-second": {
+        "task": "relay_user_events",
+        "schedule": 1.0,  # outbox -> redis stream, bounds change feed latency
+    },
+    "purge-published-user-events-daily": {
+        "task": "purge_published_user_events",
+        "schedule": crontab(hour=4, minute=30),
+    },
+    "reconcile-user-stats-daily": {
+        "task": "reconcile_user_stats",
+        "schedule": crontab(hour=4, minute=0),  # counters are trigger maintained, this only fixes drift
     },
 }
 
 celery.conf.timezone = "UTC"
+
+
+@signals.setup_logging.connect
+def configure_logging(**kwargs):
+    # replaces celery's own handlers with the queue based JSON setup
+    setup_logging(level=settings.LOG_LEVEL, json_output=settings.LOG_JSON)
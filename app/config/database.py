@@ -9,7 +9,13 @@ settings = get_settings()
 
 DB_URL = settings.DATABASE_URL
 
-engine = create_async_engine(DB_URL, echo=False, future=True)
+engine = create_async_engine(
+    DB_URL,
+    echo=False,
+    future=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+)
 
 AsyncSessionLocal = sessionmaker(
     bind=engine, expire_on_commit=False, class_=AsyncSession
@@ -3,12 +3,19 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from .database import get_db
 from .jwt import verify_access_token
+from .settings import get_settings
 
+from app.auth.revocation import is_revoked
+from app.core import UserRole
+from app.users.activity import activity
 from app.users.models import User
 from app.users.repository import UserRepo
 
+import hmac
 import uuid
 
+settings = get_settings()
+
 
 async def get_current_user(
     request: Request, db: AsyncSession = Depends(get_db)
@@ -24,7 +31,7 @@ async def get_current_user(
 
     payload = verify_access_token(token)
 
-    if payload is None:
+    if payload is None or is_revoked(payload):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="invalid or expired token",
@@ -58,4 +65,31 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    activity.seen(user.id)
     return user
+
+
+async def require_admin(current_user: User = Depends(get_current_user)) -> User:
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="insufficient permissions",
+        )
+    return current_user
+
+
+async def require_service_token(request: Request) -> None:
+    """Service-to-service auth: `Authorization: Bearer <one of SERVICE_API_TOKENS>`."""
+    allowed = [t.strip() for t in settings.SERVICE_API_TOKENS.split(",") if t.strip()]
+
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if (
+        scheme.lower() != "bearer"
+        or not token
+        or not any(hmac.compare_digest(token, candidate) for candidate in allowed)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="invalid service token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
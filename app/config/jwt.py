@@ -1,54 +1,175 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Tuple
 import uuid
 
-from jose import JWTError, jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import JWTError, jwk, jwt
+from jose.backends.base import Key
 from .settings import get_settings
 
+from app.core.ids import uuid7
+from app.core.tracing import start_span
+
 settings = get_settings()
 SECRET_KEY = settings.JWT_SECRET
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 REFRESH_TOKEN_EXPIRE = settings.REFRESH_TOKEN_EXPIRE_DAYS
 
-
-def create_access_token(user_id: uuid.UUID, email: str) -> str:
+# the jwt "alg" for each key type, the key decides, never the token header
+EC_ALGORITHMS = {"secp256r1": "ES256", "secp384r1": "ES384", "secp521r1": "ES512"}
+
+
+class KeySet:
+    """Signing key plus every key tokens may still be verified with, by kid.
+
+    Keys are parsed once; jose re-parses PEM strings on every call otherwise.
+    Verification only ever uses the public halves. With no asymmetric keys
+    the set signs HS256 with JWT_SECRET.
+    """
+
+    def __init__(
+        self,
+        keys: Dict[str, Tuple[str, Key]],
+        signing_kid: Optional[str] = None,
+        secret: Optional[str] = None,
+    ):
+        if signing_kid is not None and signing_kid not in keys:
+            raise ValueError(f"no private key for signing kid {signing_kid!r}")
+        self.keys = keys
+        self.public = {kid: (alg, key.public_key()) for kid, (alg, key) in keys.items()}
+        self.signing_kid = signing_kid
+        self.secret = secret
+
+    @classmethod
+    def from_dir(
+        cls, path: str, signing_kid: str = "", secret: Optional[str] = None
+    ) -> "KeySet":
+        keys, private = {}, []
+        for file in sorted(Path(path).glob("*.pem")):
+            data = file.read_bytes()
+            if file.name.endswith(".pub.pem"):
+                kid = file.name[: -len(".pub.pem")]
+                parsed = serialization.load_pem_public_key(data)
+            else:
+                kid = file.stem
+                parsed = serialization.load_pem_private_key(data, password=None)
+                private.append(kid)
+            alg = key_algorithm(parsed)
+            keys[kid] = (alg, jwk.construct(data, alg))
+
+        if not private:
+            raise ValueError(f"no private keys in {path}")
+        # a new key must only be published until verifiers have fetched it,
+        # so with several private keys the signing one is never guessed
+        if not signing_kid and len(private) > 1:
+            raise ValueError(f"JWT_SIGNING_KID must name one of {', '.join(private)}")
+        return cls(keys, signing_kid or private[0], secret)
+
+    def signing_key(self) -> Tuple[str, object, dict]:
+        """(algorithm, key, extra headers) for new tokens"""
+        if self.signing_kid is None:
+            return ALGORITHM, self.secret, {}
+        alg, key = self.keys[self.signing_kid]
+        return alg, key, {"kid": self.signing_kid}
+
+    def verification_key(self, token: str) -> Tuple[str, object]:
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid is None:
+            if self.secret is None:
+                raise JWTError("token has no kid")
+            return ALGORITHM, self.secret
+        if kid not in self.public:
+            raise JWTError(f"unknown kid {kid!r}")
+        return self.public[kid]
+
+    def jwks(self) -> dict:
+        """Public halves of all asymmetric keys, the signing key included"""
+        published = []
+        for kid, (alg, key) in self.public.items():
+            published.append({**key.to_dict(), "kid": kid, "alg": alg, "use": "sig"})
+        return {"keys": published}
+
+
+def key_algorithm(key) -> str:
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return "RS256"
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)):
+        if key.curve.name in EC_ALGORITHMS:
+            return EC_ALGORITHMS[key.curve.name]
+    raise ValueError(f"unsupported jwt key type {type(key).__name__}")
+
+
+@lru_cache
+def get_keyset() -> KeySet:
+    if not settings.JWT_KEYS_DIR:
+        return KeySet({}, secret=SECRET_KEY)
+    return KeySet.from_dir(
+        settings.JWT_KEYS_DIR,
+        settings.JWT_SIGNING_KID,
+        secret=SECRET_KEY if settings.JWT_ACCEPT_HS256 else None,
+    )
+
+
+def encode_token(claims: dict) -> str:
+    algorithm, key, headers = get_keyset().signing_key()
+    with start_span("jwt.encode", token_type=claims["type"], alg=algorithm):
+        return jwt.encode(claims, key, algorithm=algorithm, headers=headers)
+
+
+def create_access_token(
+    user_id: uuid.UUID,
+    email: str,
+    sid: Optional[str] = None,
+    jti: Optional[str] = None,
+) -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE)
 
     to_encode = {
         "sub": str(user_id),
         "email": email,
         "type": "access",
+        "jti": jti or str(uuid7()),
         "exp": expire,
         "iat": datetime.now(timezone.utc),
     }
+    if sid:
+        to_encode["sid"] = sid
 
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-    return encoded_jwt
+    return encode_token(to_encode)
 
 
-def create_refresh_token(user_id: uuid.UUID) -> str:
+def create_refresh_token(
+    user_id: uuid.UUID, sid: Optional[str] = None, jti: Optional[str] = None
+) -> str:
     expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE)
 
     to_encode = {
         "sub": str(user_id),
         "type": "refresh",
+        "jti": jti or str(uuid7()),
         "exp": expire,
         "iat": datetime.now(timezone.utc),
     }
+    if sid:
+        to_encode["sid"] = sid
 
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-    return encoded_jwt
+    return encode_token(to_encode)
 
 
 def decode_token(token: str) -> Optional[dict]:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
-        return None
+    with start_span("jwt.decode") as span:
+        try:
+            algorithm, key = get_keyset().verification_key(token)
+            payload = jwt.decode(token, key, algorithms=[algorithm])
+            return payload
+        except JWTError:
+            if span is not None:
+                span.attributes["valid"] = False
+            return None
 
 
 def verify_access_token(token: str) -> Optional[dict]:
@@ -0,0 +1,176 @@
+"""
+Non-blocking structured logging.
+
+Every logger feeds a QueueHandler, so emitting a record is an in-memory enqueue
+on the calling thread; a QueueListener thread formats records as JSON and
+writes them to stdout. Request ids (and trace ids when tracing is on) are
+attached on the calling side, where the ContextVars are visible.
+
+High-volume events can be sampled per call:
+    logger.info("request", extra={"sample_rate": 0.01})
+"""
+
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+
+from app.core.tracing import current_span
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# attributes every LogRecord has, anything else came in through `extra`
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "sample_rate"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    converter = time.gmtime
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Copies request/trace ids onto the record before it leaves the thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = request_id_var.get()
+        if request_id is not None:
+            record.request_id = request_id
+        span = current_span()
+        if span is not None:
+            record.trace_id = span.trace_id
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps records carrying `sample_rate` with that probability."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        if rate is None or rate >= 1:
+            return True
+        return random.random() < rate
+
+
+class _PassThroughQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # keep msg/args and `extra` intact for the JSON formatter, only resolve
+        # the things that can't cross threads safely
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level: str = "INFO", json_output: bool = True, stream=None) -> QueueListener:
+    """Route the root logger through a queue. Safe to call more than once."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(
+        JsonFormatter()
+        if json_output
+        else logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s")
+    )
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = _PassThroughQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Flush queued records, called on shutdown."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+class RequestLogMiddleware:
+    """Assigns a request id and logs one access record per request."""
+
+    def __init__(self, app, sample_rate: float = 1.0):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.logger = logging.getLogger("app.access")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self.logger.info(
+                "request",
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status_code,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                    # errors are always kept, successful requests are sampled
+                    "sample_rate": 1.0 if status_code >= 400 else self.sample_rate,
+                },
+            )
+            request_id_var.reset(token)
@@ -0,0 +1,25 @@
+from redis.asyncio import Redis
+
+from functools import lru_cache
+from typing import Optional
+
+from .settings import get_settings
+
+settings = get_settings()
+
+
+@lru_cache
+def get_redis() -> Optional[Redis]:
+    """Shared client for the API process, None when REDIS_URL is not configured."""
+    return redis_client()
+
+
+def redis_client() -> Optional[Redis]:
+    """New client with its own pool.
+
+    Celery tasks wrap each run in asyncio.run(), and pooled connections can't
+    outlive the loop they were opened on, so tasks must not share get_redis().
+    """
+    if not settings.REDIS_URL:
+        return None
+    return Redis.from_url(settings.REDIS_URL, decode_responses=True)
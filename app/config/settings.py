@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Literal
 
 
 class Settings(BaseSettings):
@@ -15,6 +16,125 @@ class Settings(BaseSettings):
 
     SITE_NAME: str = "hello world"
 
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # pooled connections opened and prepared at startup, capped at DB_POOL_SIZE
+    DB_WARMUP_CONNECTIONS: int = 5
+    DB_WARMUP_TIMEOUT_SECONDS: float = 10.0
+    READINESS_DB_TIMEOUT_SECONDS: float = 1.0
+    # how long the lifespan shutdown waits for in-flight requests before closing the pool;
+    # under uvicorn, --timeout-graceful-shutdown bounds the real drain, which comes first
+    SHUTDOWN_DRAIN_SECONDS: float = 20.0
+
+    # empty string disables redis backed features where an in-process fallback exists
+    REDIS_URL: str = "redis://redis:6379/0"
+
+    UNVERIFIED_USER_TTL_HOURS: int = 48
+    EXPIRY_REAPER_BATCH_SIZE: int = 200
+    EXPIRY_REAPER_MAX_BATCHES: int = 50
+
+    # last_seen_at/last_login_at lag by at most this, a crashed worker loses that much
+    USER_ACTIVITY_FLUSH_SECONDS: float = 30.0
+    # users buffered per worker before an early flush
+    USER_ACTIVITY_MAX_PENDING: int = 50_000
+
+    # audit rows are buffered per worker and inserted at least this often
+    AUDIT_FLUSH_SECONDS: float = 1.0
+    # pending rows that trigger an early flush, rows per INSERT statement
+    AUDIT_FLUSH_ROWS: int = 500
+    AUDIT_BATCH_SIZE: int = 1000
+    # buffered rows kept while the database is down before spilling to disk
+    AUDIT_MAX_PENDING: int = 100_000
+    AUDIT_SPILL_DIR: str = "audit_spill"
+
+    # soft-deleted rows removed per purge transaction, and the pause between them
+    USER_PURGE_BATCH_SIZE: int = 500
+    USER_PURGE_MAX_BATCHES: int = 200
+    USER_PURGE_PAUSE_MS: float = 50.0
+
+    RESEND_CODE_COOLDOWN_SECONDS: int = 60
+
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 60 * 60
+    IDEMPOTENCY_LOCK_SECONDS: int = 30
+
+    # fraction of requests traced, unless a trusted upstream sent a traceparent;
+    # 0 disables, except for requests a trusted upstream sampled
+    TRACE_SAMPLE_RATE: float = 0.0
+    # comma separated addresses or networks (e.g. the gateway's) whose traceparent
+    # sampled flag is followed; from anyone else only the trace id is continued
+    TRACE_TRUSTED_UPSTREAMS: str = ""
+    TRACE_EXPORT_PATH: str = "traces/spans.jsonl"
+
+    SLOW_QUERY_MS: float = 200.0
+
+    # admins can then profile a request with `X-Profile: stacks|memory`
+    PROFILING_ENABLED: bool = False
+    # fraction of requests stack-profiled without asking, needs PROFILING_ENABLED
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_INTERVAL_MS: float = 5.0
+    PROFILING_DIR: str = "profiles"
+    PROFILING_MAX_FILES: int = 200
+
+    # concurrent id lookups within this window share one query, 0 = same loop tick
+    USER_LOADER_WINDOW_MS: float = 2.0
+    # cap for POST /users/batch and for one coalesced lookup
+    USER_BATCH_MAX_IDS: int = 100
+
+    # id/email lookups: per-worker LRU in front of redis, invalidated over pub/sub
+    USER_CACHE_ENABLED: bool = True
+    USER_CACHE_MAX_ENTRIES: int = 10_000
+    # bounds staleness when a worker misses an invalidation
+    USER_CACHE_L1_TTL_SECONDS: float = 30.0
+    USER_CACHE_L2_TTL_SECONDS: int = 300
+
+    USER_EVENTS_STREAM_MAXLEN: int = 100_000
+    USER_EVENTS_RELAY_BATCH_SIZE: int = 500
+    USER_EVENTS_RELAY_MAX_BATCHES: int = 20
+    # published outbox rows are kept this long for debugging and replays
+    USER_EVENTS_RETENTION_DAYS: int = 7
+    # SSE keepalive interval, also how long one XREAD blocks
+    USER_EVENTS_SSE_BLOCK_SECONDS: int = 15
+    # a stream ends after this long and the client reconnects with Last-Event-ID,
+    # so streams rebalance across workers and none outlives a deploy by much
+    USER_EVENTS_SSE_MAX_SECONDS: int = 900
+
+    # comma separated bearer tokens accepted from other services (introspection etc.)
+    SERVICE_API_TOKENS: str = ""
+    INTROSPECTION_MAX_TOKENS: int = 100
+
+    # directory of <kid>.pem private keys (and <kid>.pub.pem verify-only keys),
+    # empty keeps HS256 with JWT_SECRET
+    JWT_KEYS_DIR: str = ""
+    # kid that signs new tokens, required once the directory holds more than
+    # one private key (a freshly generated key is only published until named)
+    JWT_SIGNING_KID: str = ""
+    # keep accepting HS256 tokens minted before the switch to asymmetric keys
+    JWT_ACCEPT_HS256: bool = True
+    JWKS_CACHE_SECONDS: int = 24 * 60 * 60
+
+    # concurrent logins per user, the least recently refreshed session is dropped
+    SESSION_MAX_PER_USER: int = 10
+
+    # scheme and cost of new digests, pick them with scripts/calibrate_password_hash.py;
+    # digests with another scheme or cost are rehashed on the next login
+    PASSWORD_SCHEME: Literal["bcrypt", "argon2"] = "bcrypt"
+    BCRYPT_ROUNDS: int = 12
+    # argon2 needs the argon2-cffi package
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_KIB: int = 65536
+    ARGON2_PARALLELISM: int = 4
+
+    # per-worker bloom filter in front of the revoked token set
+    REVOCATION_BLOOM_CAPACITY: int = 100_000
+    REVOCATION_BLOOM_ERROR_RATE: float = 0.001
+    # full reload from redis, drops expired entries and covers missed messages
+    REVOCATION_RESYNC_SECONDS: int = 300
+
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True
+    # fraction of successful requests that get an access log line, errors are always logged
+    LOG_REQUEST_SAMPLE_RATE: float = 1.0
+
     @property
     def SECURE_COOKIES(self) -> bool:
         return not self.DEBUG
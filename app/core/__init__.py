@@ -1 +1,2 @@
-from .enums import UserStatus, UserRole
+from .enums import UserStatus, UserRole, UserEventType, AuditAction
+from .ids import uuid7
@@ -0,0 +1,79 @@
+import asyncio
+
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set
+
+BatchFn = Callable[[List[Hashable]], Awaitable[Dict[Hashable, object]]]
+
+
+class DataLoader:
+    """Coalesce individual lookups into batched ones.
+
+    `load(key)` calls arriving within `window` seconds of the first one (or in
+    the same event loop iteration with a zero window) are collected and served
+    by a single `batch_fn(keys)` call, which returns a dict of the keys it
+    found. Duplicate keys in a batch are fetched once. Reaching `max_batch`
+    dispatches immediately. Nothing is cached once a batch is resolved.
+
+    A loader belongs to one event loop.
+    """
+
+    def __init__(self, batch_fn: BatchFn, window: float = 0.0, max_batch: int = 100):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._handle: Optional[asyncio.Handle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def load(self, key: Hashable):
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+
+            if len(self._pending) >= self.max_batch:
+                self._dispatch()
+            elif self._handle is None:
+                if self.window > 0:
+                    self._handle = loop.call_later(self.window, self._dispatch)
+                else:
+                    self._handle = loop.call_soon(self._dispatch)
+
+        # a cancelled caller must not cancel the batch for everyone else
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[Hashable]) -> list:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[Hashable, asyncio.Future]) -> None:
+        try:
+            found = await self.batch_fn(list(batch))
+        except Exception as ex:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(ex)
+                    # retrieved here so abandoned waiters don't log "never retrieved"
+                    future.exception()
+            return
+        except BaseException:
+            # cancelled (e.g. at shutdown): waiters must not hang on the shield
+            for future in batch.values():
+                future.cancel()
+            raise
+
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(found.get(key))
@@ -15,3 +15,19 @@ class UserStatus(base):
 class UserRole(base):
     USER = "user"
     ADMIN = "admin"
+
+
+class UserEventType(base):
+    CREATED = "created"
+    VERIFIED = "verified"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    ROLE_CHANGED = "role_changed"
+
+
+class AuditAction(base):
+    LOGIN_SUCCEEDED = "auth.login"
+    LOGIN_FAILED = "auth.login_failed"
+    USER_UPDATED = "admin.user_updated"
+    USER_DELETED = "admin.user_deleted"
+    ROLE_TOGGLED = "user.role_toggled"
@@ -0,0 +1,278 @@
+"""
+Idempotency-Key support for unsafe requests.
+
+The first request carrying a given key runs normally and its response (status,
+headers including Set-Cookie, body) is stored for IDEMPOTENCY_TTL_SECONDS.
+Retries with the same key get the stored response back without touching the
+handler. A duplicate that arrives while the first one is still running waits for
+it instead of racing it. Reusing a key for a different request is a 422.
+
+5xx responses are not stored, so a retry after a server error runs again.
+"""
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from typing import Dict, Iterable, Optional, Tuple
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import time
+
+from app.config.redis import get_redis
+from app.config.settings import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+UNSAFE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+
+class MemoryIdempotencyStore:
+    """Per-process store, used when redis isn't configured."""
+
+    def __init__(self):
+        self._records: Dict[str, Tuple[float, dict]] = {}
+        self._locks: Dict[str, float] = {}
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._records.get(key)
+        if entry is None:
+            return None
+        expires, record = entry
+        if expires <= time.monotonic():
+            del self._records[key]
+            return None
+        return record
+
+    async def save(self, key: str, record: dict, ttl: int) -> None:
+        now = time.monotonic()
+        if len(self._records) > 10_000:
+            for stale in [k for k, (exp, _) in self._records.items() if exp <= now]:
+                del self._records[stale]
+        self._records[key] = (now + ttl, record)
+
+    async def lock(self, key: str, ttl: int) -> bool:
+        now = time.monotonic()
+        if self._locks.get(key, 0.0) > now:
+            return False
+        self._locks[key] = now + ttl
+        return True
+
+    async def locked(self, key: str) -> bool:
+        return self._locks.get(key, 0.0) > time.monotonic()
+
+    async def unlock(self, key: str) -> None:
+        self._locks.pop(key, None)
+
+
+class RedisIdempotencyStore:
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    async def get(self, key: str) -> Optional[dict]:
+        raw = await self.redis.get(key)
+        return json.loads(raw) if raw else None
+
+    async def save(self, key: str, record: dict, ttl: int) -> None:
+        await self.redis.set(key, json.dumps(record), ex=ttl)
+
+    async def lock(self, key: str, ttl: int) -> bool:
+        return bool(await self.redis.set(f"{key}:lock", 1, nx=True, ex=ttl))
+
+    async def locked(self, key: str) -> bool:
+        return bool(await self.redis.exists(f"{key}:lock"))
+
+    async def unlock(self, key: str) -> None:
+        await self.redis.delete(f"{key}:lock")
+
+
+def default_store():
+    redis = get_redis()
+    return RedisIdempotencyStore(redis) if redis is not None else MemoryIdempotencyStore()
+
+
+class IdempotencyMiddleware:
+    def __init__(
+        self,
+        app,
+        store=None,
+        methods: Iterable[str] = UNSAFE_METHODS,
+        ttl: int = None,
+        lock_ttl: int = None,
+        poll_interval: float = 0.05,
+    ):
+        self.app = app
+        self._store = store
+        self.methods = frozenset(methods)
+        self.ttl = ttl or settings.IDEMPOTENCY_TTL_SECONDS
+        self.lock_ttl = lock_ttl or settings.IDEMPOTENCY_LOCK_SECONDS
+        self.poll_interval = poll_interval
+        # waiters in this process are woken directly instead of polling
+        self._done: Dict[str, asyncio.Event] = {}
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = default_store()
+        return self._store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(b"idempotency-key")
+        if not idempotency_key:
+            return await self.app(scope, receive, send)
+
+        body = await _read_body(receive)
+        replay_receive = _replay_body(body, receive)
+
+        # scope keys to the caller so one client can't read another's response
+        caller = _cookie(headers.get(b"cookie", b""), b"access_token")
+        key = "idem:" + hashlib.sha256(
+            b"\0".join([idempotency_key, caller])
+        ).hexdigest()
+        fingerprint = hashlib.sha256(
+            b"\0".join([scope["method"].encode(), scope["path"].encode(), body])
+        ).hexdigest()
+
+        try:
+            while True:
+                record = await self.store.get(key)
+                if record is not None:
+                    return await _replay(record, fingerprint, send)
+
+                if await self.store.lock(key, self.lock_ttl):
+                    break
+
+                if not await self._wait(key):
+                    return await _send_json(
+                        send,
+                        409,
+                        {"detail": "a request with this Idempotency-Key is still in progress"},
+                    )
+        except RedisError as ex:
+            logger.warning("idempotency store unavailable, passing through: %s", ex)
+            return await self.app(scope, replay_receive, send)
+
+        event = self._done.setdefault(key, asyncio.Event())
+        captured = {"status": 500, "headers": [], "body": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                captured["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture)
+
+            if captured["status"] < 500:
+                record = {
+                    "fingerprint": fingerprint,
+                    "status": captured["status"],
+                    "headers": [
+                        [k.decode("latin-1"), v.decode("latin-1")]
+                        for k, v in captured["headers"]
+                    ],
+                    "body": base64.b64encode(b"".join(captured["body"])).decode(),
+                }
+                await self.store.save(key, record, self.ttl)
+        except RedisError as ex:
+            logger.warning("could not store idempotent response: %s", ex)
+        finally:
+            try:
+                await self.store.unlock(key)
+            except RedisError:
+                pass  # the lock expires on its own
+            self._done.pop(key, None)
+            event.set()
+
+    async def _wait(self, key: str) -> bool:
+        """Wait for the in-flight request to finish, False on timeout."""
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            event = self._done.get(key)
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), self.lock_ttl)
+                except asyncio.TimeoutError:
+                    return False
+                return True
+
+            # in flight on another worker
+            await asyncio.sleep(self.poll_interval)
+            if await self.store.get(key) is not None or not await self.store.locked(key):
+                return True
+        return False
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def _replay_body(body: bytes, receive):
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
+
+
+def _cookie(header: bytes, name: bytes) -> bytes:
+    for part in header.split(b";"):
+        k, _, v = part.strip().partition(b"=")
+        if k == name:
+            return v
+    return b""
+
+
+async def _replay(record: dict, fingerprint: str, send):
+    if record["fingerprint"] != fingerprint:
+        return await _send_json(
+            send,
+            422,
+            {"detail": "Idempotency-Key was already used for a different request"},
+        )
+
+    headers = [
+        (k.encode("latin-1"), v.encode("latin-1")) for k, v in record["headers"]
+    ]
+    headers.append((b"idempotent-replayed", b"true"))
+
+    await send({"type": "http.response.start", "status": record["status"], "headers": headers})
+    await send({"type": "http.response.body", "body": base64.b64decode(record["body"])})
+
+
+async def _send_json(send, status_code: int, payload: dict):
+    body = json.dumps(payload).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,55 @@
+import os
+import threading
+import time
+from typing import Optional
+from uuid import UUID
+
+# RFC 9562 UUIDv7: 48-bit unix ms timestamp | ver(4) | rand_a(12) | var(2) | rand_b(62)
+# rand_a is used as a counter within the same millisecond (method 1 of the RFC),
+# so ids generated by one process are strictly increasing.
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7(timestamp_ms: Optional[int] = None) -> UUID:
+    global _last_ms, _counter
+
+    if timestamp_ms is not None:
+        # explicit timestamps (seeding, backfills) don't touch the monotonic state
+        counter = int.from_bytes(os.urandom(2), "big") & 0xFFF
+        return _build(timestamp_ms, counter)
+
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            _last_ms = ms
+            # start low in the counter space so there is room to increment
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x1FF
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                # counter overflow: borrow the next millisecond
+                _last_ms += 1
+                _counter = 0
+        return _build(_last_ms, _counter)
+
+
+def _build(ms: int, counter: int) -> UUID:
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (
+        (ms & 0xFFFF_FFFF_FFFF) << 80
+        | 0x7 << 76
+        | (counter & 0xFFF) << 64
+        | 0b10 << 62
+        | rand_b
+    )
+    return UUID(int=value)
+
+
+def uuid7_timestamp_ms(value: UUID) -> Optional[int]:
+    """Unix ms embedded in a v7 id, None for other versions (e.g. legacy uuid4 rows)."""
+    if value.version != 7:
+        return None
+    return value.int >> 80
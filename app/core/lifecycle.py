@@ -0,0 +1,150 @@
+"""
+Process lifecycle for readiness probes and graceful shutdown.
+
+`Lifecycle` tracks whether the worker finished warming up, whether it is
+draining, and how many requests are in flight. DrainMiddleware keeps the
+count and, once draining started, turns new requests away with 503 and
+`Connection: close` so clients retry on another worker, while requests already
+running finish normally.
+
+Draining has to start when the shutdown signal arrives. Uvicorn only runs the
+lifespan shutdown after every open connection finished, bounded by
+`--timeout-graceful-shutdown` (unbounded by default), so a drain started there
+would come too late to refuse anything, and long-lived streams waiting for it
+would hold shutdown forever. `drain_on_signals` marks the worker draining from
+the signal handler, then hands the signal on to the server's own handler.
+Streams blocked on something else wait on `wait_draining` next to it, so they
+end as soon as the signal arrives instead of at their next wake-up.
+"""
+
+from typing import Callable, Iterable
+import asyncio
+import json
+import logging
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._drain_started = asyncio.Event()
+        self._loop = None
+
+    def mark_ready(self) -> None:
+        self.ready = True
+
+    def enter(self) -> None:
+        self.in_flight += 1
+        self._idle.clear()
+
+    def exit(self) -> None:
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    def begin_drain(self) -> None:
+        """Stop taking requests; safe to call from a signal handler"""
+        self.ready = False
+        self.draining = True
+        if self._loop is not None:
+            # a signal handler may run in the middle of the loop's own code,
+            # waking the waiters is left to the loop
+            self._loop.call_soon_threadsafe(self._drain_started.set)
+
+    async def wait_draining(self) -> None:
+        """Return once draining started"""
+        self._loop = asyncio.get_running_loop()
+        if not self.draining:
+            await self._drain_started.wait()
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop taking requests and wait for running ones, False on timeout"""
+        self.begin_drain()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(
+                "shutting down with requests still in flight", extra={"in_flight": self.in_flight}
+            )
+            return False
+
+
+# this worker's lifecycle, shared by the app lifespan, probes and long-lived streams
+lifecycle = Lifecycle()
+
+
+def drain_on_signals(
+    lifecycle: Lifecycle, signals: Iterable[int] = (signal.SIGINT, signal.SIGTERM)
+) -> Callable[[], None]:
+    """Start draining on these signals before the handlers already installed run.
+
+    Call it from the lifespan startup, after the server installed its handlers.
+    Returns a function restoring the previous handlers.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        # signal handlers can only be set from the main thread
+        return lambda: None
+
+    previous = {}
+
+    def handle(sig, frame):
+        lifecycle.begin_drain()
+        handler = previous[sig]
+        if callable(handler):
+            handler(sig, frame)
+        elif handler == signal.SIG_DFL:
+            # nobody else handles it: the default action, as if we weren't here
+            signal.signal(sig, handler)
+            signal.raise_signal(sig)
+
+    for sig in signals:
+        previous[sig] = signal.signal(sig, handle)
+
+    def restore() -> None:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+
+    return restore
+
+
+class DrainMiddleware:
+    def __init__(self, app, lifecycle: Lifecycle, exempt_prefixes: Iterable[str] = ("/health",)):
+        self.app = app
+        self.lifecycle = lifecycle
+        # probes must keep answering while draining, and aren't work worth waiting for
+        self.exempt_prefixes = tuple(exempt_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_prefixes):
+            return await self.app(scope, receive, send)
+
+        if self.lifecycle.draining:
+            body = json.dumps({"detail": "shutting down"}).encode()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 503,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close"),
+                        (b"retry-after", b"1"),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        self.lifecycle.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.lifecycle.exit()
@@ -0,0 +1,49 @@
+from collections import OrderedDict
+
+from typing import Callable, Generic, Hashable, Optional, Tuple, TypeVar
+import time
+
+T = TypeVar("T")
+
+
+class LRUCache(Generic[T]):
+    """Bounded in-process cache, least recently used entries go first.
+
+    Entries also expire `ttl` seconds after they were set, which bounds how
+    stale an entry can get when an invalidation never arrives.
+    Not thread safe; meant for one event loop.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[float, T]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[T]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= self._clock():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: T) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (self._clock() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,311 @@
+"""
+On-demand profiling of single requests.
+
+ProfilingMiddleware profiles a request when an authorized caller asks for it
+with an `X-Profile` header, or for a random `sample_rate` fraction of requests.
+
+Stack profiles come from a sampler thread that, every `interval` seconds, walks
+the request task's coroutine chain (so a request parked on an `await` still
+shows where it waits) and, while the task is on the CPU, the synchronous
+frames it is running. Every sample goes into the wall-clock profile, the
+on-CPU ones also into the CPU profile. Both are written in the folded format
+(`frame;frame;frame count`) that flamegraph.pl and speedscope read.
+
+`X-Profile: memory` instead diffs two tracemalloc snapshots taken around the
+request. tracemalloc is process wide, so allocations of concurrent requests
+show up in the diff as well; use it on a quiet worker.
+
+This module has no app imports on purpose, it is configured from app.index.
+"""
+
+from collections import Counter
+from typing import Awaitable, Callable, List, Optional, Tuple
+import asyncio
+import datetime
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import tracemalloc
+
+STACKS, MEMORY = "stacks", "memory"
+
+# profile id plus one suffix per kind, nothing else is listed or served
+_NAME = re.compile(r"^[0-9]{8}T[0-9]{6}-[A-Z]+-[\w.-]{1,80}-[0-9a-f]{8}(\.wall\.folded|\.cpu\.folded|\.alloc\.txt)$")
+_SLUG = re.compile(r"[^\w.-]+")
+
+_PREFIXES = sorted({sys.prefix, sys.base_prefix, os.getcwd()}, key=len, reverse=True)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    for prefix in _PREFIXES:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):].lstrip(os.sep)
+            break
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({filename}:{frame.f_lineno})".replace(";", ":")
+
+
+def _await_chain(coro) -> Tuple[list, bool]:
+    """Frames of the coroutine chain, outermost first, and whether the last one awaits something else"""
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "ag_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        awaited = (
+            getattr(coro, "cr_await", None)
+            or getattr(coro, "ag_await", None)
+            or getattr(coro, "gi_yieldfrom", None)
+        )
+        if awaited is None:
+            return frames, False
+        if not hasattr(awaited, "send"):
+            # a future or other awaitable that isn't a coroutine: this is where the task sleeps
+            return frames, True
+        coro = awaited
+    return frames, True
+
+
+def task_stack(task: asyncio.Task, thread_id: int) -> Tuple[List[str], bool]:
+    """(stack labels outermost first, on cpu) of `task`, sampled from another thread"""
+    frames, awaiting = _await_chain(task.get_coro())
+    if not frames:
+        return ["(finished)"], False
+
+    innermost = frames[-1]
+    running = []
+    if not awaiting:
+        frame = sys._current_frames().get(thread_id)
+        while frame is not None and frame is not innermost:
+            running.append(frame)
+            frame = frame.f_back
+        if frame is None:
+            running = None
+
+    labels = [_frame_label(f) for f in frames]
+    if awaiting:
+        labels.append("(awaiting)")
+        return labels, False
+    if running is None:
+        # runnable but the loop is busy with other tasks
+        labels.append("(scheduled)")
+        return labels, False
+    labels.extend(_frame_label(f) for f in reversed(running))
+    return labels, True
+
+
+class StackSampler:
+    """Samples one task's stack from a daemon thread until stopped"""
+
+    def __init__(self, task: asyncio.Task, interval: float):
+        self.task = task
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.wall: Counter = Counter()
+        self.cpu: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                labels, on_cpu = task_stack(self.task, self.thread_id)
+            except (AttributeError, ValueError):
+                # the chain changed under us, skip this tick
+                continue
+            stack = ";".join(labels)
+            self.wall[stack] += 1
+            if on_cpu:
+                self.cpu[stack] += 1
+
+
+def folded(counts: Counter) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+# memory profiles in progress, and whether they started tracemalloc (it may already be on)
+_tracing_users = 0
+_tracing_owned = False
+_tracing_lock = threading.Lock()
+
+
+class AllocationDiff:
+    """tracemalloc snapshots around a block, shared by concurrent users"""
+
+    def __init__(self, frames: int = 10, top: int = 50):
+        self.frames = frames
+        self.top = top
+        self._before = None
+
+    def start(self) -> "AllocationDiff":
+        global _tracing_users, _tracing_owned
+        with _tracing_lock:
+            if _tracing_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                _tracing_owned = True
+            _tracing_users += 1
+        self._before = tracemalloc.take_snapshot()
+        return self
+
+    def stop(self) -> str:
+        global _tracing_users, _tracing_owned
+        after = tracemalloc.take_snapshot()
+        with _tracing_lock:
+            _tracing_users -= 1
+            if _tracing_users == 0 and _tracing_owned:
+                tracemalloc.stop()
+                _tracing_owned = False
+
+        ignore = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ]
+        stats = after.filter_traces(ignore).compare_to(self._before.filter_traces(ignore), "lineno")
+        growth = sum(s.size_diff for s in stats)
+        lines = [f"# net {growth / 1024:+.1f} KiB, top {self.top} lines by growth"]
+        lines.extend(str(s) for s in stats[: self.top])
+        return "\n".join(lines) + "\n"
+
+
+class ProfileStore:
+    """Profiles as files in one directory, oldest removed beyond `max_files`"""
+
+    def __init__(self, directory: str, max_files: int = 200):
+        self.directory = directory
+        self.max_files = max_files
+
+    def new_id(self, method: str, path: str) -> str:
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S")
+        slug = _SLUG.sub("_", path.strip("/"))[:80] or "root"
+        return f"{stamp}-{method.upper()}-{slug}-{secrets.token_hex(4)}"
+
+    def path(self, name: str) -> Optional[str]:
+        """Path of a stored profile, None for names this store never writes"""
+        if not _NAME.match(name):
+            return None
+        return os.path.join(self.directory, name)
+
+    def write(self, files: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        for name, content in files.items():
+            with open(os.path.join(self.directory, name), "w", encoding="utf-8") as fh:
+                fh.write(content)
+        self.prune()
+
+    def list(self) -> List[dict]:
+        """Stored profiles, newest first"""
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.is_file() and _NAME.match(e.name)]
+        except FileNotFoundError:
+            return []
+        profiles = []
+        for entry in entries:
+            stat = entry.stat()
+            profiles.append(
+                {
+                    "name": entry.name,
+                    "size": stat.st_size,
+                    "created_at": datetime.datetime.fromtimestamp(stat.st_mtime, datetime.timezone.utc),
+                }
+            )
+        # names start with the timestamp, the mtime orders within a second
+        profiles.sort(key=lambda p: (p["created_at"], p["name"]), reverse=True)
+        return profiles
+
+    def prune(self) -> None:
+        for profile in self.list()[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.directory, profile["name"]))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    """Profiles requests on demand, see the module docstring.
+
+    `authorize(scope)` decides whether the caller may ask for a profile, the
+    header is ignored otherwise. The profile id is returned in `X-Profile-Id`.
+    Add this innermost, so the sampled task is the one running the route.
+    """
+
+    def __init__(
+        self,
+        app,
+        store: ProfileStore,
+        authorize: Callable[[dict], Awaitable[bool]],
+        sample_rate: float = 0.0,
+        interval: float = 0.005,
+    ):
+        self.app = app
+        self.store = store
+        self.authorize = authorize
+        self.sample_rate = sample_rate
+        self.interval = interval
+
+    async def _mode(self, scope) -> Optional[str]:
+        requested = None
+        for key, value in scope.get("headers", ()):
+            if key == b"x-profile":
+                requested = MEMORY if value.decode("latin-1").strip().lower() == MEMORY else STACKS
+                break
+        if requested is not None and await self.authorize(scope):
+            return requested
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return STACKS
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        mode = await self._mode(scope)
+        if mode is None:
+            return await self.app(scope, receive, send)
+
+        profile_id = self.store.new_id(scope["method"], scope["path"])
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"x-profile-id", profile_id.encode())
+                ]
+            await send(message)
+
+        if mode == MEMORY:
+            diff = AllocationDiff().start()
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                report = diff.stop()
+                await asyncio.to_thread(self.store.write, {f"{profile_id}.alloc.txt": report})
+            return
+
+        sampler = StackSampler(asyncio.current_task(), self.interval).start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            # wakes the sampler at once, the join doesn't wait out an interval
+            sampler.stop()
+            await asyncio.to_thread(
+                self.store.write,
+                {
+                    f"{profile_id}.wall.folded": folded(sampler.wall),
+                    f"{profile_id}.cpu.folded": folded(sampler.cpu),
+                },
+            )
@@ -0,0 +1,126 @@
+"""
+Per-request SQL accounting on top of SQLAlchemy engine events.
+
+`track_queries()` starts a counter for the current context; every statement the
+engine runs while it is active adds to it (count, total DB time, how often each
+statement text repeated), and to every counter started around it.
+QueryStatsMiddleware tracks each request and can expose the numbers as
+response headers, and tests use the same counter, around the in-process
+request, to assert query budgets.
+
+Independently of tracking, statements slower than the configured threshold are
+logged, so the slow-query log works in production with headers turned off.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+import logging
+import time
+
+logger = logging.getLogger("app.db.slow_query")
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_time: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+
+    @property
+    def total_ms(self) -> float:
+        return self.total_time * 1000
+
+    @property
+    def duplicates(self) -> Dict[str, int]:
+        """Statements issued more than once, usually a missing batch or an N+1."""
+        return {stmt: n for stmt, n in self.statements.items() if n > 1}
+
+    def reset(self) -> None:
+        """Start counting from zero, e.g. once a test arranged its data"""
+        self.count = 0
+        self.total_time = 0.0
+        self.statements.clear()
+
+    def assert_at_most(self, budget: int) -> None:
+        assert self.count <= budget, (
+            f"expected at most {budget} queries, got {self.count}:\n"
+            + "\n".join(f"  {n}x {stmt}" for stmt, n in self.statements.items())
+        )
+
+
+# innermost last
+_stats: ContextVar[Tuple[QueryStats, ...]] = ContextVar("query_stats", default=())
+
+
+@contextmanager
+def track_queries():
+    stats = QueryStats()
+    token = _stats.set(_stats.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _stats.reset(token)
+
+
+def install_query_stats(
+    engine, slow_query_ms: Optional[float] = None, ignore_prefixes: Tuple[str, ...] = ()
+) -> None:
+    """Attach the counters to a sync Engine (async_engine.sync_engine). Idempotent.
+
+    Statements starting with one of `ignore_prefixes` aren't counted.
+    """
+    from sqlalchemy import event
+
+    if getattr(engine, "_query_stats_installed", False):
+        return
+    engine._query_stats_installed = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and not statement.startswith(ignore_prefixes):
+            context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+
+        for stats in _stats.get():
+            stats.count += 1
+            stats.total_time += elapsed
+            stats.statements[statement] += 1
+
+        if slow_query_ms is not None and elapsed * 1000 >= slow_query_ms:
+            logger.warning(
+                "slow query %.1fms: %s", elapsed * 1000, " ".join(statement.split())[:1000]
+            )
+
+
+class QueryStatsMiddleware:
+    def __init__(self, app, expose_headers: bool = False):
+        self.app = app
+        self.expose_headers = expose_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        with track_queries() as stats:
+
+            async def send_with_stats(message):
+                if message["type"] == "http.response.start" and self.expose_headers:
+                    headers = list(message.get("headers", []))
+                    headers += [
+                        (b"x-db-query-count", str(stats.count).encode()),
+                        (b"x-db-time-ms", f"{stats.total_ms:.2f}".encode()),
+                        (b"x-db-duplicate-queries", str(sum(stats.duplicates.values())).encode()),
+                    ]
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
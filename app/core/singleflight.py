@@ -0,0 +1,38 @@
+import asyncio
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The first caller starts `fn`, everyone arriving while it is in flight awaits
+    the same result (or exception). Nothing is cached once the call finishes.
+    Callers are shielded from each other: a cancelled waiter doesn't cancel the
+    shared call.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future) -> Any:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,277 @@
+"""
+Lightweight request tracing.
+
+TracingMiddleware opens a root span per sampled request and propagates W3C trace
+context (`traceparent`) in and out. The caller's sampled flag is only followed
+for trusted upstreams (by client address): anyone else could otherwise force
+every one of their requests to be traced, so their trace id is continued but
+the local sample rate decides. Without an exporter nothing is sampled at all. `start_span` opens child spans; it is a
+no-op outside a sampled trace, so instrumented code costs one ContextVar lookup
+on unsampled requests. Finished spans are written as OTLP-shaped JSON lines by
+a background thread, so exporting never blocks the event loop.
+
+This module has no app imports on purpose: it is used from app.config, and is
+configured once from app.index via `configure_tracing`.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional
+import atexit
+import ipaddress
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    name: str
+    parent_id: Optional[str] = None
+    kind: str = "internal"
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": (self.end_ns - self.start_ns) / 1e6,
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+        }
+
+
+class JsonlSpanExporter:
+    """Appends finished spans to a file from a daemon thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.SimpleQueue[Optional[Span]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def export(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def shutdown(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self.path, "a", encoding="utf-8") as fh:
+            while True:
+                span = self._queue.get()
+                if span is None:
+                    break
+                fh.write(json.dumps(span.to_dict(), default=str) + "\n")
+                # batch whatever is already queued before flushing
+                while True:
+                    try:
+                        span = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if span is None:
+                        fh.flush()
+                        return
+                    fh.write(json.dumps(span.to_dict(), default=str) + "\n")
+                fh.flush()
+
+
+class _Config:
+    sample_rate: float = 0.0
+    exporter: Optional[Any] = None
+    trusted_upstreams: tuple = ()
+
+
+_config = _Config()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def configure_tracing(sample_rate: float, exporter=None, trusted_upstreams: Iterable[str] = ()) -> None:
+    """`trusted_upstreams` are addresses or networks whose sampling decision is followed"""
+    _config.sample_rate = sample_rate
+    _config.exporter = exporter
+    _config.trusted_upstreams = tuple(ipaddress.ip_network(net, strict=False) for net in trusted_upstreams)
+
+
+def _is_trusted(client) -> bool:
+    if not client or not _config.trusted_upstreams:
+        return False
+    try:
+        address = ipaddress.ip_address(client[0])
+    except ValueError:
+        return False
+    return any(address in net for net in _config.trusted_upstreams)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def _export(span: Span) -> None:
+    if _config.exporter is not None:
+        _config.exporter.export(span)
+
+
+@contextmanager
+def start_span(name: str, kind: str = "internal", **attributes):
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    span = Span(
+        trace_id=parent.trace_id,
+        span_id=_new_id(64),
+        parent_id=parent.span_id,
+        name=name,
+        kind=kind,
+        attributes=attributes,
+    )
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as ex:
+        span.error = repr(ex)
+        raise
+    finally:
+        span.end()
+        _current_span.reset(token)
+        _export(span)
+
+
+def instrument_engine(engine) -> None:
+    """Child span per SQL statement, `engine` is a sync Engine (async_engine.sync_engine)."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        parent = _current_span.get()
+        if parent is None or context is None:
+            return
+        context._trace_span = Span(
+            trace_id=parent.trace_id,
+            span_id=_new_id(64),
+            parent_id=parent.span_id,
+            name="db.query",
+            kind="client",
+            attributes={"db.system": engine.dialect.name, "db.statement": statement[:500]},
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            span.attributes["db.rowcount"] = getattr(cursor, "rowcount", None)
+            span.end()
+            _export(span)
+            context._trace_span = None
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            span.error = repr(exception_context.original_exception)
+            span.end()
+            _export(span)
+            context._trace_span = None
+
+
+def parse_traceparent(value: str):
+    """(trace_id, parent_span_id, sampled) or None for a malformed header."""
+    match = _TRACEPARENT.match(value.strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    return trace_id, parent_id, bool(int(flags, 16) & 0x01)
+
+
+class TracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _config.exporter is None:
+            return await self.app(scope, receive, send)
+
+        incoming = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                incoming = parse_traceparent(value.decode("latin-1"))
+                break
+
+        trace_id, parent_id = None, None
+        if incoming is not None:
+            trace_id, parent_id, sampled = incoming
+        if incoming is None or not _is_trusted(scope.get("client")):
+            sampled = _config.sample_rate > 0 and random.random() < _config.sample_rate
+
+        if not sampled:
+            return await self.app(scope, receive, send)
+
+        span = Span(
+            trace_id=trace_id or _new_id(128),
+            span_id=_new_id(64),
+            parent_id=parent_id,
+            name=f"{scope['method']} {scope['path']}",
+            kind="server",
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+        )
+
+        async def send_with_context(message):
+            if message["type"] == "http.response.start":
+                span.attributes["http.status_code"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"traceparent", span.traceparent.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current_span.set(span)
+        try:
+            await self.app(scope, receive, send_with_context)
+        except BaseException as ex:
+            span.error = repr(ex)
+            raise
+        finally:
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                span.name = f"{scope['method']} {route.path}"
+                span.attributes["http.route"] = route.path
+            span.end()
+            _current_span.reset(token)
+            _export(span)
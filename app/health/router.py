@@ -0,0 +1,50 @@
+from fastapi.routing import APIRouter
+from fastapi import status
+from fastapi.responses import JSONResponse
+
+from sqlalchemy import text
+
+import asyncio
+
+from app.config.database import engine
+from app.config.settings import get_settings
+from app.core.lifecycle import lifecycle
+
+settings = get_settings()
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get(
+    "/live",
+    summary="Liveness probe",
+    description="200 as long as the process serves requests, including while it warms up or drains. Restart the worker only when this fails.",
+)
+async def live():
+    return {"status": "ok"}
+
+
+@router.get(
+    "/ready",
+    summary="Readiness probe",
+    description="200 once startup warmup finished and the database answers; 503 before that, while draining for shutdown, or when the database is unreachable. Route traffic to the worker only while this succeeds.",
+)
+async def ready():
+    if not lifecycle.ready:
+        reason = "draining" if lifecycle.draining else "starting"
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": reason},
+        )
+
+    try:
+        async with asyncio.timeout(settings.READINESS_DB_TIMEOUT_SECONDS):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+    except Exception:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "database unavailable"},
+        )
+
+    return {"status": "ready", "in_flight": lifecycle.in_flight}
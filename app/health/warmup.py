@@ -0,0 +1,79 @@
+"""
+Startup warmup, so the first requests after a deploy don't pay one-off costs:
+connection setup and type introspection for a set of pooled connections, the
+statements behind every authenticated request, passlib's lazy bcrypt backend
+load and the JWT key parsing.
+
+Warmup is best effort: failures are logged and the worker still starts, the
+readiness probe reports a database that is actually down.
+"""
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from uuid import UUID
+import asyncio
+import logging
+import time
+
+from app.config.jwt import create_access_token, decode_token
+from app.users.models import pwd_context
+from app.users.repository import UserRepo
+
+logger = logging.getLogger(__name__)
+
+NO_USER = UUID(int=0)
+
+
+async def run_hot_statements(session: AsyncSession) -> None:
+    """The lookups get_current_user and login run, through the same repo methods"""
+    repo = UserRepo(session)
+    # the cached lookups load through their own sessions, so warm their statements here
+    await repo.get_users_by_ids([NO_USER])
+    await repo.query_user_by_email("")
+
+
+async def warm_pool(engine: AsyncEngine, connections: int) -> int:
+    """Open up to `connections` pooled connections at once and prepare the hot statements on each"""
+    connections = min(connections, engine.pool.size())
+
+    async def warm_one():
+        async with engine.connect() as conn:
+            # statements are prepared per connection by asyncpg, so warm each one
+            async with AsyncSession(bind=conn) as session:
+                await run_hot_statements(session)
+
+    results = await asyncio.gather(*(warm_one() for _ in range(connections)), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        logger.warning("pool warmup failed for %d connections: %s", len(errors), errors[0])
+    return connections - len(errors)
+
+
+def warm_crypto() -> None:
+    # first use loads the bcrypt backend and parses the JWT keys
+    pwd_context.hash("warmup")
+    decode_token(create_access_token(NO_USER, "warmup@localhost"))
+
+
+async def warm_up(engine: AsyncEngine, connections: int, timeout: float) -> dict:
+    started = time.perf_counter()
+
+    crypto = asyncio.create_task(asyncio.to_thread(warm_crypto))
+    warmed = 0
+    if connections > 0:
+        try:
+            # an unreachable database must not hold up startup
+            warmed = await asyncio.wait_for(warm_pool(engine, connections), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("pool warmup timed out after %.0fs", timeout)
+    try:
+        await crypto
+    except Exception as ex:
+        logger.warning("hashing/jwt warmup failed: %s", ex)
+
+    summary = {
+        "connections": warmed,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    logger.info("warmup finished", extra=summary)
+    return summary
@@ -1,11 +1,122 @@
 from fastapi import FastAPI
 
-from .auth.router import router as auth_router
+from contextlib import asynccontextmanager
+import asyncio
+
+from .auth.revocation import run_listener
+from .health.router import router as health_router
+from .health.warmup import warm_up
+from .auth.router import router as auth_router, jwks_router
 from .users.router import router as user_router
+from .users.activity import activity
+from .users.cache import user_cache
+from .audit.buffer import audit
+from .audit.router import router as audit_router
+from .profiling.router import router as profiling_router, authorize_profile, store as profile_store
+from .core.idempotency import IdempotencyMiddleware
+from .core.lifecycle import DrainMiddleware, drain_on_signals, lifecycle
+from .core.profiling import ProfilingMiddleware
+from .core.query_stats import QueryStatsMiddleware, install_query_stats
+from .core.tracing import (
+    TracingMiddleware,
+    JsonlSpanExporter,
+    configure_tracing,
+    instrument_engine,
+)
+from .config.database import AsyncSessionLocal, engine
+from .config.log import RequestLogMiddleware, setup_logging
+from .config.redis import get_redis
+from .config.settings import get_settings
+
+settings = get_settings()
+
+setup_logging(level=settings.LOG_LEVEL, json_output=settings.LOG_JSON)
+
+trusted_upstreams = [net.strip() for net in settings.TRACE_TRUSTED_UPSTREAMS.split(",") if net.strip()]
+# upstreams may sample a request even when this service samples none itself
+configure_tracing(
+    sample_rate=settings.TRACE_SAMPLE_RATE,
+    exporter=JsonlSpanExporter(settings.TRACE_EXPORT_PATH)
+    if settings.TRACE_SAMPLE_RATE > 0 or trusted_upstreams
+    else None,
+    trusted_upstreams=trusted_upstreams,
+)
+instrument_engine(engine.sync_engine)
+install_query_stats(engine.sync_engine, slow_query_ms=settings.SLOW_QUERY_MS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # keeps this worker's token denylist in sync with the other workers
+    revocation_listener = asyncio.create_task(run_listener())
+    # drops users other workers changed from this worker's cache
+    cache_listener = asyncio.create_task(user_cache.run())
+    activity_flusher = asyncio.create_task(
+        activity.run(AsyncSessionLocal, settings.USER_ACTIVITY_FLUSH_SECONDS)
+    )
+    # rows a previous shutdown couldn't write
+    await audit.recover(AsyncSessionLocal)
+    audit_flusher = asyncio.create_task(
+        audit.run(AsyncSessionLocal, settings.AUDIT_FLUSH_SECONDS)
+    )
+    await warm_up(
+        engine, settings.DB_WARMUP_CONNECTIONS, settings.DB_WARMUP_TIMEOUT_SECONDS
+    )
+    lifecycle.mark_ready()
+    # uvicorn waits for open connections before the lifespan shutdown below,
+    # so draining starts from SIGTERM/SIGINT
+    restore_signals = drain_on_signals(lifecycle)
+    try:
+        yield
+    finally:
+        restore_signals()
+        # usually idle by now, covers servers that shut the lifespan down first
+        await lifecycle.drain(settings.SHUTDOWN_DRAIN_SECONDS)
+        revocation_listener.cancel()
+        cache_listener.cancel()
+        activity_flusher.cancel()
+        audit_flusher.cancel()
+        await asyncio.gather(
+            revocation_listener,
+            cache_listener,
+            activity_flusher,
+            audit_flusher,
+            return_exceptions=True,
+        )
+        # whatever the drained requests recorded
+        await activity.flush(AsyncSessionLocal)
+        await audit.close(AsyncSessionLocal)
+        if get_redis() is not None:
+            await get_redis().aclose()
+        await engine.dispose()
+
 
+app = FastAPI(title="test app", version="1.0.0", lifespan=lifespan)
 
-app = FastAPI(title="test app", version="1.0.0")
+if settings.PROFILING_ENABLED:
+    # innermost: the sampled task has to be the one running the route
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        authorize=authorize_profile,
+        sample_rate=settings.PROFILING_SAMPLE_RATE,
+        interval=settings.PROFILING_INTERVAL_MS / 1000,
+    )
 
+# retried signup/verify/admin mutations replay the first response
+app.add_middleware(IdempotencyMiddleware)
+# X-DB-Query-Count / X-DB-Time-Ms debug headers
+app.add_middleware(QueryStatsMiddleware, expose_headers=settings.DEBUG)
+# request id + one access log line per request
+app.add_middleware(RequestLogMiddleware, sample_rate=settings.LOG_REQUEST_SAMPLE_RATE)
+# so replays and the idempotency wait show up in the trace
+app.add_middleware(TracingMiddleware)
+# outermost: counts in-flight requests for the shutdown drain
+app.add_middleware(DrainMiddleware, lifecycle=lifecycle)
 
 app.include_router(auth_router)
+app.include_router(jwks_router)
 app.include_router(user_router)
+app.include_router(health_router)
+app.include_router(profiling_router)
+app.include_router(audit_router)
@@ -0,0 +1,54 @@
+from fastapi.routing import APIRouter
+from fastapi import Depends, HTTPException, Request, status, Query
+from fastapi.responses import FileResponse
+
+from app.config.database import AsyncSessionLocal
+from app.config.dependencies import get_current_user, require_admin
+from app.config.settings import get_settings
+from app.core import UserRole
+from app.core.profiling import ProfileStore
+
+from .schemas import ProfileInfo
+
+from typing import List
+import os
+
+settings = get_settings()
+
+store = ProfileStore(settings.PROFILING_DIR, settings.PROFILING_MAX_FILES)
+
+router = APIRouter(prefix="/admin/profiles", tags=["admin"])
+
+
+async def authorize_profile(scope) -> bool:
+    """Only admins may ask for a profile, checked like any authenticated request"""
+    async with AsyncSessionLocal() as db:
+        try:
+            user = await get_current_user(Request(scope), db)
+        except HTTPException:
+            return False
+    return user.role == UserRole.ADMIN
+
+
+@router.get(
+    "/",
+    response_model=List[ProfileInfo],
+    summary="List request profiles",
+    description="Profiles recorded on this worker, newest first. Stack profiles come as a `.wall.folded` and a `.cpu.folded` file (flamegraph.pl / speedscope input), memory profiles as an `.alloc.txt` allocation diff.",
+    dependencies=[Depends(require_admin)],
+)
+async def list_profiles(limit: int = Query(50, ge=1, le=500)):
+    return store.list()[:limit]
+
+
+@router.get(
+    "/{name}",
+    summary="Download a request profile",
+    description="The file of one profile, by the name from the list.",
+    dependencies=[Depends(require_admin)],
+)
+async def download_profile(name: str):
+    path = store.path(name)
+    if path is None or not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
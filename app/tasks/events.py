@@ -0,0 +1,111 @@
+from celery import shared_task
+from sqlalchemy import select, update, delete, func
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from app.users.models import UserEvent
+from app.users import events
+from app.config.database import AsyncSessionLocal
+from app.config.redis import redis_client
+from app.config.settings import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# one relay at a time keeps the stream in outbox id order
+RELAY_LOCK_ID = 0x75736576  # "usev"
+
+
+async def relay_user_events_async(batch_size: int = None, max_batches: int = None) -> dict:
+    """Publish unpublished outbox rows to the redis stream, oldest first"""
+    batch_size = batch_size or settings.USER_EVENTS_RELAY_BATCH_SIZE
+    max_batches = max_batches or settings.USER_EVENTS_RELAY_MAX_BATCHES
+
+    redis = redis_client()
+    if redis is None:
+        return {"published": 0, "skipped": "redis not configured"}
+
+    published = 0
+    async with redis:
+        for _ in range(max_batches):
+            async with AsyncSessionLocal() as session:
+                try:
+                    locked = await session.scalar(
+                        select(func.pg_try_advisory_xact_lock(RELAY_LOCK_ID))
+                    )
+                    if not locked:
+                        return {"published": published, "skipped": "relay already running"}
+
+                    result = await session.execute(
+                        select(UserEvent)
+                        .where(UserEvent.published_at.is_(None))
+                        .order_by(UserEvent.id)
+                        .limit(batch_size)
+                    )
+                    batch = result.scalars().all()
+                    if not batch:
+                        break
+
+                    await events.publish(redis, batch)
+                    await session.execute(
+                        update(UserEvent)
+                        .where(UserEvent.id.in_([e.id for e in batch]))
+                        .values(published_at=func.now())
+                    )
+                    await session.commit()
+                except Exception as e:
+                    await session.rollback()
+                    raise e
+
+            published += len(batch)
+            if len(batch) < batch_size:
+                break
+
+    return {"published": published}
+
+
+async def purge_published_events_async() -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.USER_EVENTS_RETENTION_DAYS)
+    async with AsyncSessionLocal() as session:
+        try:
+            result = await session.execute(
+                delete(UserEvent).where(UserEvent.published_at < cutoff)
+            )
+            await session.commit()
+            return result.rowcount
+        except Exception as e:
+            await session.rollback()
+            raise e
+
+
+@shared_task(name="relay_user_events")
+def relay_user_events():
+    """
+    Celery task that moves outbox rows to the user change stream.
+    Scheduled every second; an idle run is one indexed query.
+    """
+    try:
+        result = asyncio.run(relay_user_events_async())
+        logger.info(
+            "relayed user events",
+            extra={**result, "sample_rate": 1.0 if result["published"] else 0.01},
+        )
+        return {"status": "success", **result}
+    except Exception as e:
+        logger.exception("error relaying user events")
+        return {"status": "error", "message": str(e)}
+
+
+@shared_task(name="purge_published_user_events")
+def purge_published_user_events():
+    """
+    Celery task that drops published outbox rows past the retention window.
+    """
+    try:
+        deleted_count = asyncio.run(purge_published_events_async())
+        logger.info("purged published user events", extra={"deleted_count": deleted_count})
+        return {"status": "success", "deleted_count": deleted_count}
+    except Exception as e:
+        logger.exception("error purging user events")
+        return {"status": "error", "message": str(e)}
@@ -0,0 +1,106 @@
+from celery import shared_task
+from sqlalchemy import text
+import asyncio
+import logging
+
+from app.config.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+async def reconcile_user_stats_async() -> dict:
+    """Recompute user_status_counts from the users table and report the drift.
+
+    Counters and users are read in one REPEATABLE READ snapshot, nothing is
+    locked while users is scanned. The triggers move both in the same
+    transaction, so recount minus counter is the drift whatever commits
+    meanwhile, and it is added to the counters afterwards as a delta.
+    Soft-deleted users don't count. Daily signups are only raised, never
+    lowered: deleted users can't be recounted, so a lower recount isn't drift.
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            await session.connection(
+                execution_options={"isolation_level": "REPEATABLE READ"}
+            )
+            rows = await session.execute(
+                text(
+                    """
+                    SELECT status, role, coalesce(c.count, 0) AS stored, coalesce(u.count, 0) AS actual
+                    FROM user_status_counts c
+                    FULL JOIN (
+                        SELECT status, COALESCE(role, 'user') AS role, count(*) AS count
+                        FROM users WHERE deleted_at IS NULL GROUP BY 1, 2
+                    ) u USING (status, role)
+                    WHERE coalesce(c.count, 0) <> coalesce(u.count, 0)
+                    """
+                )
+            )
+            counts = [
+                {"status": row.status, "role": row.role, "delta": row.actual - row.stored}
+                for row in rows
+            ]
+            rows = await session.execute(
+                text(
+                    """
+                    SELECT day, u.signups - coalesce(d.signups, 0) AS missing
+                    FROM (
+                        SELECT (created_at AT TIME ZONE 'UTC')::date AS day, count(*) AS signups
+                        FROM users GROUP BY 1
+                    ) u
+                    LEFT JOIN user_signups_daily d USING (day)
+                    WHERE u.signups > coalesce(d.signups, 0)
+                    """
+                )
+            )
+            days = [{"day": row.day, "missing": row.missing} for row in rows]
+            await session.commit()
+
+            if counts:
+                await session.execute(
+                    text(
+                        """
+                        INSERT INTO user_status_counts (status, role, count)
+                        VALUES (:status, :role, :delta)
+                        ON CONFLICT (status, role)
+                        DO UPDATE SET count = user_status_counts.count + EXCLUDED.count
+                        """
+                    ),
+                    counts,
+                )
+            if days:
+                await session.execute(
+                    text(
+                        """
+                        INSERT INTO user_signups_daily (day, signups)
+                        VALUES (:day, :missing)
+                        ON CONFLICT (day)
+                        DO UPDATE SET signups = user_signups_daily.signups + EXCLUDED.signups
+                        """
+                    ),
+                    days,
+                )
+            await session.commit()
+
+            drift = {f"{c['status']}/{c['role']}": c["delta"] for c in counts}
+            return {"drift": drift, "signup_days_fixed": len(days)}
+        except Exception as e:
+            await session.rollback()
+            raise e
+
+
+@shared_task(name="reconcile_user_stats")
+def reconcile_user_stats():
+    """
+    Celery task that recomputes the user counters from scratch.
+    Counters are trigger maintained, so drift should stay zero; it is logged
+    as a warning when it isn't.
+    """
+    try:
+        result = asyncio.run(reconcile_user_stats_async())
+        log = logger.warning if result["drift"] or result["signup_days_fixed"] else logger.info
+        log("reconciled user stats", extra=result)
+        return {"status": "success", **result}
+    except Exception as e:
+        logger.exception("error reconciling user stats")
+        return {"status": "error", "message": str(e)}
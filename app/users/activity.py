@@ -0,0 +1,137 @@
+"""
+Write-behind tracking of users' last login and last activity.
+
+Requests only record the timestamp in a per-worker dict, keyed by user, so a
+user active on every request still costs one row update per flush. A
+background task writes the buffer every USER_ACTIVITY_FLUSH_SECONDS as one
+`UPDATE users ... FROM (VALUES ...)` per chunk, and once more on shutdown.
+
+The columns are analytics, not state: they may lag by a flush interval, and a
+crashed worker loses its unflushed buffer. Timestamps only move forward, so
+flushes from several workers can interleave freely. Neither column is indexed,
+which keeps these updates HOT (no index maintenance).
+"""
+
+from sqlalchemy import Table, DateTime, cast, func, update, values, column
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+import asyncio
+import logging
+
+from app.config.settings import get_settings
+
+from .models import User
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# (user, last seen, last login or None)
+Row = Tuple[UUID, datetime, Optional[datetime]]
+
+
+def batched_update(table: Table, rows: List[Row]):
+    """One UPDATE for all rows; GREATEST ignores NULLs and never moves a timestamp back"""
+    batch = values(
+        column("id", PG_UUID(as_uuid=True)),
+        column("seen", DateTime(timezone=True)),
+        column("login", DateTime(timezone=True)),
+        name="activity",
+    ).data(rows)
+    return (
+        update(table)
+        .where(table.c.id == batch.c.id)
+        .values(
+            last_seen_at=func.greatest(table.c.last_seen_at, batch.c.seen),
+            # a chunk without logins has an all-NULL (text) column
+            last_login_at=func.greatest(
+                table.c.last_login_at, cast(batch.c.login, DateTime(timezone=True))
+            ),
+        )
+    )
+
+
+class ActivityTracker:
+    def __init__(self, max_pending: int, chunk_size: int = 1000, table: Optional[Table] = None):
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self.table = table if table is not None else User.__table__
+        self._seen: Dict[UUID, datetime] = {}
+        self._logins: Dict[UUID, datetime] = {}
+        self._full = asyncio.Event()
+
+    def seen(self, user_id: UUID, at: Optional[datetime] = None) -> None:
+        self._seen[user_id] = at or datetime.now(timezone.utc)
+        if len(self._seen) >= self.max_pending:
+            # flush early rather than grow without bound
+            self._full.set()
+
+    def logged_in(self, user_id: UUID, at: Optional[datetime] = None) -> None:
+        at = at or datetime.now(timezone.utc)
+        self._logins[user_id] = at
+        self.seen(user_id, at)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def drain(self) -> List[Row]:
+        seen, self._seen = self._seen, {}
+        logins, self._logins = self._logins, {}
+        self._full.clear()
+        # id order, so concurrent flushes from other workers lock rows in the same order
+        return [(user_id, seen[user_id], logins.get(user_id)) for user_id in sorted(seen)]
+
+    def restore(self, rows: List[Row]) -> None:
+        """Put back rows of a failed flush, newer timestamps win, beyond the cap they are dropped"""
+        for user_id, seen, login in rows:
+            current = self._seen.get(user_id)
+            if current is None:
+                if len(self._seen) >= self.max_pending:
+                    continue
+                self._seen[user_id] = seen
+            elif seen > current:
+                self._seen[user_id] = seen
+            if login is not None:
+                self._logins[user_id] = max(login, self._logins.get(user_id, login))
+
+    async def flush(self, session_factory: Callable[[], AsyncSession]) -> int:
+        """Write the buffer, returns the number of users written"""
+        rows = self.drain()
+        if not rows:
+            return 0
+
+        written = 0
+        try:
+            async with session_factory() as session:
+                for start in range(0, len(rows), self.chunk_size):
+                    chunk = rows[start : start + self.chunk_size]
+                    await session.execute(batched_update(self.table, chunk))
+                    await session.commit()
+                    written += len(chunk)
+        except asyncio.CancelledError:
+            # shutdown flushes again after cancelling the loop
+            self.restore(rows[written:])
+            raise
+        except Exception as ex:
+            logger.warning(
+                "could not flush user activity, retrying next interval: %s", ex,
+                extra={"pending": len(rows) - written},
+            )
+            self.restore(rows[written:])
+        return written
+
+    async def run(self, session_factory: Callable[[], AsyncSession], interval: float) -> None:
+        """Flush every `interval` seconds, or earlier when the buffer is full, until cancelled"""
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush(session_factory)
+
+
+# this worker's buffer, flushed from the app lifespan
+activity = ActivityTracker(settings.USER_ACTIVITY_MAX_PENDING)
@@ -0,0 +1,300 @@
+"""
+Two-tier read-through cache for user lookups by id and email.
+
+L1 is a per-worker LRU of user snapshots (column values, never ORM instances,
+so a cached user can be merged into any session), L2 is Redis, shared by all
+workers. A lookup missing both loads the row once per worker and key, however
+many requests ask concurrently, and fills both tiers. Missing users are not
+cached, so signups need no invalidation.
+
+Writers call `user_cache.invalidate(...)` after their commit: it drops the
+writer's L1 entry, deletes the L2 key and publishes the ids, and every
+worker's listener drops its own L1 entries. L2 fills are versioned, a fill
+that read the row before a concurrent write is refused instead of putting the
+old row back. L1 entries expire after USER_CACHE_L1_TTL_SECONDS, which bounds
+staleness when a worker misses a message; a listener that reconnects drops
+its whole L1.
+
+Snapshots leave out the password digest and the verification code: Redis
+is no place for credentials. Cached users come back with those attributes
+unloaded, so code that checks a password or a code reads the row itself
+(UserRepo.query_user_by_email).
+
+Email keys only hold the id, a hit is checked against the snapshot's email,
+so a stale pointer reads as a miss. last_login_at / last_seen_at are written
+behind (app.users.activity) without invalidating and may lag in the cache.
+"""
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from datetime import datetime
+from enum import Enum
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from uuid import UUID
+import asyncio
+import json
+import logging
+
+from app.config.redis import get_redis
+from app.config.settings import get_settings
+from app.core.lru import LRUCache
+from app.core.singleflight import SingleFlight
+
+from .models import User
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+CHANNEL = "users:cache:invalidate"
+
+# credentials, never cached
+SECRET_COLUMNS = frozenset({"password", "verification_code", "verification_code_expires"})
+
+# (attribute, python type) of every other mapped column
+_COLUMNS = [
+    (attr.key, attr.columns[0].type.python_type)
+    for attr in sa_inspect(User).column_attrs
+    if attr.key not in SECRET_COLUMNS
+]
+
+# SET data and email pointer only if no invalidation bumped the version since it was read
+_FILL_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+redis.call('SET', KEYS[3], ARGV[4], 'EX', ARGV[3])
+return 1
+"""
+
+Snapshot = Dict[str, object]
+Loader = Callable[[], Awaitable[Optional[Snapshot]]]
+
+
+def _key(user_id) -> str:
+    return f"users:cache:{user_id}"
+
+
+def _version_key(user_id) -> str:
+    return f"users:cache:{user_id}:version"
+
+
+def _email_key(email: str) -> str:
+    return f"users:cache:email:{email}"
+
+
+def snapshot(user: User) -> Snapshot:
+    return {key: getattr(user, key) for key, _ in _COLUMNS}
+
+
+def build(snap: Snapshot) -> User:
+    """A detached User, as if loaded by another session; merge it with load=False.
+    SECRET_COLUMNS stay unloaded."""
+    user = User(**snap)
+    make_transient_to_detached(user)
+    return user
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def dumps(snap: Snapshot) -> str:
+    return json.dumps({key: _encode(value) for key, value in snap.items()})
+
+
+def loads(data: str) -> Snapshot:
+    raw = json.loads(data)
+    snap = {}
+    for key, type_ in _COLUMNS:
+        value = raw.get(key)
+        if value is not None:
+            value = datetime.fromisoformat(value) if type_ is datetime else type_(value)
+        snap[key] = value
+    return snap
+
+
+class UserCache:
+    def __init__(self, maxsize: int, l1_ttl: float, l2_ttl: int, enabled: bool = True):
+        self.enabled = enabled
+        self.l2_ttl = l2_ttl
+        # ids -> snapshots, ("email", address) -> ids
+        self.l1: LRUCache = LRUCache(maxsize, l1_ttl)
+        self._flight = SingleFlight()
+        # bumped by every invalidation; an L1 fill whose load overlapped one is skipped
+        self._epoch = 0
+        self.hits = {"l1": 0, "l2": 0, "db": 0}
+        self.invalidations = 0
+
+    async def get_by_id(self, user_id: UUID, load: Loader) -> Optional[Snapshot]:
+        if not self.enabled:
+            return await load()
+        snap = self.l1.get(user_id)
+        if snap is not None:
+            self.hits["l1"] += 1
+            return snap
+        snap, tier = await self._flight.do(user_id, lambda: self._fetch(user_id, None, load))
+        self.hits[tier] += 1
+        return snap
+
+    async def get_by_email(self, email: str, load: Loader) -> Optional[Snapshot]:
+        if not self.enabled:
+            return await load()
+        user_id = self.l1.get(("email", email))
+        snap = self.l1.get(user_id) if user_id is not None else None
+        if snap is not None and snap["email"] == email:
+            self.hits["l1"] += 1
+            return snap
+        snap, tier = await self._flight.do(
+            ("email", email), lambda: self._fetch(None, email, load)
+        )
+        self.hits[tier] += 1
+        return snap
+
+    async def _fetch(
+        self, user_id: Optional[UUID], email: Optional[str], load: Loader
+    ) -> Tuple[Optional[Snapshot], str]:
+        epoch = self._epoch
+        redis = get_redis()
+        version = None
+        if redis is not None:
+            try:
+                if user_id is None:
+                    pointer = await redis.get(_email_key(email))
+                    user_id = UUID(pointer) if pointer else None
+                if user_id is not None:
+                    data, version = await redis.mget(_key(user_id), _version_key(user_id))
+                    snap = loads(data) if data else None
+                    if snap is not None and (email is None or snap["email"] == email):
+                        self._fill_l1(snap, epoch)
+                        return snap, "l2"
+            except (RedisError, ValueError) as ex:
+                logger.warning("user cache read failed, loading from the database: %s", ex)
+                redis = None
+
+        snap = await load()
+        if snap is None:
+            return None, "db"
+        self._fill_l1(snap, epoch)
+        if redis is not None:
+            # a version read for another id (stale email pointer) doesn't apply
+            if snap["id"] != user_id:
+                version = None
+            await self._fill_l2(redis, snap, version)
+        return snap, "db"
+
+    def _fill_l1(self, snap: Snapshot, epoch: int) -> None:
+        if epoch != self._epoch:
+            return
+        self.l1.set(snap["id"], snap)
+        self.l1.set(("email", snap["email"]), snap["id"])
+
+    async def _fill_l2(self, redis: Redis, snap: Snapshot, version: Optional[str]) -> None:
+        user_id = snap["id"]
+        try:
+            await redis.eval(
+                _FILL_SCRIPT,
+                3,
+                _key(user_id),
+                _version_key(user_id),
+                _email_key(snap["email"]),
+                version or "0",
+                dumps(snap),
+                self.l2_ttl,
+                str(user_id),
+            )
+        except RedisError as ex:
+            logger.warning("could not fill user cache for %s: %s", user_id, ex)
+
+    def _drop(self, user_ids: Iterable[UUID]) -> None:
+        self._epoch += 1
+        for user_id in user_ids:
+            self.l1.pop(user_id)
+
+    async def invalidate(self, user_ids: Iterable[UUID], redis: Optional[Redis] = None) -> None:
+        """Drop users from every worker's cache; call after the write committed"""
+        user_ids = [u if isinstance(u, UUID) else UUID(str(u)) for u in user_ids]
+        if not user_ids:
+            return
+        self._drop(user_ids)
+        self.invalidations += len(user_ids)
+
+        redis = redis or get_redis()
+        if redis is None:
+            return
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.delete(_key(user_id))
+                    pipe.incr(_version_key(user_id))
+                    # outlives any fill that could have read the old version
+                    pipe.expire(_version_key(user_id), 2 * self.l2_ttl)
+                pipe.publish(CHANNEL, json.dumps([str(u) for u in user_ids]))
+                await pipe.execute()
+        except RedisError as ex:
+            # other workers serve the old row until their L1 and the L2 entry expire
+            logger.warning("could not invalidate cached users %s: %s", user_ids, ex)
+
+    def apply_message(self, data: str) -> None:
+        try:
+            self._drop(UUID(user_id) for user_id in json.loads(data))
+        except (ValueError, TypeError):
+            logger.warning("ignoring malformed user cache message %r", data)
+
+    def stats(self) -> dict:
+        lookups = sum(self.hits.values())
+        cached = self.hits["l1"] + self.hits["l2"]
+        return {
+            "enabled": self.enabled,
+            "size": len(self.l1),
+            "lookups": lookups,
+            "l1_hits": self.hits["l1"],
+            "l2_hits": self.hits["l2"],
+            "misses": self.hits["db"],
+            "hit_ratio": round(cached / lookups, 4) if lookups else None,
+            "l1_hit_ratio": round(self.hits["l1"] / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+        }
+
+    async def run(self, redis: Optional[Redis] = None, retry_seconds: float = 1.0) -> None:
+        """Apply invalidations published by other workers until cancelled"""
+        redis = redis or get_redis()
+        if redis is None or not self.enabled:
+            return
+
+        while True:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(CHANNEL)
+                # anything published while disconnected is lost, start over
+                self._drop([])
+                self.l1.clear()
+                retry_seconds = 1.0
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None:
+                        self.apply_message(message["data"])
+            except (RedisError, OSError) as ex:
+                logger.warning("user cache listener lost, retrying in %.0fs: %s", retry_seconds, ex)
+                await asyncio.sleep(retry_seconds)
+                retry_seconds = min(retry_seconds * 2, 30.0)
+            finally:
+                await pubsub.aclose()
+
+
+# this worker's cache; the listener runs from the app lifespan
+user_cache = UserCache(
+    maxsize=settings.USER_CACHE_MAX_ENTRIES,
+    l1_ttl=settings.USER_CACHE_L1_TTL_SECONDS,
+    l2_ttl=settings.USER_CACHE_L2_TTL_SECONDS,
+    enabled=settings.USER_CACHE_ENABLED,
+)
@@ -0,0 +1,138 @@
+"""
+Change feed of user mutations.
+
+Writers only insert into the `user_events` outbox, inside the transaction of
+the change itself (see UserEvent). The relay task copies unpublished rows, in
+id order, into the redis stream below; consumers read the stream and resume
+from the stream id of the last entry they processed.
+
+Ordering is per user. Writers lock the user's row before adding its event
+(UserRepo.lock), so one user's events get ids in the order they committed.
+Ids are drawn at insert, though, so a slow transaction can commit an older
+id after newer ones of other users were published. Consumers keep the
+last `event_id` applied per user and skip anything older.
+
+Delivery is at least once: a relay that crashes between XADD and marking the
+rows published re-sends them, so consumers dedupe on `event_id`. The stream is
+capped at USER_EVENTS_STREAM_MAXLEN entries; a consumer resuming from an id
+that was trimmed away gets a `reset` and must rescan GET /users/.
+
+A stream ends when the worker starts draining, without waiting for its
+blocking read, and after USER_EVENTS_SSE_MAX_SECONDS in any case; clients
+reconnect with Last-Event-ID and lose nothing.
+"""
+
+from fastapi import Request
+from redis.asyncio import Redis
+
+from typing import AsyncIterator, List, Optional, Tuple
+import asyncio
+import json
+
+from app.config.redis import redis_client
+from app.config.settings import get_settings
+from app.core.lifecycle import lifecycle
+
+from .models import UserEvent
+
+settings = get_settings()
+
+STREAM_KEY = "users:events"
+
+
+def stream_fields(event: UserEvent) -> dict:
+    return {
+        "event_id": event.id,
+        "type": event.type,
+        "user_id": str(event.user_id),
+        "payload": json.dumps(event.payload),
+        "created_at": event.created_at.isoformat(),
+    }
+
+
+async def publish(redis: Redis, events: List[UserEvent]) -> List[str]:
+    """XADD the events in order, returns their stream ids"""
+    async with redis.pipeline(transaction=False) as pipe:
+        for event in events:
+            pipe.xadd(
+                STREAM_KEY,
+                stream_fields(event),
+                maxlen=settings.USER_EVENTS_STREAM_MAXLEN,
+                approximate=True,
+            )
+        return await pipe.execute()
+
+
+def parse_id(stream_id: str) -> Tuple[int, int]:
+    ms, _, seq = stream_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+async def resolve_start(redis: Redis, after: Optional[str]) -> Tuple[str, bool]:
+    """(id to read after, whether the consumer missed trimmed entries)
+
+    Without an offset the feed starts at the current end. "$" isn't used for
+    that, it would skip entries added between two blocking reads.
+    """
+    if not after:
+        last = await redis.xrevrange(STREAM_KEY, count=1)
+        return (last[0][0] if last else "0-0"), False
+
+    parse_id(after)  # ValueError for garbage offsets
+    first = await redis.xrange(STREAM_KEY, count=1)
+    trimmed = bool(first) and after != "0-0" and parse_id(after) < parse_id(first[0][0])
+    return after, trimmed
+
+
+def sse_message(stream_id: str, fields: dict) -> str:
+    data = {
+        "event_id": int(fields["event_id"]),
+        "type": fields["type"],
+        "user_id": fields["user_id"],
+        "user": json.loads(fields["payload"]),
+        "created_at": fields["created_at"],
+    }
+    return f"id: {stream_id}\nevent: {fields['type']}\ndata: {json.dumps(data)}\n\n"
+
+
+async def event_stream(request: Request, after: Optional[str]) -> AsyncIterator[str]:
+    """SSE messages for every event after `after`, until the client goes away,
+    the worker drains or the stream reached its maximum lifetime"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.USER_EVENTS_SSE_MAX_SECONDS
+    # a blocking XREAD holds its connection, so each stream gets its own client
+    redis = redis_client()
+    async with redis:
+        draining = asyncio.ensure_future(lifecycle.wait_draining())
+        read = None
+        try:
+            last_id, trimmed = await resolve_start(redis, after)
+            if trimmed:
+                yield "event: reset\ndata: {}\n\n"
+                last_id = "0-0"
+
+            while not draining.done() and not await request.is_disconnected():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                block = min(settings.USER_EVENTS_SSE_BLOCK_SECONDS, remaining)
+                read = asyncio.ensure_future(
+                    redis.xread({STREAM_KEY: last_id}, count=100, block=max(1, int(block * 1000)))
+                )
+                await asyncio.wait({read, draining}, return_when=asyncio.FIRST_COMPLETED)
+                if not read.done():
+                    # draining started mid-read, the read is cancelled below
+                    break
+                entries = read.result()
+                if not entries:
+                    yield ": keepalive\n\n"
+                    continue
+                for _, items in entries:
+                    for stream_id, fields in items:
+                        last_id = stream_id
+                        yield sse_message(stream_id, fields)
+        finally:
+            draining.cancel()
+            if read is not None and not read.done():
+                read.cancel()
+                await asyncio.wait({read})
@@ -0,0 +1,95 @@
+"""
+Time-ordered expiry index for PENDING users.
+
+Each signup adds the user id to a redis sorted set scored by the unix time at
+which the account should be removed if still unverified. The reaper task only
+reads the due head of that set, so deletion cost is spread over the day instead
+of piling up for the nightly scan.
+
+The index is an optimisation, never the source of truth: the reaper only deletes
+rows that are still PENDING, and when the sentinel key is missing (redis was
+flushed or restarted without persistence, or on first deploy) it rebuilds the
+index from the database and runs the full scan once.
+"""
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from uuid import UUID
+import logging
+
+from app.config.redis import get_redis
+from app.config.settings import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+EXPIRY_KEY = "users:pending_expiry"
+# present while the index is known to be complete
+SENTINEL_KEY = "users:pending_expiry:ready"
+
+
+def expiry_deadline(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.now()) + timedelta(hours=settings.UNVERIFIED_USER_TTL_HOURS)
+
+
+def expiry_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Users created at or before this are past their deadline"""
+    return (now or datetime.now()) - timedelta(hours=settings.UNVERIFIED_USER_TTL_HOURS)
+
+
+async def schedule_expiry(
+    user_id: UUID, deadline: datetime, redis: Optional[Redis] = None
+) -> bool:
+    redis = redis or get_redis()
+    if redis is None:
+        return False
+    try:
+        await redis.zadd(EXPIRY_KEY, {str(user_id): deadline.timestamp()})
+        return True
+    except RedisError as ex:
+        # the fallback scan still catches this user
+        logger.warning("could not index pending user %s: %s", user_id, ex)
+        return False
+
+
+async def cancel_expiry(user_id: UUID, redis: Optional[Redis] = None) -> None:
+    redis = redis or get_redis()
+    if redis is None:
+        return
+    try:
+        await redis.zrem(EXPIRY_KEY, str(user_id))
+    except RedisError as ex:
+        # harmless, the reaper skips users that are no longer PENDING
+        logger.warning("could not drop %s from expiry index: %s", user_id, ex)
+
+
+async def schedule_many(redis: Redis, created: Dict[str, datetime]) -> None:
+    """Index users by id from their created_at, as their signups would have"""
+    if created:
+        ttl = settings.UNVERIFIED_USER_TTL_HOURS * 3600
+        await redis.zadd(EXPIRY_KEY, {user_id: at.timestamp() + ttl for user_id, at in created.items()})
+
+
+async def index_ready(redis: Redis) -> bool:
+    return bool(await redis.exists(SENTINEL_KEY))
+
+
+async def mark_index_ready(redis: Redis, now: Optional[datetime] = None) -> None:
+    await redis.set(SENTINEL_KEY, (now or datetime.now()).isoformat())
+
+
+async def due_user_ids(
+    redis: Redis, now: Optional[datetime] = None, limit: int = 200
+) -> List[str]:
+    now = now or datetime.now()
+    return await redis.zrangebyscore(
+        EXPIRY_KEY, "-inf", now.timestamp(), start=0, num=limit
+    )
+
+
+async def drop_ids(redis: Redis, ids: List[str]) -> None:
+    if ids:
+        await redis.zrem(EXPIRY_KEY, *ids)
@@ -1,29 +1,112 @@
-from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, JSONB
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, Enum, DateTime
+from sqlalchemy import String, Enum, DateTime, Date, BigInteger, Identity, Index, literal_column, text
 from sqlalchemy.sql import func
 
 from passlib.context import CryptContext
 
 from app.config.database import Base
-from app.core import UserStatus, UserRole
+from app.config.settings import get_settings
+from app.core import UserStatus, UserRole, UserEventType, uuid7
+from app.core.tracing import start_span
+
+from uuid import UUID
+from typing import Optional
+from datetime import date, datetime, timedelta
+
+settings = get_settings()
+
+
+def password_context(
+    scheme: str = "bcrypt",
+    bcrypt_rounds: int = 12,
+    argon2_time_cost: int = 3,
+    argon2_memory_kib: int = 65536,
+    argon2_parallelism: int = 4,
+) -> CryptContext:
+    """New digests use `scheme` at exactly these costs.
+
+    Digests of the other scheme, or with a lower or higher cost, still verify
+    and are reported by needs_update, so costs can move either way.
+    """
+    context = CryptContext(
+        schemes=["bcrypt", "argon2"],
+        default=scheme,
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds,
+        bcrypt__min_desired_rounds=bcrypt_rounds,
+        bcrypt__max_desired_rounds=bcrypt_rounds,
+        argon2__rounds=argon2_time_cost,
+        argon2__min_desired_rounds=argon2_time_cost,
+        argon2__max_desired_rounds=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_kib,
+        argon2__parallelism=argon2_parallelism,
+    )
+    if scheme == "argon2" and not context.handler("argon2").has_backend():
+        raise RuntimeError("PASSWORD_SCHEME=argon2 needs the argon2-cffi package")
+    return context
+
+
+pwd_context = password_context(
+    settings.PASSWORD_SCHEME,
+    bcrypt_rounds=settings.BCRYPT_ROUNDS,
+    argon2_time_cost=settings.ARGON2_TIME_COST,
+    argon2_memory_kib=settings.ARGON2_MEMORY_KIB,
+    argon2_parallelism=settings.ARGON2_PARALLELISM,
+)
+
+
+def hash_password(plain_password: str) -> str:
+    with start_span("password.hash"):
+        return pwd_context.hash(plain_password)
 
-from uuid import UUID, uuid4
-from datetime import datetime, timedelta
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# columns UserRepo.search_users matches, each with two lower() indexes
+SEARCH_COLUMNS = ("email", "name", "surname")
 
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # a deleted user's email can sign up again
+        Index(
+            "ix_users_email_live",
+            "email",
+            unique=True,
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        # the purge only ever scans deleted rows
+        Index(
+            "ix_users_deleted_at",
+            "deleted_at",
+            postgresql_where=text("deleted_at IS NOT NULL"),
+        ),
+        # search (UserRepo.search_users), built by migration 31ee0292bea4:
+        # btrees for `LIKE 'term%'`, trigram GIN (pg_trgm) for `LIKE '%term%'`
+        *(
+            Index(
+                f"ix_users_{column}_lower_prefix",
+                func.lower(literal_column(column)).label(f"{column}_lower"),
+                postgresql_ops={f"{column}_lower": "text_pattern_ops"},
+            )
+            for column in SEARCH_COLUMNS
+        ),
+        *(
+            Index(
+                f"ix_users_{column}_lower_trgm",
+                func.lower(literal_column(column)).label(f"{column}_lower"),
+                postgresql_using="gin",
+                postgresql_ops={f"{column}_lower": "gin_trgm_ops"},
+            )
+            for column in SEARCH_COLUMNS
+        ),
+    )
 
     id: Mapped[UUID] = mapped_column(
-        PG_UUID(as_uuid=True), primary_key=True, default=uuid4
+        PG_UUID(as_uuid=True), primary_key=True, default=uuid7
     )
 
-    email: Mapped[str] = mapped_column(
-        String(255), nullable=False, unique=True, index=True
-    )
+    email: Mapped[str] = mapped_column(String(255), nullable=False)
     password: Mapped[str] = mapped_column(String(255), nullable=False)
 
     name: Mapped[str] = mapped_column(String(100))
@@ -46,6 +129,17 @@ class User(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
+    # write-behind, see app.users.activity; not indexed so the flushes stay HOT updates
+    last_login_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    last_seen_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    # set on delete, purge_deleted_users removes the row later
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
 
     def generate_verification_code(self) -> str:
         import random
@@ -65,7 +159,89 @@ class User(Base):
         return self.verification_code == code
 
     def set_password(self, plain_password: str) -> None:
-        self.password = pwd_context.hash(plain_password)
+        self.password = hash_password(plain_password)
 
     def verify_password(self, plain_password: str) -> bool:
-        return pwd_context.verify(plain_password, self.password)
+        with start_span("password.verify"):
+            return pwd_context.verify(plain_password, self.password)
+
+    def password_needs_rehash(self) -> bool:
+        """Digest made with another scheme or cost than the configured one"""
+        return pwd_context.needs_update(self.password)
+
+
+# Counters below are maintained by statement-level triggers on `users` (see
+# migration 5c0d7e1a9f43), in the same transaction as the write. Reads are
+# O(1) regardless of table size; reconcile_user_stats corrects drift.
+
+
+class UserStatusCount(Base):
+    __tablename__ = "user_status_counts"
+
+    status: Mapped[UserStatus] = mapped_column(
+        Enum(UserStatus, values_callable=lambda x: [e.value for e in x]),
+        primary_key=True,
+    )
+    # NULL roles are counted as USER
+    role: Mapped[UserRole] = mapped_column(
+        Enum(UserRole, values_callable=lambda x: [e.value for e in x]),
+        primary_key=True,
+    )
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class UserSignupDaily(Base):
+    __tablename__ = "user_signups_daily"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    signups: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+# Transactional outbox: events are inserted in the same transaction as the
+# change they describe, and relay_user_events copies them to a redis stream.
+# `id` gives the publish order; it follows commit order per user only, writers
+# lock the user's row first (UserRepo.lock).
+
+
+class UserEvent(Base):
+    __tablename__ = "user_events"
+    __table_args__ = (
+        # the relay only ever scans the unpublished tail
+        Index(
+            "ix_user_events_unpublished",
+            "id",
+            postgresql_where=text("published_at IS NULL"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    user_id: Mapped[UUID] = mapped_column(PG_UUID(as_uuid=True), nullable=False)
+    type: Mapped[str] = mapped_column(String(32), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    published_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+    @classmethod
+    def for_user(cls, type: UserEventType, user: User, **extra) -> "UserEvent":
+        """Event carrying the user's public fields as they are after the change"""
+        snapshot = {
+            "id": str(user.id),
+            "email": user.email,
+            "name": user.name,
+            "surname": user.surname,
+            "status": str(user.status) if user.status else None,
+            "role": str(user.role) if user.role else None,
+        }
+        return cls(user_id=user.id, type=str(type), payload={**snapshot, **extra})
+
+    @classmethod
+    def deleted(cls, user_id: UUID, **extra) -> "UserEvent":
+        return cls(
+            user_id=user_id,
+            type=str(UserEventType.DELETED),
+            payload={"id": str(user_id), **extra},
+        )
@@ -1,10 +1,107 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, func, or_, case, tuple_, literal, any_
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.sql import Select
 
 from uuid import UUID
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
+from weakref import WeakKeyDictionary
+import asyncio
+import logging
 
-from .models import User, UserStatus
+from .cache import Snapshot, build, snapshot, user_cache
+from .models import User, UserStatus, UserStatusCount, UserSignupDaily, UserEvent, hash_password
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import get_settings
+from app.core import UserEventType
+from app.core.dataloader import DataLoader
+
+from datetime import date
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+# soft-deleted users are invisible to everything but the purge
+LIVE = User.deleted_at.is_(None)
+
+# rank of a search hit, lower is better
+SEARCH_EXACT_EMAIL, SEARCH_PREFIX, SEARCH_SUBSTRING = 0, 1, 2
+# trigram indexes can't serve shorter substrings, those only prefix match
+SEARCH_MIN_SUBSTRING = 3
+
+
+def _escape_like(value: str) -> str:
+    # "!" rather than backslash, which depends on standard_conforming_strings
+    return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def build_search_query(
+    term: str, limit: int, after: Optional[Tuple[int, UUID]] = None
+) -> Select:
+    """Case-insensitive search over email, name and surname.
+
+    Backed by the lower() expression indexes from migration 31ee0292bea4:
+    text_pattern_ops btrees for prefixes, pg_trgm GIN for substrings.
+    Results are ordered by (rank, id), which is also the keyset cursor.
+    """
+    term = term.strip().lower()
+    pattern = _escape_like(term)
+    columns = [func.lower(User.email), func.lower(User.name), func.lower(User.surname)]
+
+    prefix = or_(*[col.like(f"{pattern}%", escape="!") for col in columns])
+    if len(term) >= SEARCH_MIN_SUBSTRING:
+        match = or_(*[col.like(f"%{pattern}%", escape="!") for col in columns])
+    else:
+        match = prefix
+
+    rank = case(
+        (columns[0] == term, SEARCH_EXACT_EMAIL),
+        (prefix, SEARCH_PREFIX),
+        else_=SEARCH_SUBSTRING,
+    )
+
+    stmt = select(User, rank.label("rank")).where(match, LIVE)
+    if after is not None:
+        stmt = stmt.where(tuple_(rank, User.id) > tuple_(literal(after[0]), literal(after[1])))
+
+    return stmt.order_by(rank, User.id).limit(limit)
+
+
+async def _load_users(user_ids: List[UUID]) -> Dict[UUID, User]:
+    # own short session: the batch serves callers from different requests
+    async with AsyncSessionLocal() as session:
+        users = await UserRepo(session).get_users_by_ids(user_ids)
+    return {user.id: user for user in users}
+
+
+async def _load_user(user_id: UUID) -> Optional[Snapshot]:
+    user = await user_loader().load(user_id)
+    return snapshot(user) if user is not None else None
+
+
+async def _load_user_by_email(email: str) -> Optional[Snapshot]:
+    async with AsyncSessionLocal() as session:
+        user = await UserRepo(session).query_user_by_email(email)
+        return snapshot(user) if user is not None else None
+
+
+_user_loaders: "WeakKeyDictionary[asyncio.AbstractEventLoop, DataLoader]" = WeakKeyDictionary()
+
+
+def user_loader() -> DataLoader:
+    """The id lookup loader of the running event loop"""
+    loop = asyncio.get_running_loop()
+    loader = _user_loaders.get(loop)
+    if loader is None:
+        loader = _user_loaders[loop] = DataLoader(
+            _load_users,
+            window=settings.USER_LOADER_WINDOW_MS / 1000,
+            max_batch=settings.USER_BATCH_MAX_IDS,
+        )
+    return loader
 
 
 class UserRepo:
@@ -19,41 +116,157 @@ class UserRepo:
         result.set_password(password)
 
         self.db.add(result)
+        # flushed first so the event sees the generated id and defaults
+        await self.db.flush()
+        self.db.add(UserEvent.for_user(UserEventType.CREATED, result))
         await self.db.commit()
         await self.db.refresh(result)
 
         return result
 
     async def get_user_by_id(self, user_id: UUID) -> Optional[User]:
-        user = await self.db.execute(select(User).where(User.id == user_id))
+        """Lookup by id through the user cache; misses are coalesced with
+        concurrent lookups from other requests.
+
+        The row is merged into this session without another query, so the
+        caller can modify and commit it as usual. Sessions with unflushed
+        changes query directly to keep reading their own writes.
+        """
+        if not isinstance(user_id, UUID):
+            user_id = UUID(str(user_id))
+
+        cached = self.db.identity_map.get(identity_key(User, user_id))
+        if cached is not None:
+            return cached if cached.deleted_at is None else None
+
+        if self.db.new or self.db.dirty or self.db.deleted:
+            result = await self.db.execute(select(User).where(User.id == user_id, LIVE))
+            return result.scalar_one_or_none()
+
+        snap = await user_cache.get_by_id(user_id, lambda: _load_user(user_id))
+        if snap is None:
+            return None
+        return await self.db.merge(build(snap), load=False)
+
+    async def get_users_by_ids(self, user_ids: List[UUID]) -> List[User]:
+        if not user_ids:
+            return []
+        # one array parameter, so the statement is the same for any batch size
+        ids = literal(list(user_ids), ARRAY(PG_UUID(as_uuid=True)))
+        result = await self.db.execute(select(User).where(User.id == any_(ids), LIVE))
+        return result.scalars().all()
+
+    async def lock(self, user: User) -> User:
+        """Reload the row FOR UPDATE before changing it.
 
-        return user.scalar_one_or_none()
+        Concurrent changes to one user then commit one after the other, so
+        their outbox events get ids in commit order and each event's snapshot
+        includes the change committed before it. Cached rows may be stale,
+        this reads the committed one.
+        """
+        await self.db.refresh(user, with_for_update=True)
+        return user
 
     async def get_user_by_email(self, email: str) -> Optional[User]:
-        result = await self.db.execute(select(User).where(User.email == email))
+        """Lookup by email through the user cache, same rules as get_user_by_id"""
+        if self.db.new or self.db.dirty or self.db.deleted:
+            return await self.query_user_by_email(email)
+
+        snap = await user_cache.get_by_email(email, lambda: _load_user_by_email(email))
+        if snap is None:
+            return None
+        # an instance this session already holds wins over the cached row
+        cached = self.db.identity_map.get(identity_key(User, snap["id"]))
+        if cached is not None:
+            return cached if cached.deleted_at is None else None
+        return await self.db.merge(build(snap), load=False)
+
+    async def query_user_by_email(self, email: str) -> Optional[User]:
+        result = await self.db.execute(select(User).where(User.email == email, LIVE))
         return result.scalar_one_or_none()
 
     async def authenticate_user(self, email: str, password: str) -> Optional[User]:
-        user = await self.get_user_by_email(email)
-        if user and user.verify_password(password):
-            return user
-        return None
+        # the digest isn't cached, read the row
+        user = await self.query_user_by_email(email)
+        # hashing costs tens of milliseconds by design, keep it off the event loop
+        if not user or not await asyncio.to_thread(user.verify_password, password):
+            return None
+        # the only moment the plain password is known, so costs change on login
+        if user.password_needs_rehash():
+            await self.rehash_password(user, password)
+        return user
+
+    async def rehash_password(self, user: User, password: str) -> bool:
+        """Store the password hashed with the current scheme and cost.
+
+        Best effort, in its own session so a failure can't spoil the login,
+        and only over the digest that was verified: a password changed
+        meanwhile is left alone.
+        """
+        digest = await asyncio.to_thread(hash_password, password)
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    update(User)
+                    .where(User.id == user.id, User.password == user.password)
+                    .values(password=digest)
+                )
+                await session.commit()
+        except Exception as ex:
+            logger.warning("could not rehash password of %s: %s", user.id, ex)
+            return False
+        if not result.rowcount:
+            return False
+        await user_cache.invalidate([user.id])
+        return True
 
     async def verify_user(self, user: User) -> User:
+        await self.lock(user)
         user.status = UserStatus.VERIFIED
         user.verification_code = None
         user.verification_code_expires = None
+        self.db.add(UserEvent.for_user(UserEventType.VERIFIED, user))
 
         await self.db.commit()
+        await user_cache.invalidate([user.id])
         await self.db.refresh(user)
 
         return user
 
     async def update_verification_code(self, user: User) -> User:
         await self.db.commit()
+        await user_cache.invalidate([user.id])
         await self.db.refresh(user)
 
-    async def fetch_all_users(self) -> Optional[List[User]]:
-        users = await self.db.execute(select(User))
+    async def fetch_all_users(
+        self, after: Optional[UUID] = None, limit: Optional[int] = None
+    ) -> Optional[List[User]]:
+        # ids are uuid7 (time ordered), so ordering by the pk walks the index
+        # in insertion order and `after` works as a keyset cursor
+        stmt = select(User).where(LIVE).order_by(User.id)
+        if after is not None:
+            stmt = stmt.where(User.id > after)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+
+        users = await self.db.execute(stmt)
 
         return users.scalars().all()
+
+    async def fetch_status_counts(self) -> List[UserStatusCount]:
+        result = await self.db.execute(select(UserStatusCount))
+        return result.scalars().all()
+
+    async def fetch_signups_since(self, since: date) -> List[UserSignupDaily]:
+        result = await self.db.execute(
+            select(UserSignupDaily)
+            .where(UserSignupDaily.day >= since)
+            .order_by(UserSignupDaily.day)
+        )
+        return result.scalars().all()
+
+    async def search_users(
+        self, term: str, limit: int, after: Optional[Tuple[int, UUID]] = None
+    ) -> List[Tuple[User, int]]:
+        result = await self.db.execute(build_search_query(term, limit, after))
+        return [(row.User, row.rank) for row in result]
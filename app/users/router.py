@@ -1,14 +1,32 @@
 from fastapi.routing import APIRouter
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, status, Query, Header, Request
+from fastapi.responses import StreamingResponse
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.audit.buffer import audit
 from app.config import get_db
-from app.config.dependencies import get_current_user
+from app.config.dependencies import get_current_user, require_service_token
+from app.config.redis import get_redis
 
-from .schemas import UserResponse, UserListResponse, UserUpdate
+from .schemas import (
+    UserBatchRequest,
+    UserBatchResponse,
+    UserCacheStats,
+    UserResponse,
+    UserListResponse,
+    UserSearchResponse,
+    UserStatsResponse,
+    UserUpdate,
+)
 from .models import User, UserRole
+from app.core import AuditAction
+from .cache import user_cache
 from .services import AdminService, UserService
+from .events import event_stream, parse_id
+
+from uuid import UUID
+from typing import Optional
 
 router = APIRouter(prefix="/users")
 
@@ -34,16 +52,112 @@ async def me(
     "/",
     response_model=UserListResponse,
     summary="List all users",
-    description="Retrieve a list of all registered users in the system. This endpoint is restricted to administrators only.",
+    description="Retrieve a list of all registered users in the system, ordered by ID. Pass `limit` to paginate and feed `next_cursor` back as `after` to get the next page. This endpoint is restricted to administrators only.",
     tags=["admin"],
 )
 async def users(
-    current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)
+    after: Optional[UUID] = Query(None, description="keyset cursor, last id of the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
 
     check_perm(current_user)
-    users = await AdminService(db).fetch_all_users()
-    return {"users": users}
+    users = await AdminService(db).fetch_all_users(after=after, limit=limit)
+    next_cursor = users[-1].id if limit is not None and len(users) == limit else None
+    return {"users": users, "next_cursor": next_cursor}
+
+
+@router.get(
+    "/stats",
+    response_model=UserStatsResponse,
+    summary="User statistics",
+    description="Totals by status and role plus signups per day for the last `days` days. Served from counters maintained on every write, so the cost doesn't grow with the number of users. Only accessible to administrators.",
+    tags=["admin"],
+)
+async def user_stats(
+    days: int = Query(30, ge=1, le=366),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    check_perm(current_user)
+    return await AdminService(db).get_stats(days)
+
+
+@router.get(
+    "/cache-stats",
+    response_model=UserCacheStats,
+    summary="User cache statistics",
+    description="Hit counters of the id/email lookup cache since this worker started. Counters are per worker, so consecutive calls may hit different workers. Only accessible to administrators.",
+    tags=["admin"],
+)
+async def user_cache_stats(current_user: User = Depends(get_current_user)):
+    check_perm(current_user)
+    return user_cache.stats()
+
+
+@router.get(
+    "/search",
+    response_model=UserSearchResponse,
+    summary="Search users",
+    description="Case-insensitive search over email, name and surname. Terms of 3+ characters match anywhere in the field, shorter ones match prefixes only. Exact email matches rank first, then prefix matches, then substring matches. Paginate with `next_cursor`. Only accessible to administrators.",
+    tags=["admin"],
+)
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=255),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    check_perm(current_user)
+    users, next_cursor = await AdminService(db).search_users(q, limit=limit, cursor=cursor)
+    return {"users": users, "next_cursor": next_cursor}
+
+
+@router.get(
+    "/events",
+    summary="User change feed",
+    description="Server-sent events for every user change (`created`, `verified`, `updated`, `role_changed`, `deleted`), each carrying the user's fields after the change. One user's events arrive in the order their changes committed; events of different users are only roughly ordered, so use `event_id` as the user's version and skip events older than the last one applied. Resume with the `Last-Event-ID` header (sent automatically by EventSource) or `after`; without either the feed starts at the current end. A `reset` event means the offset is older than the retained history and the consumer should rescan `GET /users/`. Delivery is at least once, dedupe on `event_id`. Requires `Authorization: Bearer <service token>`.",
+    dependencies=[Depends(require_service_token)],
+    tags=["service"],
+)
+async def user_events(
+    request: Request,
+    after: Optional[str] = Query(None, description="stream id of the last event processed"),
+    last_event_id: Optional[str] = Header(None),
+):
+    if get_redis() is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="change feed requires redis",
+        )
+
+    offset = last_event_id or after
+    if offset:
+        try:
+            parse_id(offset)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="invalid offset")
+
+    return StreamingResponse(
+        event_stream(request, offset),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post(
+    "/batch",
+    response_model=UserBatchResponse,
+    summary="Get users by IDs",
+    description="Fetch up to `USER_BATCH_MAX_IDS` users in one query. Users come back in the order of `ids`, ids without a user are listed in `missing`. Requires `Authorization: Bearer <service token>`.",
+    dependencies=[Depends(require_service_token)],
+    tags=["service"],
+)
+async def users_batch(payload: UserBatchRequest, db: AsyncSession = Depends(get_db)):
+    users, missing = await UserService(db).get_users_by_ids(payload.ids)
+    return {"users": users, "missing": missing}
 
 
 @router.get(
@@ -54,7 +168,7 @@ async def users(
     tags=["admin"],
 )
 async def retrieve_user(
-    user_id,
+    user_id: UUID,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -70,8 +184,9 @@ async def retrieve_user(
     tags=["admin"],
 )
 async def patch_user(
-    user_id,
+    user_id: UUID,
     payload: UserUpdate,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -80,6 +195,13 @@ async def patch_user(
     updated_user = await AdminService(db).update_user(
         user_id, payload.model_dump(exclude_unset=True)
     )
+    audit.record(
+        AuditAction.USER_UPDATED,
+        actor_id=current_user.id,
+        target_id=updated_user.id,
+        request=request,
+        fields=payload.model_dump(mode="json", exclude_unset=True),
+    )
     return updated_user
 
 
@@ -88,16 +210,23 @@ async def patch_user(
     response_model=None,
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Delete user",
-    description="Permanently delete a user from the system by their ID. This action cannot be undone. Only accessible to administrators.",
+    description="Delete a user by their ID. The user disappears immediately and their sessions end; the row itself is purged in the background. Only accessible to administrators.",
     tags=["admin"],
 )
 async def delete_user(
-    user_id,
+    user_id: UUID,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     check_perm(current_user)
-    return await AdminService(db).delete_user(user_id)
+    await AdminService(db).delete_user(user_id)
+    audit.record(
+        AuditAction.USER_DELETED,
+        actor_id=current_user.id,
+        target_id=user_id,
+        request=request,
+    )
 
 
 @router.post(
@@ -107,14 +236,22 @@ async def delete_user(
     tags=["users", "development"],
 )
 async def toggle_admin(
-    current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
 
-    current_user.role = (
-        UserRole.ADMIN if current_user.role == UserRole.USER else UserRole.USER
+    await UserService(db).set_role(
+        current_user,
+        UserRole.ADMIN if current_user.role == UserRole.USER else UserRole.USER,
+    )
+    audit.record(
+        AuditAction.ROLE_TOGGLED,
+        actor_id=current_user.id,
+        target_id=current_user.id,
+        request=request,
+        new_role=str(current_user.role),
     )
-    await db.commit()
-    await db.refresh(current_user)
 
     return {"new_role": f"{current_user.role}"}
 
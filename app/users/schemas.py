@@ -1,10 +1,14 @@
 from pydantic import BaseModel, Field, ConfigDict
 
-from typing import Optional, List
+from typing import Optional, List, Dict
 from uuid import UUID
+from datetime import date
 
+from app.config.settings import get_settings
 from app.core import UserRole, UserStatus
 
+settings = get_settings()
+
 
 class UserResponse(BaseModel):
 
@@ -31,6 +35,62 @@ class UserResponse(BaseModel):
 
 class UserListResponse(BaseModel):
     users: List[UserResponse]
+    next_cursor: Optional[UUID] = Field(
+        None, description="Pass as `after` to fetch the next page, null on the last page."
+    )
+
+
+class UserSearchResponse(BaseModel):
+    users: List[UserResponse] = Field(
+        ..., description="Exact email matches first, then prefix, then substring matches."
+    )
+    next_cursor: Optional[str] = Field(
+        None, description="Pass as `cursor` to fetch the next page, null on the last page."
+    )
+
+
+class UserBatchRequest(BaseModel):
+    ids: List[UUID] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.USER_BATCH_MAX_IDS,
+        description="user ids to fetch, duplicates are returned once",
+    )
+
+
+class UserBatchResponse(BaseModel):
+    users: List[UserResponse] = Field(
+        ..., description="Users found, in the order of the requested ids."
+    )
+    missing: List[UUID] = Field(..., description="Requested ids with no user.")
+
+
+class DailySignups(BaseModel):
+    day: date
+    signups: int
+
+
+class UserStatsResponse(BaseModel):
+    total: int = Field(..., description="Number of users currently in the table.")
+    by_status: Dict[UserStatus, int]
+    by_role: Dict[UserRole, int]
+    signups_per_day: List[DailySignups] = Field(
+        ..., description="Signups per UTC day, days without signups are omitted."
+    )
+
+
+class UserCacheStats(BaseModel):
+    enabled: bool
+    size: int = Field(..., description="Entries in this worker's in-process tier.")
+    lookups: int
+    l1_hits: int
+    l2_hits: int
+    misses: int = Field(..., description="Lookups that went to the database.")
+    hit_ratio: Optional[float] = Field(
+        None, description="Share of lookups served by either tier, null before the first lookup."
+    )
+    l1_hit_ratio: Optional[float] = None
+    invalidations: int
 
 
 class UserUpdate(BaseModel):
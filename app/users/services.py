@@ -1,11 +1,17 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 
+from .cache import user_cache
 from .repository import UserRepo
-from .models import User, UserStatus
+from .models import User, UserStatus, UserRole, UserEvent
+from .expiry import schedule_expiry, cancel_expiry, expiry_deadline
+
+from app.auth.sessions import end_all_sessions
+from app.core import UserEventType
 
 from uuid import UUID
-from typing import Optional, List
+from typing import Optional, List, Tuple
+from datetime import datetime, timedelta, timezone
 
 
 class UserService:
@@ -22,6 +28,12 @@ class UserService:
     async def get_user_by_id(self, user_id: UUID):
         return await self.repo.get_user_by_id(user_id)
 
+    async def get_users_by_ids(self, user_ids: List[UUID]) -> Tuple[List[User], List[UUID]]:
+        """Users in request order, and the ids that matched nobody"""
+        ids = list(dict.fromkeys(user_ids))
+        found = {user.id: user for user in await self.repo.get_users_by_ids(ids)}
+        return [found[i] for i in ids if i in found], [i for i in ids if i not in found]
+
     async def authenticate_user(self, email: str, password: str) -> User:
         return await self.repo.authenticate_user(email=email, password=password)
 
@@ -35,10 +47,13 @@ class UserService:
         code = user.generate_verification_code()
         await self.repo.update_verification_code(user)
 
+        await schedule_expiry(user.id, expiry_deadline())
+
         return user, code
 
     async def verify_user_email(self, email: str, code: str) -> Optional[User]:
-        user = await self.repo.get_user_by_email(email)
+        # the code isn't cached, read the row
+        user = await self.repo.query_user_by_email(email)
 
         if not user:
             return None
@@ -49,7 +64,10 @@ class UserService:
         if not user.verify_code(code):
             return None
 
-        return await self.repo.verify_user(user)
+        user = await self.repo.verify_user(user)
+        await cancel_expiry(user.id)
+
+        return user
 
     async def resend_verification_code(self, email: str) -> Optional[tuple[User, str]]:
         user = await self.repo.get_user_by_email(email)
@@ -65,25 +83,93 @@ class UserService:
 
         return user, code
 
+    async def set_role(self, user: User, role: UserRole) -> User:
+        await self.repo.lock(user)
+        user.role = role
+        self.repo.db.add(UserEvent.for_user(UserEventType.ROLE_CHANGED, user))
+        await self.repo.db.commit()
+        await user_cache.invalidate([user.id])
+        await self.repo.db.refresh(user)
+        return user
+
 
 class AdminService(UserService):
-    async def fetch_all_users(self) -> Optional[List[User]]:
-        return await self.repo.fetch_all_users()
+    async def fetch_all_users(
+        self, after: Optional[UUID] = None, limit: Optional[int] = None
+    ) -> Optional[List[User]]:
+        return await self.repo.fetch_all_users(after=after, limit=limit)
+
+    async def get_stats(self, days: int) -> dict:
+        counts = await self.repo.fetch_status_counts()
+        since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+        signups = await self.repo.fetch_signups_since(since)
+
+        by_status, by_role = {}, {}
+        for row in counts:
+            by_status[row.status] = by_status.get(row.status, 0) + row.count
+            by_role[row.role] = by_role.get(row.role, 0) + row.count
+
+        return {
+            "total": sum(row.count for row in counts),
+            "by_status": by_status,
+            "by_role": by_role,
+            "signups_per_day": [{"day": s.day, "signups": s.signups} for s in signups],
+        }
+
+    async def search_users(
+        self, term: str, limit: int, cursor: Optional[str] = None
+    ) -> Tuple[List[User], Optional[str]]:
+        after = None
+        if cursor:
+            try:
+                rank, _, last_id = cursor.partition(":")
+                after = (int(rank), UUID(last_id))
+            except ValueError:
+                raise HTTPException(400, "invalid cursor")
+
+        rows = await self.repo.search_users(term, limit=limit, after=after)
+
+        next_cursor = None
+        if len(rows) == limit:
+            last_user, last_rank = rows[-1]
+            next_cursor = f"{last_rank}:{last_user.id}"
+
+        return [user for user, _ in rows], next_cursor
 
     async def update_user(self, user_id: UUID, data: dict):
         user = await self.repo.get_user_by_id(user_id)
         if not user:
             raise HTTPException(404, "user not found")
+        await self.repo.lock(user)
 
+        changed = [key for key, value in data.items() if getattr(user, key) != value]
         for key, value in data.items():
             setattr(user, key, value)
 
+        if "role" in changed:
+            self.repo.db.add(UserEvent.for_user(UserEventType.ROLE_CHANGED, user))
+        if set(changed) - {"role"}:
+            self.repo.db.add(UserEvent.for_user(UserEventType.UPDATED, user, changed=changed))
+
         await self.repo.db.commit()
+        await user_cache.invalidate([user.id])
         await self.repo.db.refresh(user)
         return user
 
-    async def delete_user(self, user_id):
+    async def delete_user(self, user_id: UUID):
         user = await self.repo.get_user_by_id(user_id)
-        await self.repo.db.delete(user)
+        if not user:
+            raise HTTPException(404, "user not found")
+        await self.repo.lock(user)
+        if user.deleted_at is not None:
+            # deleted concurrently, after the lookup
+            raise HTTPException(404, "user not found")
+
+        # a one-row stamp, purge_deleted_users removes the row off-peak
+        user.deleted_at = datetime.now(timezone.utc)
+        self.repo.db.add(UserEvent.deleted(user.id, reason="admin"))
         await self.repo.db.commit()
+        await user_cache.invalidate([user.id])
+        # refresh no longer reads the user, so its sessions must end here
+        await end_all_sessions(user_id)
         return
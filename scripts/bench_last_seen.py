@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Benchmark write-behind activity tracking against per-request updates.
+
+Replays the same synthetic request stream (users picked with a Zipf-like skew,
+a few percent of requests are logins) against a scratch copy of the activity
+columns twice: once with an UPDATE per request, the way a naive
+get_current_user hook would do it, and once through ActivityTracker with a
+flush every --flush-seconds of simulated time. Reports statements, row
+versions written (HOT or not) and WAL volume for both.
+
+USAGE:
+    python scripts/bench_last_seen.py --users 20000 --requests 200000 --rps 2000
+    python scripts/bench_last_seen.py --flush-seconds 5 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import Column, DateTime, MetaData, Table, String, text, update
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config.settings import get_settings
+from app.users.activity import ActivityTracker
+
+TABLE = "bench_activity"
+
+metadata = MetaData()
+table = Table(
+    TABLE,
+    metadata,
+    Column("id", PG_UUID(as_uuid=True), primary_key=True),
+    Column("email", String(255), nullable=False, unique=True),
+    Column("last_login_at", DateTime(timezone=True)),
+    Column("last_seen_at", DateTime(timezone=True)),
+)
+
+
+def request_stream(user_ids, requests: int, rps: float, login_ratio: float, seed: int):
+    """(user, simulated time, is login), the hottest users get most requests"""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(user_ids))]
+    picks = rng.choices(user_ids, weights=weights, k=requests)
+    start = datetime.now(timezone.utc)
+    for i, user_id in enumerate(picks):
+        yield user_id, start + timedelta(seconds=i / rps), rng.random() < login_ratio
+
+
+async def table_stats(engine) -> dict:
+    async with engine.connect() as conn:
+        try:
+            # PG 15+, otherwise the counters lag by up to a second
+            await conn.execute(text("SELECT pg_stat_force_next_flush()"))
+        except Exception:
+            await conn.rollback()
+            await asyncio.sleep(1)
+        row = (
+            await conn.execute(
+                text(
+                    "SELECT n_tup_upd, n_tup_hot_upd, pg_current_wal_lsn() AS lsn "
+                    "FROM pg_stat_user_tables WHERE relname = :t"
+                ),
+                {"t": TABLE},
+            )
+        ).one()
+        return {"upd": row.n_tup_upd, "hot": row.n_tup_hot_upd, "lsn": row.lsn}
+
+
+async def wal_bytes(engine, before: str, after: str) -> int:
+    async with engine.connect() as conn:
+        return await conn.scalar(
+            text("SELECT pg_wal_lsn_diff(:a, :b)"), {"a": after, "b": before}
+        )
+
+
+async def per_request(engine, stream, concurrency: int) -> int:
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 4)
+    statements = 0
+
+    async def worker():
+        nonlocal statements
+        async with engine.connect() as conn:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                user_id, at, login = item
+                values = {"last_seen_at": at, **({"last_login_at": at} if login else {})}
+                await conn.execute(update(table).where(table.c.id == user_id).values(**values))
+                await conn.commit()
+                statements += 1
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    for item in stream:
+        await queue.put(item)
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    return statements
+
+
+async def write_behind(engine, stream, flush_seconds: float) -> int:
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    tracker = ActivityTracker(max_pending=1_000_000, table=table)
+    statements = 0
+
+    async def flush():
+        nonlocal statements
+        pending = len(tracker)
+        statements += -(-pending // tracker.chunk_size)
+        await tracker.flush(session_factory)
+
+    next_flush = None
+    for user_id, at, login in stream:
+        if next_flush is None:
+            next_flush = at + timedelta(seconds=flush_seconds)
+        if at >= next_flush:
+            await flush()
+            next_flush = at + timedelta(seconds=flush_seconds)
+        if login:
+            tracker.logged_in(user_id, at)
+        else:
+            tracker.seen(user_id, at)
+    await flush()
+    return statements
+
+
+async def main(args) -> int:
+    engine = create_async_engine(
+        get_settings().DATABASE_URL, pool_size=args.concurrency, max_overflow=0
+    )
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(lambda c: table.drop(c, checkfirst=True))
+            await conn.run_sync(metadata.create_all)
+            user_ids = [uuid.uuid4() for _ in range(args.users)]
+            await conn.execute(
+                table.insert(),
+                [{"id": u, "email": f"{u}@bench.example"} for u in user_ids],
+            )
+
+        results = []
+        for mode in args.modes:
+            stream = request_stream(user_ids, args.requests, args.rps, args.login_ratio, args.seed)
+            before = await table_stats(engine)
+            started = time.perf_counter()
+            if mode == "per-request":
+                statements = await per_request(engine, stream, args.concurrency)
+            else:
+                statements = await write_behind(engine, stream, args.flush_seconds)
+            elapsed = time.perf_counter() - started
+            after = await table_stats(engine)
+            results.append(
+                {
+                    "mode": mode,
+                    "statements": statements,
+                    "rows": after["upd"] - before["upd"],
+                    "hot": after["hot"] - before["hot"],
+                    "wal_mb": await wal_bytes(engine, before["lsn"], after["lsn"]) / 1024 / 1024,
+                    "seconds": elapsed,
+                }
+            )
+
+        if not args.keep:
+            async with engine.begin() as conn:
+                await conn.run_sync(lambda c: table.drop(c, checkfirst=True))
+    finally:
+        await engine.dispose()
+
+    print(f"{args.requests} requests from {args.users} users at {args.rps:.0f} req/s simulated")
+    print(f"{'mode':<13}{'statements':>12}{'rows':>10}{'HOT %':>8}{'WAL MB':>9}{'seconds':>9}")
+    for r in results:
+        hot = 100 * r["hot"] / r["rows"] if r["rows"] else 0
+        print(
+            f"{r['mode']:<13}{r['statements']:>12}{r['rows']:>10}"
+            f"{hot:>8.1f}{r['wal_mb']:>9.1f}{r['seconds']:>9.2f}"
+        )
+    if len(results) == 2 and results[1]["rows"]:
+        print(f"row writes reduced {results[0]['rows'] / results[1]['rows']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--rps", type=float, default=2_000, help="simulated request rate")
+    parser.add_argument("--login-ratio", type=float, default=0.02)
+    parser.add_argument("--flush-seconds", type=float, default=30.0)
+    parser.add_argument("--concurrency", type=int, default=16, help="connections for per-request updates")
+    parser.add_argument("--modes", nargs="+", default=["per-request", "write-behind"],
+                        choices=["per-request", "write-behind"])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch table")
+    sys.exit(asyncio.run(main(parser.parse_args())))
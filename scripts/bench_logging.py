@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark request latency under heavy logging: print() vs queue-based logging.
+
+Simulates concurrent requests on one event loop. Each request does a little
+async "work" and emits several log lines to a sink that, like a busy stdout
+pipe or a container log driver, takes some time per write. With print() the
+write happens on the event loop and stalls every request; with the queue
+handler the loop only enqueues and a background thread does the writes.
+
+USAGE:
+    python scripts/bench_logging.py --requests 2000 --concurrency 100 --logs 10
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.config.log import setup_logging, stop_logging
+
+
+class SlowSink(io.TextIOBase):
+    """A stream whose writes block for `delay` seconds."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.lines = 0
+
+    def write(self, s: str) -> int:
+        time.sleep(self.delay)
+        self.lines += 1
+        return len(s)
+
+    def flush(self) -> None:
+        pass
+
+
+async def handle(emit, logs: int) -> float:
+    started = time.perf_counter()
+    for i in range(logs):
+        await asyncio.sleep(0)
+        emit(i)
+    await asyncio.sleep(0.001)
+    return time.perf_counter() - started
+
+
+async def run(emit, requests: int, concurrency: int, logs: int) -> list:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            latencies.append(await handle(emit, logs))
+
+    await asyncio.gather(*[one() for _ in range(requests)])
+    return latencies
+
+
+def report(name: str, latencies: list, wall: float) -> None:
+    latencies = sorted(latencies)
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(
+        f"{name:<8} p50={p(0.50):8.2f}ms p99={p(0.99):8.2f}ms "
+        f"mean={statistics.mean(latencies) * 1000:8.2f}ms wall={wall:6.2f}s"
+    )
+
+
+def main(args) -> int:
+    # before: print() straight to the slow stream
+    sink = SlowSink(args.write_us / 1e6)
+
+    def emit_print(i):
+        print(f"✅ event {i} handled", file=sink)
+
+    started = time.perf_counter()
+    latencies = asyncio.run(run(emit_print, args.requests, args.concurrency, args.logs))
+    report("print", latencies, time.perf_counter() - started)
+
+    # after: queue handler, JSON formatting happens on the listener thread
+    sink = SlowSink(args.write_us / 1e6)
+    setup_logging(level="INFO", stream=sink)
+    logger = logging.getLogger("bench")
+
+    def emit_log(i):
+        logger.info("event handled", extra={"event": i})
+
+    started = time.perf_counter()
+    latencies = asyncio.run(run(emit_log, args.requests, args.concurrency, args.logs))
+    wall = time.perf_counter() - started
+    stop_logging()  # drains the queue
+    report("queue", latencies, wall)
+    print(f"queue listener wrote {sink.lines} lines after the run finished draining")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--logs", type=int, default=10, help="log lines per request")
+    parser.add_argument("--write-us", type=float, default=50.0, help="sink latency per write")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark the admin user search against a large users table.
+
+Seeds synthetic users (all with emails under @search-bench.example so they can
+be removed again), then runs the exact statement UserRepo.search_users issues
+for a set of terms. For each term it reports latency and whether the plan used
+the search indexes from migration 31ee0292bea4 rather than a sequential scan.
+
+USAGE:
+    alembic upgrade head
+    python scripts/bench_user_search.py --seed 2000000
+    python scripts/bench_user_search.py --terms anna smi x@ --runs 20
+    python scripts/bench_user_search.py --cleanup
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncpg
+from sqlalchemy.dialects.postgresql import asyncpg as asyncpg_dialect
+
+from app.config.settings import get_settings
+from app.users.repository import build_search_query
+
+BENCH_DOMAIN = "search-bench.example"
+
+NAMES = ["anna", "john", "maria", "ivan", "li", "fatima", "olga", "pedro", "yuki", "omar"]
+SURNAMES = ["smith", "ivanova", "garcia", "chen", "kowalski", "nguyen", "muller", "rossi"]
+
+DEFAULT_TERMS = ["anna", "smi", "li", "user1234", f"user42@{BENCH_DOMAIN}", "zzzz"]
+
+
+def dsn() -> str:
+    return get_settings().DATABASE_URL.replace("postgresql+asyncpg", "postgresql")
+
+
+async def seed(conn, rows: int) -> None:
+    started = time.perf_counter()
+    # generated server side, no round trips per row
+    await conn.execute(
+        """
+        INSERT INTO users (id, email, password, name, surname, status, role, created_at)
+        SELECT gen_random_uuid(),
+               'user' || g || '@' || $2,
+               'x',
+               ($3::text[])[1 + g % array_length($3::text[], 1)] || (g % 1000),
+               ($4::text[])[1 + (g / 7) % array_length($4::text[], 1)],
+               CASE WHEN g % 5 = 0 THEN 'pending' ELSE 'verified' END::userstatus,
+               CASE WHEN g % 100 = 0 THEN 'admin' ELSE 'user' END::userrole,
+               now() - (g % 730) * interval '1 day'
+        FROM generate_series(1, $1) AS g
+        ON CONFLICT DO NOTHING
+        """,
+        rows,
+        BENCH_DOMAIN,
+        NAMES,
+        SURNAMES,
+    )
+    await conn.execute("ANALYZE users")
+    print(f"seeded {rows} users in {time.perf_counter() - started:.1f}s")
+
+
+def compile_search(term: str, limit: int) -> str:
+    return str(
+        build_search_query(term, limit).compile(
+            dialect=asyncpg_dialect.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def index_names(plan: dict) -> set:
+    found = set()
+    if "Index Name" in plan:
+        found.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        found |= index_names(child)
+    return found
+
+
+def seq_scans(plan: dict) -> int:
+    count = 1 if plan.get("Node Type") == "Seq Scan" else 0
+    return count + sum(seq_scans(child) for child in plan.get("Plans", []))
+
+
+async def bench_term(conn, term: str, limit: int, runs: int) -> dict:
+    sql = compile_search(term, limit)
+
+    raw = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+    plan = json.loads(raw)[0]["Plan"]
+
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await conn.fetch(sql)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "term": term,
+        "median_ms": statistics.median(timings),
+        "max_ms": max(timings),
+        "indexes": sorted(i for i in index_names(plan) if "lower" in i),
+        "seq_scans": seq_scans(plan),
+    }
+
+
+async def main(args) -> int:
+    conn = await asyncpg.connect(dsn())
+    try:
+        if args.cleanup:
+            status = await conn.execute(
+                "DELETE FROM users WHERE email LIKE $1", f"%@{BENCH_DOMAIN}"
+            )
+            print(status)
+            return 0
+
+        if args.seed:
+            await seed(conn, args.seed)
+
+        total = await conn.fetchval("SELECT count(*) FROM users")
+        print(f"users table: {total} rows\n")
+
+        failures = 0
+        print(f"{'term':<32}{'median ms':>10}{'max ms':>10}  plan")
+        for term in args.terms:
+            r = await bench_term(conn, term, args.limit, args.runs)
+            uses_index = bool(r["indexes"]) and not r["seq_scans"]
+            failures += not uses_index
+            plan = ", ".join(r["indexes"]) if uses_index else f"SEQ SCAN x{r['seq_scans']}"
+            print(f"{r['term']:<32}{r['median_ms']:>10.2f}{r['max_ms']:>10.2f}  {plan}")
+    finally:
+        await conn.close()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seed", type=int, default=0, help="insert this many users first")
+    parser.add_argument("--terms", nargs="+", default=DEFAULT_TERMS)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--cleanup", action="store_true", help="delete the seeded users")
+    sys.exit(asyncio.run(main(parser.parse_args())))
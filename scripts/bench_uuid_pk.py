@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark primary key locality: uuid4 vs uuid7.
+
+Inserts the same number of rows into two scratch tables that only differ in how
+the uuid primary key is generated, then reports insert throughput and the size
+of the resulting pk index. Random uuid4 keys split pages all over the b-tree,
+uuid7 keys append to the right-most leaf.
+
+USAGE:
+    python scripts/bench_uuid_pk.py --rows 2000000 --batch 10000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncpg
+
+from app.config.settings import get_settings
+from app.core.ids import uuid7
+
+
+GENERATORS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+def dsn() -> str:
+    return get_settings().DATABASE_URL.replace("postgresql+asyncpg", "postgresql")
+
+
+async def bench(conn, kind: str, rows: int, batch: int) -> dict:
+    table = f"bench_pk_{kind}"
+    gen = GENERATORS[kind]
+
+    await conn.execute(f"DROP TABLE IF EXISTS {table}")
+    await conn.execute(
+        f"CREATE TABLE {table} (id uuid PRIMARY KEY, created_at timestamptz NOT NULL DEFAULT now())"
+    )
+
+    elapsed = 0.0
+    done = 0
+    while done < rows:
+        n = min(batch, rows - done)
+        records = [(gen(),) for _ in range(n)]
+
+        started = time.perf_counter()
+        await conn.copy_records_to_table(table, records=records, columns=["id"])
+        elapsed += time.perf_counter() - started
+
+        done += n
+
+    index_size = await conn.fetchval(
+        "SELECT pg_relation_size($1::regclass)", f"{table}_pkey"
+    )
+    leaf_density = None
+    try:
+        await conn.execute("CREATE EXTENSION IF NOT EXISTS pgstattuple")
+        leaf_density = await conn.fetchval(
+            "SELECT avg_leaf_density FROM pgstatindex($1)", f"{table}_pkey"
+        )
+    except asyncpg.PostgresError:
+        pass
+
+    return {
+        "kind": kind,
+        "rows": rows,
+        "seconds": elapsed,
+        "rows_per_sec": rows / elapsed if elapsed else 0,
+        "index_mb": index_size / 1024 / 1024,
+        "leaf_density": leaf_density,
+    }
+
+
+async def main(args) -> int:
+    conn = await asyncpg.connect(dsn())
+    try:
+        results = [await bench(conn, kind, args.rows, args.batch) for kind in args.kinds]
+        if not args.keep:
+            for kind in args.kinds:
+                await conn.execute(f"DROP TABLE IF EXISTS bench_pk_{kind}")
+    finally:
+        await conn.close()
+
+    print(f"{'kind':<8}{'rows':>12}{'seconds':>10}{'rows/s':>12}{'index MB':>10}{'leaf %':>8}")
+    for r in results:
+        density = f"{r['leaf_density']:.1f}" if r["leaf_density"] is not None else "n/a"
+        print(
+            f"{r['kind']:<8}{r['rows']:>12}{r['seconds']:>10.2f}"
+            f"{r['rows_per_sec']:>12.0f}{r['index_mb']:>10.1f}{density:>8}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--kinds", nargs="+", default=["uuid4", "uuid7"], choices=GENERATORS)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch tables")
+    sys.exit(asyncio.run(main(parser.parse_args())))
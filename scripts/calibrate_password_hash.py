@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Pick password hashing costs that fit a latency budget on this host.
+
+Hashes with the app's own password_context at increasing cost (bcrypt rounds,
+or argon2 time cost at a fixed memory size) and reports the median time of
+each step. The highest cost whose median stays within --target-ms is printed
+as Settings values. Every login pays about this time once, on one core, so run
+it on the production instance type with nothing else busy.
+
+Changing the values needs no migration: digests made with another scheme or
+cost still verify and are rehashed on the user's next login.
+
+USAGE:
+    python scripts/calibrate_password_hash.py
+    python scripts/calibrate_password_hash.py --target-ms 250 --samples 7
+    python scripts/calibrate_password_hash.py --scheme argon2 --memory-kib 65536 --parallelism 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.users.models import password_context
+
+# below these the hash is too cheap to be worth it, whatever the budget
+MIN_BCRYPT_ROUNDS = 10
+MIN_ARGON2_TIME_COST = 2
+
+
+def median_ms(context, samples: int) -> float:
+    context.hash("calibration")  # backend load and first-use costs
+    times = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash("calibration")
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def calibrate(make_context, costs, target_ms: float, samples: int):
+    """Median per cost until one exceeds the target, returns (best cost, rows)"""
+    best, rows = None, []
+    for cost in costs:
+        ms = median_ms(make_context(cost), samples)
+        rows.append((cost, ms))
+        if ms > target_ms:
+            break
+        best = cost
+    return best, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scheme", choices=["bcrypt", "argon2"], default="bcrypt")
+    parser.add_argument("--target-ms", type=float, default=100.0)
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--memory-kib", type=int, default=65536, help="argon2 memory size")
+    parser.add_argument("--parallelism", type=int, default=4, help="argon2 lanes")
+    args = parser.parse_args()
+
+    if args.scheme == "bcrypt":
+        minimum, name = MIN_BCRYPT_ROUNDS, "BCRYPT_ROUNDS"
+        best, rows = calibrate(
+            lambda rounds: password_context("bcrypt", bcrypt_rounds=rounds),
+            range(4, 20),
+            args.target_ms,
+            args.samples,
+        )
+    else:
+        minimum, name = MIN_ARGON2_TIME_COST, "ARGON2_TIME_COST"
+        best, rows = calibrate(
+            lambda time_cost: password_context(
+                "argon2",
+                argon2_time_cost=time_cost,
+                argon2_memory_kib=args.memory_kib,
+                argon2_parallelism=args.parallelism,
+            ),
+            range(1, 20),
+            args.target_ms,
+            args.samples,
+        )
+
+    print(f"{'cost':>6} {'median ms':>10}")
+    for cost, ms in rows:
+        print(f"{cost:>6} {ms:>10.1f}{'  <- over target' if ms > args.target_ms else ''}")
+    print()
+
+    if best is None or best < minimum:
+        hint = "a smaller --memory-kib" if args.scheme == "argon2" else "a larger --target-ms"
+        print(f"nothing at or above the minimum cost {minimum} fits {args.target_ms:.0f} ms, try {hint}")
+        sys.exit(1)
+
+    print(f"PASSWORD_SCHEME={args.scheme}")
+    print(f"{name}={best}")
+    if args.scheme == "argon2":
+        print(f"ARGON2_MEMORY_KIB={args.memory_kib}")
+        print(f"ARGON2_PARALLELISM={args.parallelism}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Generate a JWT signing key for JWT_KEYS_DIR.
+
+Writes <kid>.pem (private, mode 600) where kid is today's date plus a random
+suffix, so the newest key also sorts last. The app refuses to start with more
+than one private key and no JWT_SIGNING_KID. Rotation without rejecting live
+tokens:
+
+    1. set JWT_SIGNING_KID to the *current* kid and generate the new key, so
+       the new key is only published in /.well-known/jwks.json
+    2. after JWKS_CACHE_SECONDS, point JWT_SIGNING_KID at the new kid
+    3. turn the old key into a verify-only key with --retire, and delete its
+       .pub.pem once REFRESH_TOKEN_EXPIRE_DAYS have passed
+
+USAGE:
+    python scripts/generate_jwt_key.py --dir keys/jwt
+    python scripts/generate_jwt_key.py --dir keys/jwt --type ec
+    python scripts/generate_jwt_key.py --dir keys/jwt --retire 20261019-3fa2
+"""
+import argparse
+import os
+import secrets
+from datetime import date
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+
+def generate(kind: str):
+    if kind == "ec":
+        return ec.generate_private_key(ec.SECP256R1())
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def write_private(directory: Path, kind: str) -> str:
+    kid = f"{date.today():%Y%m%d}-{secrets.token_hex(2)}"
+    pem = generate(kind).private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    path = directory / f"{kid}.pem"
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(pem)
+    return kid
+
+
+def retire(directory: Path, kid: str) -> None:
+    private = directory / f"{kid}.pem"
+    key = serialization.load_pem_private_key(private.read_bytes(), password=None)
+    (directory / f"{kid}.pub.pem").write_bytes(
+        key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+    )
+    private.unlink()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dir", required=True, help="JWT_KEYS_DIR")
+    parser.add_argument("--type", choices=["rsa", "ec"], default="rsa", help="RS256 or ES256")
+    parser.add_argument("--retire", metavar="KID", help="keep only the public half of KID")
+    args = parser.parse_args()
+
+    directory = Path(args.dir)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    if args.retire:
+        retire(directory, args.retire)
+        print(f"{args.retire} is now verify-only")
+    else:
+        print(write_private(directory, args.type))
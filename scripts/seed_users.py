@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Seed the users table with millions of synthetic users for capacity tests.
+
+Rows look like production: mostly verified users with some pending ones
+(with verification codes) and a few admins and soft-deleted users. Signups
+grow towards today (--skew), and ids are uuid7s of each user's created_at, so
+id order is signup order as with real signups. Every user shares one bcrypt
+digest of --password, hashed once at the configured cost, so any seeded user
+can log in.
+
+The rows never pass through the ORM. Worker processes each generate chunks
+of rows and stream them over their own connection with COPY. The users
+indexes (all but the primary key) are dropped first and rebuilt in parallel
+once everything is loaded, which is much faster than maintaining them per
+row. The stats triggers stay on, so the counters in user_status_counts match
+the table afterwards. Emails end in @seed.example plus a per-run tag, so
+reruns never collide and --cleanup removes every seeded user.
+
+Dropping the indexes locks the table and the email uniqueness check is
+gone until the rebuild: run it against a scratch database only, or pass
+--keep-indexes. Pending users are not added to the Redis expiry index; the
+reaper finds them through its full-scan fallback.
+
+USAGE:
+    alembic upgrade head
+    python scripts/seed_users.py --users 10000000
+    python scripts/seed_users.py --users 2000000 --workers 4 --pending 0.3 --admins 0.01
+    python scripts/seed_users.py --users 200000 --keep-indexes
+    python scripts/seed_users.py --cleanup
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import random
+import secrets
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, NamedTuple, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncpg
+
+from app.config.settings import get_settings
+from app.core import UserRole, UserStatus
+from app.core.ids import uuid7
+from app.users.models import hash_password
+
+SEED_DOMAIN = "seed.example"
+
+COLUMNS = (
+    "id",
+    "email",
+    "password",
+    "name",
+    "surname",
+    "status",
+    "role",
+    "verification_code",
+    "verification_code_expires",
+    "created_at",
+    "last_login_at",
+    "last_seen_at",
+    "deleted_at",
+)
+
+NAMES = [
+    "anna", "john", "maria", "ivan", "li", "fatima", "olga", "pedro", "yuki", "omar",
+    "sara", "david", "elena", "ali", "mei", "lucas", "nina", "tom", "aisha", "jamal",
+]
+SURNAMES = [
+    "smith", "ivanova", "garcia", "chen", "kowalski", "nguyen", "muller", "rossi",
+    "kim", "silva", "novak", "haddad", "tanaka", "okafor", "jensen", "dubois",
+]
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class Plan(NamedTuple):
+    """Everything a worker process needs, picklable"""
+
+    dsn: str
+    users: int
+    chunk: int
+    workers: int
+    digest: str
+    tag: str
+    now_ms: int
+    days: int
+    skew: float
+    pending: float
+    admins: float
+    deleted: float
+    seed: int
+
+
+def dsn() -> str:
+    return get_settings().DATABASE_URL.replace("postgresql+asyncpg", "postgresql")
+
+
+def generate(start: int, stop: int, plan: Plan) -> List[tuple]:
+    """Rows start..stop as COLUMNS tuples, datetimes and UUIDs go to COPY unformatted"""
+    rng = random.Random(plan.seed * 1_000_003 + start)
+    span_ms = plan.days * 86_400_000
+    rows = []
+    for i in range(start, stop):
+        # row i sits at quantile i/users of the age distribution: oldest
+        # first, ids ascending, so each chunk appends to one end of the pkey
+        age_ms = int(span_ms * (1 - i / plan.users) ** plan.skew)
+        created_ms = plan.now_ms - age_ms
+        created = EPOCH + timedelta(milliseconds=created_ms)
+        name = NAMES[rng.randrange(len(NAMES))]
+        surname = SURNAMES[rng.randrange(len(SURNAMES))]
+
+        code = expires = last_login = last_seen = deleted = None
+        if rng.random() < plan.pending:
+            status = UserStatus.PENDING.value
+            code = f"{rng.randrange(1_000_000):06d}"
+            # naive, like User.generate_verification_code
+            expires = created.replace(tzinfo=None) + timedelta(minutes=15)
+        else:
+            status = UserStatus.VERIFIED.value
+            if rng.random() < 0.8:
+                login_ms = int(rng.random() * age_ms)
+                last_login = created + timedelta(milliseconds=login_ms)
+                last_seen = last_login + timedelta(milliseconds=int(rng.random() * (age_ms - login_ms)))
+        role = UserRole.ADMIN.value if rng.random() < plan.admins else UserRole.USER.value
+        if rng.random() < plan.deleted:
+            deleted = created + timedelta(milliseconds=int(rng.random() * age_ms))
+
+        rows.append((
+            uuid7(created_ms),
+            f"{name}.{surname}.{i}.{plan.tag}@{SEED_DOMAIN}",
+            plan.digest,
+            name.capitalize(),
+            surname.capitalize(),
+            status,
+            role,
+            code,
+            expires,
+            created,
+            last_login,
+            last_seen,
+            deleted,
+        ))
+    return rows
+
+
+async def copy_chunks(worker: int, plan: Plan, progress) -> None:
+    conn = await asyncpg.connect(plan.dsn)
+    try:
+        # a crash loses at most the last few chunks, which are synthetic anyway
+        await conn.execute("SET synchronous_commit = off")
+        for start in range(worker * plan.chunk, plan.users, plan.workers * plan.chunk):
+            stop = min(start + plan.chunk, plan.users)
+            await conn.copy_records_to_table("users", records=generate(start, stop, plan), columns=COLUMNS)
+            progress.put(stop - start)
+    finally:
+        await conn.close()
+
+
+def load_worker(worker: int, plan: Plan, progress) -> None:
+    asyncio.run(copy_chunks(worker, plan, progress))
+
+
+def load(plan: Plan) -> bool:
+    """Run the workers and report progress, False if any of them failed"""
+    progress = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=load_worker, args=(w, plan, progress), daemon=True)
+        for w in range(plan.workers)
+    ]
+    for process in processes:
+        process.start()
+
+    started = last_report = time.perf_counter()
+    done = 0
+    while any(p.is_alive() for p in processes) or not progress.empty():
+        try:
+            done += progress.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        now = time.perf_counter()
+        if now - last_report >= 2 or done == plan.users:
+            last_report = now
+            print(f"  {done:>12,} / {plan.users:,} rows  {done / (now - started):>10,.0f} rows/s")
+
+    for process in processes:
+        process.join()
+    return all(p.exitcode == 0 for p in processes)
+
+
+async def drop_indexes(conn) -> List[Tuple[str, str]]:
+    """Drop every users index not backing a constraint, returns their definitions"""
+    rows = await conn.fetch(
+        """
+        SELECT c.relname, pg_get_indexdef(i.indexrelid) AS definition
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = 'users'::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = i.indexrelid)
+        """
+    )
+    for row in rows:
+        # printed first: if this run dies, these recreate them
+        print(f"  dropping {row['relname']}: {row['definition']}")
+        await conn.execute(f'DROP INDEX "{row["relname"]}"')
+    return [(row["relname"], row["definition"]) for row in rows]
+
+
+async def build_index(name: str, definition: str) -> None:
+    conn = await asyncpg.connect(dsn())
+    try:
+        await conn.execute("SET maintenance_work_mem = '512MB'")
+        started = time.perf_counter()
+        await conn.execute(definition)
+        print(f"  built {name} in {time.perf_counter() - started:.1f}s")
+    finally:
+        await conn.close()
+
+
+async def rebuild_indexes(indexes: List[Tuple[str, str]], parallel: int) -> None:
+    slots = asyncio.Semaphore(parallel)
+
+    async def build(name, definition):
+        async with slots:
+            await build_index(name, definition)
+
+    await asyncio.gather(*(build(name, definition) for name, definition in indexes))
+
+
+async def cleanup() -> None:
+    conn = await asyncpg.connect(dsn())
+    try:
+        print(await conn.execute("DELETE FROM users WHERE email LIKE $1", f"%@{SEED_DOMAIN}"))
+    finally:
+        await conn.close()
+
+
+async def prepare(keep_indexes: bool) -> List[Tuple[str, str]]:
+    conn = await asyncpg.connect(dsn())
+    try:
+        total = await conn.fetchval("SELECT count(*) FROM users")
+        print(f"users table: {total:,} rows")
+        return [] if keep_indexes else await drop_indexes(conn)
+    finally:
+        await conn.close()
+
+
+async def finish(indexes: List[Tuple[str, str]], parallel: int) -> None:
+    if indexes:
+        print(f"rebuilding {len(indexes)} indexes")
+        await rebuild_indexes(indexes, parallel)
+    conn = await asyncpg.connect(dsn())
+    try:
+        await conn.execute("ANALYZE users")
+        total = await conn.fetchval("SELECT count(*) FROM users")
+        print(f"users table: {total:,} rows")
+    finally:
+        await conn.close()
+
+
+def main(args) -> int:
+    if args.cleanup:
+        asyncio.run(cleanup())
+        return 0
+
+    plan = Plan(
+        dsn=dsn(),
+        users=args.users,
+        chunk=args.chunk,
+        workers=args.workers,
+        digest=hash_password(args.password),
+        tag=secrets.token_hex(3),
+        now_ms=int(time.time() * 1000),
+        days=args.days,
+        skew=args.skew,
+        pending=args.pending,
+        admins=args.admins,
+        deleted=args.deleted,
+        seed=args.seed,
+    )
+
+    indexes = asyncio.run(prepare(args.keep_indexes))
+    started = time.perf_counter()
+    try:
+        print(f"copying {plan.users:,} users with {plan.workers} workers, run tag {plan.tag}")
+        ok = load(plan)
+        loaded = time.perf_counter() - started
+        print(f"copied in {loaded:.1f}s ({plan.users / loaded:,.0f} rows/s)")
+    finally:
+        # even after a failed or interrupted load, never leave the table without them
+        asyncio.run(finish(indexes, args.workers))
+
+    elapsed = time.perf_counter() - started
+    print(f"done in {elapsed:.1f}s, {plan.users / elapsed * 60:,.0f} users/min overall")
+    print(f"log in as any of them with password {args.password!r}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="COPY connections and processes")
+    parser.add_argument("--chunk", type=int, default=50_000, help="rows per COPY")
+    parser.add_argument("--days", type=int, default=730, help="signups spread over this many days")
+    parser.add_argument("--skew", type=float, default=2.0, help="above 1 more signups are recent, 1 is uniform")
+    parser.add_argument("--pending", type=float, default=0.1, help="fraction not verified yet")
+    parser.add_argument("--admins", type=float, default=0.001, help="fraction of admins")
+    parser.add_argument("--deleted", type=float, default=0.01, help="fraction soft deleted, awaiting purge")
+    parser.add_argument("--password", default="seed-password")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the status, role and name mix")
+    parser.add_argument("--keep-indexes", action="store_true", help="load into the indexed table, no rebuild")
+    parser.add_argument("--cleanup", action="store_true", help="delete every seeded user")
+    sys.exit(main(parser.parse_args()))
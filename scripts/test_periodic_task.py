@@ -1,15 +1,70 @@
 #!/usr/bin/env python3
 """
-Script to manually trigger the periodic cleanup task for testing purposes.
-This allows you to test the delete_unverified_users task without waiting 2 days.
+Trigger or benchmark the periodic cleanup tasks.
+
+`trigger` (the default) sends one delete_unverified_users task to the running
+worker and waits for its result.
+
+`bench` measures how workers get through a backlog. For every combination of
+--concurrency and --prefetch it:
+
+    1. seeds users under @bench.invalid: pending, verified and soft-deleted,
+       each at a chosen age, so the task has real rows to remove
+    2. starts a worker on a private queue with that pool size and prefetch
+       multiplier (this script's `worker` command)
+    3. enqueues --tasks tasks at --rate per second
+    4. reports enqueue-to-start latency, run time, rows removed and rows/s
+    5. stops the worker and deletes every seeded row
+
+Start and end times come from task_prerun / task_postrun handlers in the
+worker, written to Redis under the task id. With --eager there is no broker
+or worker: tasks run inline through Celery's eager mode, so only run time and
+rows/s are meaningful.
+
+The tasks act on every matching row, not just the seeded ones, so bench only
+runs against a scratch database: it refuses to start when rows outside
+@bench.invalid would be touched.
+
+USAGE:
+    python scripts/test_periodic_task.py
+    python scripts/test_periodic_task.py bench --pending 50000 --verified 50000 --tasks 200 --rate 50
+    python scripts/test_periodic_task.py bench --task purge_deleted_users --deleted 100000 \\
+        --concurrency 1 4 8 --prefetch 1 4
+    python scripts/test_periodic_task.py bench --eager --pending 10000 --tasks 20
 """
-import sys
+import argparse
+import asyncio
 import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
 
 # Add the parent directory to the path so we can import app modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+from celery import signals
+from redis import Redis
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
 from app.celery import celery
+from app.config.settings import get_settings
+from app.core import UserRole, UserStatus, uuid7
+from app.users import expiry
+from app.users.models import User, UserEvent
+import app.tasks.cleanup  # noqa: F401 registers the tasks for eager runs
+
+settings = get_settings()
+
+QUEUE = "bench"
+DOMAIN = "bench.invalid"
+TASKS = ["delete_unverified_users", "reap_expired_users", "purge_deleted_users"]
+# seeded users never log in, a fixed digest spares hashing every row
+PASSWORD = "$2b$12$" + "." * 53
+TIMINGS_TTL = 24 * 60 * 60
 
 
 def test_delete_unverified_users():
@@ -34,5 +89,305 @@ def test_delete_unverified_users():
     return 0
 
 
+class Timings:
+    """Task start/end times, in Redis for real workers, in memory for eager runs"""
+
+    def __init__(self, redis_url=None):
+        self.redis_url = redis_url
+        self._memory = {}
+        self._redis = None
+        self._pid = None
+
+    def _client(self):
+        # prefork children must not share the parent's connection
+        if self._pid != os.getpid():
+            self._redis, self._pid = Redis.from_url(self.redis_url), os.getpid()
+        return self._redis
+
+    def record(self, task_id, field):
+        now = time.time()
+        if self.redis_url is None:
+            self._memory.setdefault(task_id, {})[field] = now
+            return
+        key = f"bench:celery:{task_id}"
+        pipe = self._client().pipeline(transaction=False)
+        pipe.hset(key, field, now)
+        pipe.expire(key, TIMINGS_TTL)
+        pipe.execute()
+
+    def get(self, task_id):
+        if self.redis_url is None:
+            return self._memory.get(task_id, {})
+        raw = self._client().hgetall(f"bench:celery:{task_id}")
+        return {k.decode(): float(v) for k, v in raw.items()}
+
+
+def connect_timings(timings: Timings) -> None:
+    @signals.task_prerun.connect(weak=False)
+    def record_start(task_id=None, **kwargs):
+        timings.record(task_id, "start")
+
+    @signals.task_postrun.connect(weak=False)
+    def record_end(task_id=None, **kwargs):
+        timings.record(task_id, "end")
+
+
+def configure(broker_url: str) -> None:
+    celery.conf.broker_url = broker_url
+    celery.conf.result_backend = broker_url
+
+
+def run_worker(args) -> int:
+    """Worker started by `bench`, one per concurrency/prefetch combination"""
+    configure(args.broker)
+    connect_timings(Timings(args.broker))
+    celery.worker_main(
+        [
+            "worker",
+            "-Q", QUEUE,
+            "-n", args.name,
+            "-c", str(args.concurrency),
+            "--prefetch-multiplier", str(args.prefetch),
+            "--without-gossip",
+            "--without-mingle",
+            "--without-heartbeat",
+            "-l", "WARNING",
+        ]
+    )
+    return 0
+
+
+def start_worker(args, concurrency: int, prefetch: int) -> subprocess.Popen:
+    name = f"bench-c{concurrency}-p{prefetch}@%h"
+    worker = subprocess.Popen(
+        [
+            sys.executable, os.path.abspath(__file__), "worker",
+            "--broker", args.broker,
+            "--name", name,
+            "--concurrency", str(concurrency),
+            "--prefetch", str(prefetch),
+        ]
+    )
+    hostname = name.replace("%h", os.uname().nodename)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if worker.poll() is not None:
+            raise RuntimeError(f"worker exited with {worker.returncode}")
+        if celery.control.ping(destination=[hostname], timeout=0.5):
+            return worker
+    worker.terminate()
+    raise RuntimeError("worker did not come up within 60s")
+
+
+def stop_worker(worker: subprocess.Popen) -> None:
+    # warm shutdown, the queue is empty by now
+    worker.send_signal(signal.SIGTERM)
+    try:
+        worker.wait(30)
+    except subprocess.TimeoutExpired:
+        worker.kill()
+        worker.wait()
+
+
+def bench_rows():
+    return User.email.like(f"%@{DOMAIN}")
+
+
+def eligible(task: str):
+    """Rows the task would act on"""
+    if task == "purge_deleted_users":
+        return User.deleted_at.is_not(None)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=2)
+    return (User.status == UserStatus.PENDING) & (User.created_at <= cutoff) & User.deleted_at.is_(None)
+
+
+async def foreign_rows(engine, task: str) -> int:
+    async with engine.connect() as conn:
+        return await conn.scalar(
+            select(func.count()).select_from(User).where(eligible(task), ~bench_rows())
+        )
+
+
+async def seed(engine, args, redis) -> int:
+    now = datetime.now(timezone.utc)
+    groups = [
+        ("pending", args.pending, UserStatus.PENDING, args.pending_age_hours, None),
+        ("verified", args.verified, UserStatus.VERIFIED, args.verified_age_hours, None),
+        ("deleted", args.deleted, UserStatus.VERIFIED, args.verified_age_hours, args.deleted_age_hours),
+    ]
+    rows = []
+    for label, count, status, age_hours, deleted_hours in groups:
+        created = now - timedelta(hours=age_hours)
+        for n in range(count):
+            rows.append(
+                {
+                    "id": uuid7(),
+                    "email": f"{label}-{n}@{DOMAIN}",
+                    "password": PASSWORD,
+                    "status": status,
+                    "role": UserRole.USER,
+                    "created_at": created,
+                    "deleted_at": now - timedelta(hours=deleted_hours) if deleted_hours is not None else None,
+                }
+            )
+
+    async with engine.begin() as conn:
+        for start in range(0, len(rows), 5000):
+            await conn.execute(User.__table__.insert(), rows[start : start + 5000])
+
+    if redis is not None and args.task == "reap_expired_users":
+        # the reaper reads the expiry index, not the table
+        deadlines = {
+            str(row["id"]): (row["created_at"] + timedelta(hours=settings.UNVERIFIED_USER_TTL_HOURS)).timestamp()
+            for row in rows
+            if row["status"] == UserStatus.PENDING
+        }
+        if deadlines:
+            redis.zadd(expiry.EXPIRY_KEY, deadlines)
+        redis.set(expiry.SENTINEL_KEY, now.isoformat())
+    return len(rows)
+
+
+async def cleanup(engine, redis) -> None:
+    async with engine.begin() as conn:
+        ids = select(User.id).where(bench_rows()).scalar_subquery()
+        await conn.execute(delete(UserEvent).where(UserEvent.user_id.in_(ids)))
+        ids = (await conn.execute(delete(User).where(bench_rows()).returning(User.id))).scalars().all()
+    if redis is not None and ids:
+        for start in range(0, len(ids), 5000):
+            redis.zrem(expiry.EXPIRY_KEY, *[str(i) for i in ids[start : start + 5000]])
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def enqueue_and_wait(args, timings: Timings) -> dict:
+    task = celery.tasks[args.task]
+    sent = []
+    started = time.time()
+    for i in range(args.tasks):
+        # rate controlled from the start, not from the previous send
+        delay = started + i / args.rate - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        sent.append((time.time(), task.apply_async(queue=QUEUE)))
+
+    latencies, runtimes, rows, errors, last_end = [], [], 0, 0, started
+    for sent_at, result in sent:
+        value = result.get(timeout=args.timeout, propagate=False)
+        if not isinstance(value, dict) or value.get("status") != "success":
+            errors += 1
+        else:
+            rows += value.get("deleted_count", value.get("purged_count", 0))
+        times = timings.get(result.id)
+        if "start" in times and "end" in times:
+            latencies.append((times["start"] - sent_at) * 1000)
+            runtimes.append((times["end"] - times["start"]) * 1000)
+            last_end = max(last_end, times["end"])
+
+    return {
+        "tasks": args.tasks,
+        "errors": errors,
+        "tasks_per_s": args.tasks / (last_end - started) if last_end > started else float("nan"),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_max": max(latencies, default=float("nan")),
+        "run_p50": percentile(runtimes, 50),
+        "run_p95": percentile(runtimes, 95),
+        "rows": rows,
+        "rows_per_s": rows / (sum(runtimes) / 1000) if sum(runtimes) else 0.0,
+    }
+
+
+def run_bench(args) -> int:
+    engine = create_async_engine(settings.DATABASE_URL)
+    redis = None if args.eager else Redis.from_url(args.broker)
+    loop = asyncio.new_event_loop()
+    try:
+        foreign = loop.run_until_complete(foreign_rows(engine, args.task))
+        if foreign:
+            print(f"{foreign} rows outside @{DOMAIN} would be touched by {args.task}, use a scratch database")
+            return 1
+
+        if args.eager:
+            celery.conf.task_always_eager = True
+            timings = Timings()
+            matrix = [("eager", "-")]
+        else:
+            configure(args.broker)
+            timings = Timings(args.broker)
+            matrix = [(c, p) for c in args.concurrency for p in args.prefetch]
+        connect_timings(timings)
+
+        results = []
+        for concurrency, prefetch in matrix:
+            loop.run_until_complete(cleanup(engine, redis))
+            seeded = loop.run_until_complete(seed(engine, args, redis))
+            print(f"concurrency={concurrency} prefetch={prefetch}: seeded {seeded} users, "
+                  f"sending {args.tasks} x {args.task} at {args.rate:g}/s", flush=True)
+            worker = None if args.eager else start_worker(args, concurrency, prefetch)
+            try:
+                results.append({"concurrency": concurrency, "prefetch": prefetch,
+                                **enqueue_and_wait(args, timings)})
+            finally:
+                if worker is not None:
+                    stop_worker(worker)
+        if not args.keep:
+            loop.run_until_complete(cleanup(engine, redis))
+    finally:
+        loop.run_until_complete(engine.dispose())
+        loop.close()
+
+    print()
+    print(f"{'conc':>5}{'pref':>5}{'tasks/s':>9}{'lat p50':>9}{'lat p95':>9}{'lat max':>9}"
+          f"{'run p50':>9}{'run p95':>9}{'rows':>9}{'rows/s':>10}{'errors':>7}")
+    for r in results:
+        print(
+            f"{r['concurrency']:>5}{r['prefetch']:>5}{r['tasks_per_s']:>9.1f}"
+            f"{r['latency_p50']:>9.1f}{r['latency_p95']:>9.1f}{r['latency_max']:>9.1f}"
+            f"{r['run_p50']:>9.1f}{r['run_p95']:>9.1f}{r['rows']:>9}{r['rows_per_s']:>10.0f}{r['errors']:>7}"
+        )
+    print("latency and run time in ms")
+    return 0
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("trigger", help="send one delete_unverified_users task")
+
+    default_broker = os.environ.get("CELERY_BROKER_URL", settings.REDIS_URL)
+    bench = commands.add_parser("bench", help="benchmark a task backlog")
+    bench.add_argument("--task", choices=TASKS, default="delete_unverified_users")
+    bench.add_argument("--pending", type=int, default=10_000)
+    bench.add_argument("--pending-age-hours", type=float, default=72, help="older than 48h is due")
+    bench.add_argument("--verified", type=int, default=10_000)
+    bench.add_argument("--verified-age-hours", type=float, default=72)
+    bench.add_argument("--deleted", type=int, default=0, help="soft-deleted users, for purge_deleted_users")
+    bench.add_argument("--deleted-age-hours", type=float, default=1)
+    bench.add_argument("--tasks", type=int, default=50)
+    bench.add_argument("--rate", type=float, default=10, help="tasks enqueued per second")
+    bench.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    bench.add_argument("--prefetch", type=int, nargs="+", default=[1, 4])
+    bench.add_argument("--broker", default=default_broker, help="also the result backend")
+    bench.add_argument("--timeout", type=float, default=300, help="seconds to wait for one result")
+    bench.add_argument("--eager", action="store_true", help="no broker or worker, run tasks inline")
+    bench.add_argument("--keep", action="store_true", help="keep the seeded users of the last run")
+
+    worker = commands.add_parser("worker", help=argparse.SUPPRESS)
+    worker.add_argument("--broker", required=True)
+    worker.add_argument("--name", required=True)
+    worker.add_argument("--concurrency", type=int, required=True)
+    worker.add_argument("--prefetch", type=int, required=True)
+
+    args = parser.parse_args()
+    if args.command == "bench":
+        exit(run_bench(args))
+    if args.command == "worker":
+        exit(run_worker(args))
     exit(test_delete_unverified_users())
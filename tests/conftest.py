@@ -4,6 +4,8 @@ Pytest configuration and fixtures for testing.
 
 import pytest
 
+from app.core.query_stats import track_queries
+
 
 @pytest.fixture
 def mock_celery_task(mocker):
@@ -18,3 +20,13 @@ def mock_async_session(mocker):
     mock_session.__aenter__ = mocker.AsyncMock(return_value=mock_session)
     mock_session.__aexit__ = mocker.AsyncMock(return_value=None)
     return mock_session
+
+
+@pytest.fixture
+def query_counter():
+    """Count statements issued through instrumented engines during the test.
+
+    Usage: ``query_counter.assert_at_most(1)`` after exercising an endpoint.
+    """
+    with track_queries() as stats:
+        yield stats
@@ -0,0 +1,183 @@
+"""
+Endpoint tests against a real database, see conftest.py for the harness.
+"""
+
+import pytest
+from sqlalchemy import select, text
+
+from app.core import UserEventType, UserRole, UserStatus
+from app.users.activity import ActivityTracker
+from app.users.models import User, UserEvent
+
+from .conftest import PASSWORD
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+async def test_signup_verify_and_read_profile(client, sent_codes):
+    """The mailed code verifies the account and the cookies it sets authenticate"""
+    response = await client.post(
+        "/auth/signup", json={"email": "new@example.com", "password": "secret", "name": "New", "surname": "User"}
+    )
+    assert response.status_code == 200, response.text
+
+    response = await client.post(
+        "/auth/verify", json={"email": "new@example.com", "code": sent_codes["new@example.com"]}
+    )
+    assert response.status_code == 200, response.text
+
+    me = await client.get("/users/me")
+    assert me.status_code == 200
+    assert me.json()["email"] == "new@example.com"
+    assert me.json()["status"] == UserStatus.VERIFIED.value
+
+
+async def test_duplicate_signup_leaves_the_first_account(client, db, sent_codes):
+    """A failed insert only rolls back its own savepoint"""
+    payload = {"email": "twice@example.com", "password": "secret", "name": "A", "surname": "B"}
+
+    assert (await client.post("/auth/signup", json=payload)).status_code == 200
+    assert (await client.post("/auth/signup", json=payload)).status_code == 400
+
+    count = len((await db.scalars(select(User).where(User.email == "twice@example.com"))).all())
+    assert count == 1
+
+
+@pytest.mark.parametrize("attempt", range(2))
+async def test_each_test_starts_empty(client, db, sent_codes, attempt):
+    """Both runs sign up the same address: the previous one was rolled back"""
+    response = await client.post(
+        "/auth/signup", json={"email": "again@example.com", "password": "secret", "name": "A", "surname": "B"}
+    )
+
+    assert response.status_code == 200, response.text
+    assert (await db.scalar(select(User).where(User.email == "again@example.com"))) is not None
+
+
+@pytest.mark.parametrize("attempt", range(2))
+async def test_idempotency_keys_do_not_outlive_the_test(client, db, sent_codes, attempt):
+    """A stored response from the previous run would be replayed without a signup"""
+    response = await client.post(
+        "/auth/signup",
+        json={"email": "keyed@example.com", "password": "secret", "name": "A", "surname": "B"},
+        headers={"Idempotency-Key": "signup-keyed"},
+    )
+
+    assert response.status_code == 200, response.text
+    assert (await db.scalar(select(User).where(User.email == "keyed@example.com"))) is not None
+
+
+async def test_login_rejects_a_wrong_password(client, make_user):
+    user = await make_user()
+
+    response = await client.post("/auth/login", json={"email": user.email, "password": "wrong"})
+
+    assert response.status_code == 401
+
+
+async def test_pending_user_cannot_log_in(client, make_user):
+    user = await make_user(status=UserStatus.PENDING)
+
+    response = await client.post(
+        "/auth/login", json={"email": user.email, "password": "integration-password"}
+    )
+
+    assert response.status_code == 403
+
+
+async def test_admin_only_endpoints_refuse_users(client, make_user, login):
+    await login(await make_user())
+
+    assert (await client.get("/users/")).status_code == 403
+
+
+async def test_admin_update_is_written_with_its_event(client, db, make_user, login):
+    """The patch commits the row and its outbox event together"""
+    await login(await make_user(role=UserRole.ADMIN))
+    target = await make_user(name="Old")
+
+    response = await client.patch(f"/users/{target.id}", json={"name": "New"})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["name"] == "New"
+    await db.refresh(target)
+    assert target.name == "New"
+    events = (await db.scalars(select(UserEvent).where(UserEvent.user_id == target.id))).all()
+    assert str(UserEventType.UPDATED) in [event.type for event in events]
+
+
+async def test_deleted_user_disappears_from_the_list(client, make_user, login):
+    await login(await make_user(role=UserRole.ADMIN))
+    target = await make_user()
+
+    assert (await client.delete(f"/users/{target.id}")).status_code == 204
+
+    listed = await client.get("/users/", params={"limit": 100})
+    assert listed.status_code == 200
+    assert str(target.id) not in {user["id"] for user in listed.json()["users"]}
+
+
+async def test_stats_counters_follow_status_changes_only(client, db, session_factory, make_user, login):
+    """Verifying and deleting move the counters, activity flushes don't touch them"""
+    await login(await make_user(role=UserRole.ADMIN))
+    target = await make_user(status=UserStatus.PENDING)
+
+    async def counts():
+        rows = await db.execute(text("SELECT status, role, count FROM user_status_counts"))
+        return {(row.status, row.role): row.count for row in rows if row.count}
+
+    assert await counts() == {("pending", "user"): 1, ("verified", "admin"): 1}
+
+    tracker = ActivityTracker(max_pending=10)
+    tracker.seen(target.id)
+    assert await tracker.flush(session_factory) == 1
+    assert await counts() == {("pending", "user"): 1, ("verified", "admin"): 1}
+
+    target.status = UserStatus.VERIFIED
+    await db.commit()
+    assert await counts() == {("verified", "user"): 1, ("verified", "admin"): 1}
+
+    assert (await client.delete(f"/users/{target.id}")).status_code == 204
+    assert await counts() == {("verified", "admin"): 1}
+
+
+async def test_profile_query_budget(client, make_user, login, query_counter):
+    await login(await make_user())
+    query_counter.reset()
+
+    assert (await client.get("/users/me")).status_code == 200
+
+    query_counter.assert_at_most(1)
+
+
+async def test_login_query_budget(client, make_user, query_counter):
+    user = await make_user()
+    query_counter.reset()
+
+    response = await client.post("/auth/login", json={"email": user.email, "password": PASSWORD})
+
+    assert response.status_code == 200, response.text
+    query_counter.assert_at_most(1)
+
+
+async def test_list_query_budget_does_not_grow_with_the_page(client, make_user, login, query_counter):
+    await login(await make_user(role=UserRole.ADMIN))
+    for _ in range(20):
+        await make_user()
+    # the admin's lookup is cached from here on, the budget is the list's own
+    await client.get("/users/me")
+    query_counter.reset()
+
+    listed = await client.get("/users/", params={"limit": 20})
+
+    assert listed.status_code == 200
+    assert len(listed.json()["users"]) == 20
+    query_counter.assert_at_most(1)
+
+
+async def test_malformed_user_id_is_a_validation_error(client, make_user, login):
+    await login(await make_user(role=UserRole.ADMIN))
+
+    assert (await client.get("/users/not-a-uuid")).status_code == 422
+    assert (await client.patch("/users/not-a-uuid", json={"name": "X"})).status_code == 422
+    assert (await client.delete("/users/not-a-uuid")).status_code == 422
@@ -0,0 +1,128 @@
+"""
+Unit tests for the buffered audit log: batching, failure handling, spill files and paging.
+"""
+
+import os
+import pytest
+import uuid
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.audit.buffer import AuditBuffer
+from app.audit.repository import AuditRepo
+from app.config.log import request_id_var
+from app.core import AuditAction
+
+
+def session_factory(execute=None):
+    session = AsyncMock()
+    session.execute = execute or AsyncMock()
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=None)
+    return MagicMock(return_value=session), session
+
+
+def make_buffer(tmp_path, **kwargs):
+    options = {"batch_size": 2, "flush_rows": 100, "max_pending": 100, "spill_dir": str(tmp_path)}
+    return AuditBuffer(**{**options, **kwargs})
+
+
+@pytest.mark.asyncio
+async def test_flush_inserts_multi_row_batches_in_one_transaction(tmp_path):
+    """Five rows with batch_size 2: three multi-row INSERTs, one commit"""
+    audit = make_buffer(tmp_path)
+    token = request_id_var.set("req-1")
+    try:
+        for _ in range(5):
+            audit.record(AuditAction.LOGIN_SUCCEEDED, actor_id=uuid.uuid4())
+    finally:
+        request_id_var.reset(token)
+    factory, session = session_factory()
+
+    assert await audit.flush(factory) == 5
+
+    assert session.execute.await_count == 3
+    session.commit.assert_awaited_once()
+    sql = str(session.execute.await_args_list[0].args[0].compile(dialect=asyncpg.dialect()))
+    assert sql.startswith("INSERT INTO audit_log")
+    assert sql.count("), (") == 1
+    assert "req-1" in session.execute.await_args_list[0].args[0].compile().params.values()
+    assert len(audit) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_rows_ahead_of_newer_ones(tmp_path):
+    """Nothing is dropped, and the retry keeps the original order"""
+    audit = make_buffer(tmp_path)
+    audit.record(AuditAction.USER_UPDATED)
+
+    async def record_meanwhile(*args, **kwargs):
+        audit.record(AuditAction.USER_DELETED)
+        raise Exception("db down")
+
+    factory, _ = session_factory(AsyncMock(side_effect=record_meanwhile))
+
+    assert await audit.flush(factory) == 0
+    assert [row["action"] for row in audit._pending] == ["admin.user_updated", "admin.user_deleted"]
+
+
+@pytest.mark.asyncio
+async def test_rows_beyond_the_cap_spill_and_are_recovered(tmp_path):
+    """An outage longer than the buffer spills to disk, a later start inserts the file"""
+    audit = make_buffer(tmp_path, max_pending=2)
+    actor = uuid.uuid4()
+    for _ in range(3):
+        audit.record(AuditAction.LOGIN_FAILED, actor_id=actor, reason="credentials")
+    failing, _ = session_factory(AsyncMock(side_effect=Exception("db down")))
+
+    await audit.flush(failing)
+
+    assert len(os.listdir(tmp_path)) == 1
+    assert len(audit) == 0
+
+    factory, session = session_factory()
+    assert await audit.recover(factory) == 3
+    assert os.listdir(tmp_path) == []
+    rows = session.execute.await_args_list[0].args[0].compile().params
+    assert actor in rows.values()
+
+
+@pytest.mark.asyncio
+async def test_recover_leaves_the_file_when_insert_fails(tmp_path):
+    """A spill file is only removed once its rows are in the table"""
+    audit = make_buffer(tmp_path)
+    audit.record(AuditAction.ROLE_TOGGLED)
+    path = audit.spill()
+    failing, _ = session_factory(AsyncMock(side_effect=Exception("db down")))
+
+    assert await audit.recover(failing) == 0
+    assert os.path.exists(path)
+
+
+@pytest.mark.asyncio
+async def test_close_spills_what_the_database_refuses(tmp_path, mocker):
+    """Shutdown retries the flush, then writes the rest to disk"""
+    mocker.patch("app.audit.buffer.asyncio.sleep", AsyncMock())
+    audit = make_buffer(tmp_path)
+    audit.record(AuditAction.USER_DELETED)
+    failing, session = session_factory(AsyncMock(side_effect=Exception("db down")))
+
+    await audit.close(failing, attempts=2)
+
+    assert session.execute.await_count == 2
+    assert len(os.listdir(tmp_path)) == 1
+
+
+@pytest.mark.asyncio
+async def test_audit_page_is_keyset_paginated():
+    """`before` is an id bound on the newest-first order, filters are plain equality"""
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock())
+    actor = uuid.uuid4()
+
+    await AuditRepo(db).fetch_page(50, before=1000, actor_id=actor)
+
+    sql = str(db.execute.await_args.args[0].compile(dialect=asyncpg.dialect()))
+    assert "audit_log.id < $1" in sql
+    assert "audit_log.actor_id = $2" in sql
+    assert "ORDER BY audit_log.id DESC" in sql
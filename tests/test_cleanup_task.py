@@ -250,3 +250,21 @@ async def test_cutoff_time_calculation(mocker):
     assert now.month == 10
     assert now.day == 22
     assert expected_cutoff.day == 20
+
+
+@freeze_time("2025-10-22 12:00:00")
+@pytest.mark.asyncio
+async def test_cutoff_follows_the_configured_ttl(mocker):
+    """The scan deletes at the same deadline the expiry index uses"""
+    mocker.patch("app.users.expiry.settings.UNVERIFIED_USER_TTL_HOURS", 6)
+    mock_session = AsyncMock()
+    mock_session.execute = AsyncMock(return_value=MagicMock(rowcount=0))
+    mock_session.__aenter__ = AsyncMock(return_value=mock_session)
+    mock_session.__aexit__ = AsyncMock(return_value=None)
+    mocker.patch("app.tasks.cleanup.AsyncSessionLocal", return_value=mock_session)
+    mocker.patch("app.tasks.cleanup.invalidate_cached_users", AsyncMock())
+
+    await delete_unverified_users_async()
+
+    params = mock_session.execute.await_args.args[0].compile().params
+    assert datetime(2025, 10, 22, 6, 0) in params.values()
@@ -0,0 +1,163 @@
+"""
+Unit tests for the expiry index reaper.
+Redis and the database session are mocked, like in test_cleanup_task.py.
+"""
+
+import pytest
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.tasks.cleanup import rebuild_expiry_index, reap_expired_users, reap_expired_users_async
+
+
+def make_session(mocker, rowcount):
+    mock_session = AsyncMock()
+    mock_result = MagicMock()
+    mock_result.rowcount = rowcount
+
+    mock_session.execute = AsyncMock(return_value=mock_result)
+    mock_session.commit = AsyncMock()
+    mock_session.__aenter__ = AsyncMock(return_value=mock_session)
+    mock_session.__aexit__ = AsyncMock(return_value=None)
+
+    mocker.patch("app.tasks.cleanup.AsyncSessionLocal", return_value=mock_session)
+    return mock_session
+
+
+def make_redis(mocker, ready=True, batches=()):
+    mock_redis = AsyncMock()
+    mock_redis.__aenter__ = AsyncMock(return_value=mock_redis)
+    mock_redis.__aexit__ = AsyncMock(return_value=None)
+    mock_redis.exists = AsyncMock(return_value=1 if ready else 0)
+    mock_redis.zrangebyscore = AsyncMock(side_effect=list(batches) + [[]])
+
+    mocker.patch("app.tasks.cleanup.redis_client", return_value=mock_redis)
+    return mock_redis
+
+
+@pytest.mark.asyncio
+async def test_reaper_deletes_due_batch(mocker):
+    """Due ids are deleted in one statement and dropped from the index"""
+    mock_session = make_session(mocker, rowcount=2)
+    mock_redis = make_redis(mocker, batches=[["a", "b"]])
+
+    result = await reap_expired_users_async(batch_size=10)
+
+    assert result == {"mode": "index", "deleted_count": 2}
+    mock_session.execute.assert_called_once()
+    mock_session.commit.assert_called_once()
+    mock_redis.zrem.assert_called_once_with("users:pending_expiry", "a", "b")
+
+
+@pytest.mark.asyncio
+async def test_reaper_works_in_bounded_batches(mocker):
+    """Full batches keep the loop going, but never past max_batches"""
+    mock_session = make_session(mocker, rowcount=2)
+    make_redis(mocker, batches=[["a", "b"], ["c", "d"], ["e", "f"]])
+
+    result = await reap_expired_users_async(batch_size=2, max_batches=2)
+
+    assert result["deleted_count"] == 4
+    assert mock_session.execute.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_reaper_nothing_due(mocker):
+    """An empty head of the index costs one redis call and no DB work"""
+    mock_session = make_session(mocker, rowcount=0)
+    make_redis(mocker)
+
+    result = await reap_expired_users_async()
+
+    assert result == {"mode": "index", "deleted_count": 0}
+    mock_session.execute.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_reaper_falls_back_to_scan_when_index_lost(mocker):
+    """Missing sentinel means the index can't be trusted, run the full scan once"""
+    mock_redis = make_redis(mocker, ready=False)
+    calls = []
+    mock_redis.set = AsyncMock(side_effect=lambda *a, **kw: calls.append("ready"))
+    mocker.patch(
+        "app.tasks.cleanup.rebuild_expiry_index",
+        AsyncMock(side_effect=lambda redis: calls.append("rebuild")),
+    )
+    mock_scan = mocker.patch(
+        "app.tasks.cleanup.delete_unverified_users_async", AsyncMock(return_value=7)
+    )
+
+    result = await reap_expired_users_async()
+
+    assert result == {"mode": "scan", "deleted_count": 7}
+    mock_scan.assert_called_once()
+    # the sentinel only goes up once every pending user is in the index
+    assert calls == ["rebuild", "ready"]
+    mock_redis.zrangebyscore.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_rebuild_indexes_pending_users_by_deadline(mocker):
+    """Every live PENDING user is scored created_at + TTL, page by page"""
+    mocker.patch("app.users.expiry.settings.UNVERIFIED_USER_TTL_HOURS", 48)
+    created = datetime(2025, 10, 20, tzinfo=timezone.utc)
+    ids = [uuid.uuid4() for _ in range(3)]
+    pages = [
+        [SimpleNamespace(id=ids[0], created_at=created), SimpleNamespace(id=ids[1], created_at=created)],
+        [SimpleNamespace(id=ids[2], created_at=created)],
+    ]
+    mock_session = make_session(mocker, rowcount=0)
+    mock_session.execute = AsyncMock(
+        side_effect=[MagicMock(all=MagicMock(return_value=page)) for page in pages]
+    )
+    mock_redis = AsyncMock()
+
+    assert await rebuild_expiry_index(mock_redis, batch_size=2) == 3
+
+    deadline = created.timestamp() + 48 * 3600
+    assert mock_redis.zadd.await_args_list[0].args == (
+        "users:pending_expiry", {str(ids[0]): deadline, str(ids[1]): deadline}
+    )
+    assert mock_redis.zadd.await_args_list[1].args == ("users:pending_expiry", {str(ids[2]): deadline})
+    # the second page continues after the last id of the first
+    second = str(mock_session.execute.await_args_list[1].args[0].compile(dialect=asyncpg.dialect()))
+    assert "users.id > $" in second
+    assert "users.deleted_at IS NULL" in second
+
+
+@pytest.mark.asyncio
+async def test_reaper_without_redis_scans(mocker):
+    """With REDIS_URL unset the reaper degrades to the scan"""
+    mocker.patch("app.tasks.cleanup.redis_client", return_value=None)
+    mocker.patch(
+        "app.tasks.cleanup.delete_unverified_users_async", AsyncMock(return_value=1)
+    )
+
+    result = await reap_expired_users_async()
+
+    assert result == {"mode": "scan", "deleted_count": 1}
+
+
+def test_reap_expired_users_celery_task(mocker):
+    """The Celery wrapper reports the reaper result"""
+    mock_asyncio_run = mocker.patch("app.tasks.cleanup.asyncio.run")
+    mock_asyncio_run.return_value = {"mode": "index", "deleted_count": 3}
+
+    result = reap_expired_users()
+
+    assert result["status"] == "success"
+    assert result["deleted_count"] == 3
+
+
+def test_reap_expired_users_celery_task_error(mocker):
+    """The Celery wrapper reports errors instead of raising"""
+    mock_asyncio_run = mocker.patch("app.tasks.cleanup.asyncio.run")
+    mock_asyncio_run.side_effect = Exception("redis down")
+
+    result = reap_expired_users()
+
+    assert result["status"] == "error"
+    assert "redis down" in result["message"]
@@ -0,0 +1,145 @@
+"""
+Unit tests for the Idempotency-Key middleware, driven through plain ASGI calls
+with the in-memory store.
+"""
+
+import asyncio
+import json
+import pytest
+
+from app.core.idempotency import IdempotencyMiddleware, MemoryIdempotencyStore
+
+
+def make_app(status=200, delay=0.0):
+    """ASGI app that counts calls and echoes the body, with an auth cookie"""
+    calls = {"count": 0}
+
+    async def app(scope, receive, send):
+        calls["count"] += 1
+        message = await receive()
+        await asyncio.sleep(delay)
+        body = json.dumps({"call": calls["count"], "echo": message["body"].decode()})
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"set-cookie", f"access_token=t{calls['count']}".encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body.encode()})
+
+    return app, calls
+
+
+async def call(app, key=None, body=b"{}", method="POST", path="/auth/signup"):
+    headers = [(b"content-type", b"application/json")]
+    if key:
+        headers.append((b"idempotency-key", key.encode()))
+    scope = {"type": "http", "method": method, "path": path, "headers": headers}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    response = {"body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = dict(message["headers"])
+        else:
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response
+
+
+@pytest.mark.asyncio
+async def test_retry_replays_first_response():
+    """Same key and body: handler runs once, retry gets status, cookies and body back"""
+    inner, calls = make_app()
+    app = IdempotencyMiddleware(inner, store=MemoryIdempotencyStore())
+
+    first = await call(app, key="k1")
+    second = await call(app, key="k1")
+
+    assert calls["count"] == 1
+    assert second["status"] == first["status"] == 200
+    assert second["body"] == first["body"]
+    assert second["headers"][b"set-cookie"] == b"access_token=t1"
+    assert second["headers"][b"idempotent-replayed"] == b"true"
+
+
+@pytest.mark.asyncio
+async def test_without_key_passes_through():
+    """Requests without the header are never stored"""
+    inner, calls = make_app()
+    app = IdempotencyMiddleware(inner, store=MemoryIdempotencyStore())
+
+    await call(app)
+    await call(app)
+
+    assert calls["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_safe_methods_pass_through():
+    """GET is idempotent already, the key is ignored"""
+    inner, calls = make_app()
+    app = IdempotencyMiddleware(inner, store=MemoryIdempotencyStore())
+
+    await call(app, key="k1", method="GET", path="/users/me")
+    await call(app, key="k1", method="GET", path="/users/me")
+
+    assert calls["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_key_reuse_with_different_body_is_rejected():
+    """A key is bound to the request it was first used with"""
+    inner, calls = make_app()
+    app = IdempotencyMiddleware(inner, store=MemoryIdempotencyStore())
+
+    await call(app, key="k1", body=b'{"email": "a@b.com"}')
+    response = await call(app, key="k1", body=b'{"email": "c@d.com"}')
+
+    assert response["status"] == 422
+    assert calls["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_wait_for_first():
+    """In-flight duplicates wait and replay instead of running the handler again"""
+    inner, calls = make_app(delay=0.05)
+    app = IdempotencyMiddleware(inner, store=MemoryIdempotencyStore())
+
+    responses = await asyncio.gather(*[call(app, key="k1") for _ in range(5)])
+
+    assert calls["count"] == 1
+    assert len({r["body"] for r in responses}) == 1
+    assert sum(b"idempotent-replayed" in r["headers"] for r in responses) == 4
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_not_stored():
+    """A retry after a 5xx runs the handler again"""
+    inner, calls = make_app(status=503)
+    app = IdempotencyMiddleware(inner, store=MemoryIdempotencyStore())
+
+    await call(app, key="k1")
+    await call(app, key="k1")
+
+    assert calls["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_request_body_reaches_handler():
+    """The middleware reads the body for fingerprinting and hands it on unchanged"""
+    inner, _ = make_app()
+    app = IdempotencyMiddleware(inner, store=MemoryIdempotencyStore())
+
+    response = await call(app, key="k1", body=b'{"email": "a@b.com"}')
+
+    assert json.loads(response["body"])["echo"] == '{"email": "a@b.com"}'
@@ -0,0 +1,111 @@
+"""
+Unit tests for batch token introspection.
+"""
+
+import uuid
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from fastapi import HTTPException
+
+from app.auth import services
+from app.auth.sessions import MemorySessionStore
+from app.config import dependencies
+from app.config.jwt import create_access_token, create_refresh_token
+
+
+def make_user(user_id):
+    return MagicMock(id=user_id, email=f"{user_id}@example.com", role="user", status="verified")
+
+
+@pytest.fixture
+def repo(mocker):
+    repo = MagicMock()
+    mocker.patch("app.auth.services.UserRepo", return_value=repo)
+    return repo
+
+
+@pytest.mark.asyncio
+async def test_one_lookup_for_the_whole_batch(repo):
+    """Every user is loaded by a single get_users_by_ids call, deduplicated"""
+    alice, bob = uuid.uuid4(), uuid.uuid4()
+    repo.get_users_by_ids = AsyncMock(return_value=[make_user(alice), make_user(bob)])
+    tokens = [
+        create_access_token(alice, "a@example.com"),
+        create_refresh_token(alice),
+        create_access_token(bob, "a@example.com"),
+    ]
+
+    results = await services.introspect_tokens(AsyncMock(), tokens)
+
+    repo.get_users_by_ids.assert_awaited_once()
+    assert set(repo.get_users_by_ids.call_args.args[0]) == {alice, bob}
+    assert [r["active"] for r in results] == [True, True, True]
+    assert [r["token_type"] for r in results] == ["access", "refresh", "access"]
+    assert results[2]["user"].id == bob
+
+
+@pytest.mark.asyncio
+async def test_inactive_tokens_keep_their_position(repo):
+    """Bad tokens and unknown users are reported in place with a reason"""
+    known, gone = uuid.uuid4(), uuid.uuid4()
+    repo.get_users_by_ids = AsyncMock(return_value=[make_user(known)])
+    tokens = [
+        "not-a-jwt",
+        create_access_token(gone, "a@example.com"),
+        create_access_token(known, "a@example.com"),
+    ]
+
+    results = await services.introspect_tokens(AsyncMock(), tokens)
+
+    assert results[0] == {"active": False, "reason": "invalid_or_expired"}
+    assert results[1]["reason"] == "user_not_found"
+    assert results[2]["active"] is True
+
+
+@pytest.mark.asyncio
+async def test_service_token_is_required(mocker):
+    """Only callers presenting a configured service token get through"""
+    mocker.patch.object(dependencies.settings, "SERVICE_API_TOKENS", "alpha, beta")
+
+    def request(header):
+        return MagicMock(headers={"Authorization": header} if header else {})
+
+    await dependencies.require_service_token(request("Bearer beta"))
+    for header in (None, "Bearer gamma", "Basic beta", "Bearer "):
+        with pytest.raises(HTTPException) as ex:
+            await dependencies.require_service_token(request(header))
+        assert ex.value.status_code == 401
+
+
+def test_documented_limit_follows_the_setting():
+    """The documented limit is the configured one, not a copy of the default"""
+    from app.auth.router import introspect, router
+
+    route = next(r for r in router.routes if getattr(r, "endpoint", None) is introspect)
+    limit = dependencies.settings.INTROSPECTION_MAX_TOKENS
+
+    assert f"up to {limit} access" in route.description
+
+
+@pytest.mark.asyncio
+async def test_refresh_tokens_of_ended_families_are_inactive(repo, mocker):
+    """A rotated-away refresh token, or one of a closed family, is no longer active"""
+    user_id = uuid.uuid4()
+    repo.get_users_by_ids = AsyncMock(return_value=[make_user(user_id)])
+    store = MemorySessionStore()
+    mocker.patch("app.auth.services.get_session_store", return_value=store)
+    mocker.patch("app.auth.services.revoke_access", AsyncMock())
+
+    first = await services.issue_tokens(user_id, "a@example.com")
+    payload = services.decode_token(first["refresh_token"])
+    rotated = await services.rotate_tokens(payload["sid"], payload)
+
+    results = await services.introspect_tokens(
+        AsyncMock(), [first["refresh_token"], rotated["refresh_token"], rotated["access_token"]]
+    )
+    assert [r["active"] for r in results] == [False, True, True]
+    assert results[0]["reason"] == "session_ended"
+
+    await store.close(str(user_id))
+    results = await services.introspect_tokens(AsyncMock(), [rotated["refresh_token"]])
+    assert results[0]["reason"] == "session_ended"
@@ -0,0 +1,121 @@
+"""
+Unit tests for asymmetric JWT signing, key rotation and the JWKS document.
+"""
+
+import uuid
+import pytest
+from jose import jwk, jwt as jose_jwt
+
+from app.config import jwt
+from scripts.generate_jwt_key import write_private, retire
+
+
+@pytest.fixture
+def keys_dir(tmp_path, mocker):
+    """Point the keyset at a temporary key directory"""
+
+    def use(signing_kid="", accept_hs256=True, directory=tmp_path):
+        mocker.patch.object(jwt.settings, "JWT_KEYS_DIR", str(directory))
+        mocker.patch.object(jwt.settings, "JWT_SIGNING_KID", signing_kid)
+        mocker.patch.object(jwt.settings, "JWT_ACCEPT_HS256", accept_hs256)
+        jwt.get_keyset.cache_clear()
+
+    yield tmp_path, use
+    jwt.get_keyset.cache_clear()
+
+
+def test_tokens_carry_the_signing_kid(keys_dir):
+    """New tokens are RS256 with the signing key's kid"""
+    path, use = keys_dir
+    kid = write_private(path, "rsa")
+    use()
+
+    token = jwt.create_access_token(uuid.uuid4(), "a@example.com")
+
+    assert jose_jwt.get_unverified_header(token) == {"alg": "RS256", "kid": kid, "typ": "JWT"}
+    assert jwt.verify_access_token(token)["email"] == "a@example.com"
+
+
+def test_jwks_verifies_tokens_offline(keys_dir):
+    """A downstream service can verify with nothing but the published JWK"""
+    path, use = keys_dir
+    write_private(path, "ec")
+    use()
+    token = jwt.create_refresh_token(uuid.uuid4())
+
+    (published,) = jwt.get_keyset().jwks()["keys"]
+
+    assert "d" not in published
+    assert published["alg"] == "ES256"
+    assert jose_jwt.decode(token, jwk.construct(published), algorithms=["ES256"])["type"] == "refresh"
+
+
+def test_retired_keys_still_verify(keys_dir):
+    """Tokens signed by a rotated-out key stay valid until they expire"""
+    path, use = keys_dir
+    old = write_private(path, "rsa")
+    use(signing_kid=old)
+    token = jwt.create_access_token(uuid.uuid4(), "a@example.com")
+
+    new = write_private(path, "rsa")
+    retire(path, old)
+    use(signing_kid=new)
+
+    assert jwt.verify_access_token(token) is not None
+    assert jose_jwt.get_unverified_header(jwt.create_refresh_token(uuid.uuid4()))["kid"] == new
+    assert {k["kid"] for k in jwt.get_keyset().jwks()["keys"]} == {old, new}
+
+
+def test_legacy_hs256_tokens(keys_dir):
+    """Pre-rotation HS256 tokens are honoured only while JWT_ACCEPT_HS256 is set"""
+    legacy = jwt.create_access_token(uuid.uuid4(), "a@example.com")
+    path, use = keys_dir
+    write_private(path, "rsa")
+
+    use(accept_hs256=True)
+    assert jwt.verify_access_token(legacy) is not None
+
+    use(accept_hs256=False)
+    assert jwt.verify_access_token(legacy) is None
+
+
+def test_unknown_kid_is_rejected(keys_dir):
+    """A kid that isn't in the keyset never falls back to another key"""
+    path, use = keys_dir
+    write_private(path, "rsa")
+    use()
+    token = jwt.create_access_token(uuid.uuid4(), "a@example.com")
+
+    other_dir = path / "other"
+    other_dir.mkdir()
+    write_private(other_dir, "rsa")
+    use(directory=other_dir, accept_hs256=False)
+
+    assert jwt.verify_access_token(token) is None
+
+
+def test_new_private_key_needs_a_signing_kid(keys_dir):
+    """A second private key is never picked to sign until JWT_SIGNING_KID names it"""
+    path, use = keys_dir
+    current = write_private(path, "rsa")
+    write_private(path, "rsa")
+
+    use()
+    with pytest.raises(ValueError, match="JWT_SIGNING_KID"):
+        jwt.get_keyset()
+
+    use(signing_kid=current)
+    assert jose_jwt.get_unverified_header(jwt.create_refresh_token(uuid.uuid4()))["kid"] == current
+
+
+def test_verification_uses_public_keys(keys_dir):
+    """Private halves are only ever used to sign"""
+    path, use = keys_dir
+    write_private(path, "ec")
+    use()
+    token = jwt.create_access_token(uuid.uuid4(), "a@example.com")
+
+    alg, key = jwt.get_keyset().verification_key(token)
+
+    assert alg == "ES256"
+    assert key.is_public()
@@ -0,0 +1,173 @@
+"""
+Unit tests for startup warmup, readiness and the shutdown drain.
+"""
+
+import asyncio
+import json
+import pytest
+import signal
+import socket
+import uvicorn
+from unittest.mock import AsyncMock, MagicMock
+
+from app.core.lifecycle import DrainMiddleware, Lifecycle, drain_on_signals
+from app.health import router as health
+from app.health import warmup
+
+
+def make_app(release: asyncio.Event = None):
+    async def app(scope, receive, send):
+        if release is not None:
+            await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    return app
+
+
+async def call(app, path="/users/me"):
+    scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+    response = {}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = dict(message["headers"])
+
+    await app(scope, AsyncMock(), send)
+    return response
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_in_flight_requests():
+    """Shutdown waits for running requests and refuses new ones meanwhile"""
+    lifecycle = Lifecycle()
+    release = asyncio.Event()
+    app = DrainMiddleware(make_app(release), lifecycle)
+
+    running = asyncio.create_task(call(app))
+    await asyncio.sleep(0)
+    drain = asyncio.create_task(lifecycle.drain(timeout=1))
+    await asyncio.sleep(0)
+
+    refused = await call(app)
+    assert refused["status"] == 503
+    assert refused["headers"][b"connection"] == b"close"
+    assert not drain.done()
+
+    release.set()
+    assert (await running)["status"] == 200
+    assert await drain is True
+
+
+@pytest.mark.asyncio
+async def test_drain_gives_up_after_timeout():
+    """A stuck request can't hold shutdown forever"""
+    lifecycle = Lifecycle()
+    app = DrainMiddleware(make_app(asyncio.Event()), lifecycle)
+    stuck = asyncio.create_task(call(app))
+    await asyncio.sleep(0)
+
+    assert await lifecycle.drain(timeout=0.01) is False
+    stuck.cancel()
+
+
+@pytest.mark.asyncio
+async def test_probes_are_served_while_draining():
+    """Health checks bypass the drain so the liveness probe keeps passing"""
+    lifecycle = Lifecycle()
+    await lifecycle.drain(timeout=0)
+    app = DrainMiddleware(make_app(), lifecycle)
+
+    assert (await call(app, path="/health/live"))["status"] == 200
+
+
+@pytest.mark.asyncio
+async def test_uvicorn_sigterm_drains_before_waiting_for_connections():
+    """SIGTERM marks the worker draining while requests still run, so streams end and shutdown completes"""
+    lifecycle = Lifecycle()
+    order = []
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            restore = None
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    restore = drain_on_signals(lifecycle, [signal.SIGTERM])
+                    await send({"type": "lifespan.startup.complete"})
+                else:
+                    restore()
+                    order.append(("lifespan shutdown", lifecycle.in_flight))
+                    await lifecycle.drain(timeout=1)
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        # a long-lived stream, only ends once the worker drains
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        while not lifecycle.draining:
+            await asyncio.sleep(0.01)
+        order.append(("stream ended", lifecycle.in_flight))
+        await send({"type": "http.response.body", "body": b"bye"})
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    config = uvicorn.Config(DrainMiddleware(app, lifecycle), lifespan="on", log_level="error")
+    server = uvicorn.Server(config)
+    # uvicorn re-raises the signal once done, land it on a no-op instead of the default
+    previous = signal.signal(signal.SIGTERM, lambda *args: None)
+    try:
+        serving = asyncio.create_task(server.serve(sockets=[sock]))
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        reader, writer = await asyncio.open_connection(*sock.getsockname())
+        writer.write(b"GET /users/events HTTP/1.1\r\nHost: test\r\n\r\n")
+        await writer.drain()
+        assert (await reader.readline()).startswith(b"HTTP/1.1 200")
+
+        signal.raise_signal(signal.SIGTERM)
+        # hangs here if draining only started in the lifespan shutdown
+        await asyncio.wait_for(serving, timeout=5)
+        writer.close()
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        sock.close()
+
+    assert order == [("stream ended", 1), ("lifespan shutdown", 0)]
+
+
+@pytest.mark.asyncio
+async def test_readiness_follows_lifecycle(mocker):
+    """Not ready before warmup and while draining, ready in between"""
+    mocker.patch.object(health, "lifecycle", Lifecycle())
+    conn = AsyncMock()
+    engine = MagicMock()
+    engine.connect.return_value.__aenter__ = AsyncMock(return_value=conn)
+    engine.connect.return_value.__aexit__ = AsyncMock(return_value=False)
+    mocker.patch.object(health, "engine", engine)
+
+    assert (await health.ready()).status_code == 503
+
+    health.lifecycle.mark_ready()
+    assert (await health.ready())["status"] == "ready"
+
+    await health.lifecycle.drain(timeout=0)
+    response = await health.ready()
+    assert response.status_code == 503
+    assert json.loads(response.body) == {"status": "draining"}
+
+
+@pytest.mark.asyncio
+async def test_warm_pool_prepares_every_connection(mocker):
+    """Each warmed connection runs the hot statements, capped at the pool size"""
+    engine = MagicMock()
+    engine.pool.size.return_value = 3
+    engine.connect.return_value.__aenter__ = AsyncMock()
+    engine.connect.return_value.__aexit__ = AsyncMock(return_value=False)
+    mocker.patch("app.health.warmup.AsyncSession")
+    hot = mocker.patch("app.health.warmup.run_hot_statements", AsyncMock())
+
+    warmed = await warmup.warm_pool(engine, connections=5)
+
+    assert warmed == 3
+    assert hot.await_count == 3
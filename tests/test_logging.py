@@ -0,0 +1,83 @@
+"""
+Unit tests for the queue-based JSON logging setup.
+"""
+
+import io
+import json
+import logging
+import pytest
+
+from app.config.log import RequestLogMiddleware, setup_logging, stop_logging
+
+
+@pytest.fixture
+def log_stream():
+    stream = io.StringIO()
+    root = logging.getLogger()
+    handlers, level = root.handlers, root.level
+    setup_logging(level="INFO", stream=stream)
+    yield stream
+    stop_logging()
+    root.handlers, root.level = handlers, level
+
+
+def records(stream):
+    stop_logging()  # drain the queue
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_are_json_with_extra_fields(log_stream):
+    """Message, level and `extra` fields end up in one JSON object"""
+    logging.getLogger("app.test").info("user %s created", "a@b.com", extra={"user_id": "42"})
+
+    (record,) = records(log_stream)
+    assert record["message"] == "user a@b.com created"
+    assert record["level"] == "INFO"
+    assert record["logger"] == "app.test"
+    assert record["user_id"] == "42"
+
+
+def test_exceptions_are_formatted(log_stream):
+    """Tracebacks survive the trip through the queue"""
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logging.getLogger("app.test").exception("failed")
+
+    (record,) = records(log_stream)
+    assert "ValueError: boom" in record["exc"]
+
+
+def test_sampled_out_records_are_dropped(log_stream):
+    """sample_rate=0 drops the record, no sample_rate keeps it"""
+    logger = logging.getLogger("app.test")
+    logger.info("noisy", extra={"sample_rate": 0.0})
+    logger.info("kept")
+
+    assert [r["message"] for r in records(log_stream)] == ["kept"]
+
+
+@pytest.mark.asyncio
+async def test_request_id_is_attached_and_returned(log_stream):
+    """Records logged during a request carry its id, which is also a response header"""
+
+    async def app(scope, receive, send):
+        logging.getLogger("app.test").info("inside")
+        await send({"type": "http.response.start", "status": 201, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    headers = {}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            headers.update(dict(message["headers"]))
+
+    scope = {"type": "http", "method": "POST", "path": "/auth/signup", "headers": [(b"x-request-id", b"req-1")]}
+    await RequestLogMiddleware(app)(scope, None, send)
+
+    inside, access = records(log_stream)
+    assert headers[b"x-request-id"] == b"req-1"
+    assert inside["request_id"] == access["request_id"] == "req-1"
+    assert access["status"] == 201
+    assert access["path"] == "/auth/signup"
+    assert "duration_ms" in access
@@ -0,0 +1,107 @@
+"""
+Unit tests for configurable password hashing costs and rehash-on-login.
+"""
+
+import pytest
+import threading
+import uuid
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.users.models import User, password_context
+from app.users.repository import UserRepo
+
+
+def test_other_costs_need_an_update_in_both_directions():
+    """A digest cheaper or dearer than the configured rounds is flagged, the configured one isn't"""
+    digest = password_context(bcrypt_rounds=5).hash("secret")
+
+    assert password_context(bcrypt_rounds=4).needs_update(digest)
+    assert password_context(bcrypt_rounds=6).needs_update(digest)
+    assert not password_context(bcrypt_rounds=5).needs_update(digest)
+    assert password_context(bcrypt_rounds=6).verify("secret", digest)
+
+
+def test_argon2_without_backend_fails_at_startup():
+    """Selecting argon2 without argon2-cffi is a configuration error, not a failed signup"""
+    if password_context().handler("argon2").has_backend():
+        pytest.skip("argon2-cffi is installed")
+
+    with pytest.raises(RuntimeError):
+        password_context("argon2")
+
+
+def patch_rehash_session(mocker, rowcount=1):
+    session = AsyncMock()
+    session.execute = AsyncMock(return_value=MagicMock(rowcount=rowcount))
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=None)
+    mocker.patch("app.users.repository.AsyncSessionLocal", return_value=session)
+    return session
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_an_outdated_digest(mocker):
+    """The verified digest is replaced in its own session and the cached user dropped"""
+    mocker.patch("app.users.repository.hash_password", return_value="new-digest")
+    invalidate = mocker.patch("app.users.repository.user_cache.invalidate", AsyncMock())
+    session = patch_rehash_session(mocker)
+    user = User(id=uuid.uuid4(), email="a@example.com", password=password_context(bcrypt_rounds=4).hash("secret"))
+    repo = UserRepo(MagicMock())
+    repo.query_user_by_email = AsyncMock(return_value=user)
+
+    assert await repo.authenticate_user("a@example.com", "secret") is user
+
+    stmt = session.execute.await_args.args[0]
+    assert "WHERE users.id = $2::UUID AND users.password = $3" in str(stmt.compile(dialect=asyncpg.dialect()))
+    assert stmt.compile().params["password_1"] == user.password
+    session.commit.assert_awaited_once()
+    invalidate.assert_awaited_once_with([user.id])
+
+
+@pytest.mark.asyncio
+async def test_failed_rehash_still_logs_in(mocker):
+    """A database error during the rehash only logs"""
+    mocker.patch("app.users.repository.hash_password", return_value="new-digest")
+    session = patch_rehash_session(mocker)
+    session.execute.side_effect = Exception("db down")
+    user = User(id=uuid.uuid4(), email="a@example.com", password=password_context(bcrypt_rounds=4).hash("secret"))
+    repo = UserRepo(MagicMock())
+    repo.query_user_by_email = AsyncMock(return_value=user)
+
+    assert await repo.authenticate_user("a@example.com", "secret") is user
+
+
+@pytest.mark.asyncio
+async def test_wrong_password_is_never_rehashed(mocker):
+    """Only a verified password is hashed again"""
+    session = patch_rehash_session(mocker)
+    user = User(id=uuid.uuid4(), email="a@example.com", password=password_context(bcrypt_rounds=4).hash("secret"))
+    repo = UserRepo(MagicMock())
+    repo.query_user_by_email = AsyncMock(return_value=user)
+
+    assert await repo.authenticate_user("a@example.com", "wrong") is None
+    session.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_hashing_runs_off_the_event_loop(mocker):
+    """Verifying and rehashing happen in worker threads, not on the loop's"""
+    threads = []
+
+    def record(password):
+        threads.append(threading.get_ident())
+        return "new-digest"
+
+    mocker.patch("app.users.repository.hash_password", side_effect=record)
+    mocker.patch("app.users.repository.user_cache.invalidate", AsyncMock())
+    patch_rehash_session(mocker)
+    user = User(id=uuid.uuid4(), email="a@example.com", password=password_context(bcrypt_rounds=4).hash("secret"))
+    mocker.patch.object(user, "verify_password", side_effect=lambda password: record(password) and True)
+    repo = UserRepo(MagicMock())
+    repo.query_user_by_email = AsyncMock(return_value=user)
+
+    assert await repo.authenticate_user("a@example.com", "secret") is user
+
+    assert len(threads) == 2
+    assert threading.get_ident() not in threads
@@ -0,0 +1,122 @@
+"""
+Unit tests for on-demand request profiling: stack sampling, memory diffs and the profile store.
+"""
+
+import asyncio
+import os
+import pytest
+import time
+from unittest.mock import AsyncMock
+
+from app.core.profiling import ProfileStore, ProfilingMiddleware
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def handler(scope, receive, send):
+    busy(0.05)
+    await asyncio.sleep(0.05)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def call(middleware, headers=()):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/users/me", "headers": list(headers)}
+    await middleware(scope, AsyncMock(), send)
+    return sent
+
+
+def profile_files(tmp_path):
+    return sorted(os.listdir(tmp_path)) if tmp_path.exists() else []
+
+
+@pytest.mark.asyncio
+async def test_header_profiles_wall_and_cpu_stacks(tmp_path):
+    """The wall profile shows the await, the CPU profile only the busy loop"""
+    store = ProfileStore(str(tmp_path))
+    middleware = ProfilingMiddleware(handler, store, authorize=AsyncMock(return_value=True), interval=0.002)
+
+    sent = await call(middleware, [(b"x-profile", b"stacks")])
+
+    profile_id = dict(sent[0]["headers"])[b"x-profile-id"].decode()
+    assert profile_files(tmp_path) == [f"{profile_id}.cpu.folded", f"{profile_id}.wall.folded"]
+    wall = (tmp_path / f"{profile_id}.wall.folded").read_text()
+    cpu = (tmp_path / f"{profile_id}.cpu.folded").read_text()
+    assert "handler" in wall and "(awaiting)" in wall
+    assert "busy" in cpu and "(awaiting)" not in cpu
+    # every line is `stack count`
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in wall.splitlines())
+
+
+@pytest.mark.asyncio
+async def test_header_is_ignored_for_unauthorized_callers(tmp_path):
+    """Without admin rights the request runs unprofiled and says nothing about it"""
+    store = ProfileStore(str(tmp_path))
+    middleware = ProfilingMiddleware(handler, store, authorize=AsyncMock(return_value=False))
+
+    sent = await call(middleware, [(b"x-profile", b"stacks")])
+
+    assert sent[0]["headers"] == []
+    assert profile_files(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_sampled_requests_skip_the_authorization_check(tmp_path):
+    """Random sampling needs no header, so nothing is looked up"""
+    authorize = AsyncMock()
+    middleware = ProfilingMiddleware(handler, ProfileStore(str(tmp_path)), authorize, sample_rate=1.0)
+
+    await call(middleware)
+
+    authorize.assert_not_awaited()
+    assert len(profile_files(tmp_path)) == 2
+
+
+@pytest.mark.asyncio
+async def test_memory_mode_writes_allocation_diff(tmp_path):
+    """Allocations made during the request show up in the diff"""
+    kept = []
+
+    async def allocating(scope, receive, send):
+        kept.append([bytearray(1024) for _ in range(500)])
+        await handler(scope, receive, send)
+
+    middleware = ProfilingMiddleware(allocating, ProfileStore(str(tmp_path)), AsyncMock(return_value=True))
+
+    await call(middleware, [(b"x-profile", b"memory")])
+
+    (name,) = profile_files(tmp_path)
+    report = (tmp_path / name).read_text()
+    assert name.endswith(".alloc.txt")
+    assert "test_profiling.py" in report
+
+
+def test_store_serves_only_its_own_names(tmp_path):
+    """Download names are validated, so no path outside the directory is reachable"""
+    store = ProfileStore(str(tmp_path))
+    profile_id = store.new_id("GET", "/users/../me")
+
+    assert store.path(f"{profile_id}.wall.folded") == str(tmp_path / f"{profile_id}.wall.folded")
+    assert store.path("../settings.py") is None
+    assert store.path(f"{profile_id}.wall.folded/../../x") is None
+
+
+def test_store_prunes_oldest_profiles(tmp_path):
+    """Only the newest max_files profiles are kept"""
+    store = ProfileStore(str(tmp_path), max_files=2)
+    names = [f"{store.new_id('GET', '/')}.cpu.folded" for _ in range(3)]
+    for i, name in enumerate(names):
+        store.write({name: "a 1\n"})
+        os.utime(tmp_path / name, (1000 + i, 1000 + i))
+    store.prune()
+
+    assert [p["name"] for p in store.list()] == [names[2], names[1]]
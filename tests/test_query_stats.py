@@ -0,0 +1,107 @@
+"""
+Unit tests for per-request query accounting, using an in-memory sqlite engine.
+"""
+
+import logging
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.core.query_stats import QueryStatsMiddleware, install_query_stats, track_queries
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    install_query_stats(engine, slow_query_ms=0)
+    return engine
+
+
+def test_counts_statements_and_time(engine, query_counter):
+    """Each statement adds to the count and to the total DB time"""
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 2"))
+
+    assert query_counter.count == 2
+    assert query_counter.total_time > 0
+    assert query_counter.duplicates == {}
+
+
+def test_detects_duplicate_statements(engine, query_counter):
+    """The same statement text issued repeatedly is reported"""
+    with engine.connect() as conn:
+        for i in range(3):
+            conn.execute(text("SELECT :x"), {"x": i})
+
+    assert query_counter.duplicates == {"SELECT ?": 3}
+
+
+def test_budget_assertion_lists_statements(engine, query_counter):
+    """A blown budget fails with the offending statements in the message"""
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 1"))
+
+    query_counter.assert_at_most(2)
+    with pytest.raises(AssertionError, match="2x SELECT 1"):
+        query_counter.assert_at_most(1)
+
+
+def test_nested_tracking_counts_for_the_outer_counter(engine, query_counter):
+    """A request tracked by the middleware still counts toward the test's budget"""
+    with track_queries() as inner:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    assert inner.count == 1
+    assert query_counter.count == 1
+
+
+def test_untracked_statements_are_ignored(engine):
+    """Outside track_queries() nothing is counted and nothing breaks"""
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+def test_slow_queries_are_logged(engine, caplog):
+    """Statements over the threshold go to the slow-query logger"""
+    with caplog.at_level(logging.WARNING, logger="app.db.slow_query"):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    assert "slow query" in caplog.text
+
+
+def test_install_is_idempotent(engine, query_counter):
+    """Installing twice doesn't double count"""
+    install_query_stats(engine)
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    assert query_counter.count == 1
+
+
+@pytest.mark.asyncio
+async def test_middleware_exposes_debug_headers(engine):
+    """Per-request numbers are returned as response headers"""
+
+    async def app(scope, receive, send):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 1"))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    headers = {}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            headers.update(dict(message["headers"]))
+
+    scope = {"type": "http", "method": "GET", "path": "/users/me", "headers": []}
+    await QueryStatsMiddleware(app, expose_headers=True)(scope, None, send)
+
+    assert headers[b"x-db-query-count"] == b"2"
+    assert headers[b"x-db-duplicate-queries"] == b"2"
+    assert float(headers[b"x-db-time-ms"]) >= 0
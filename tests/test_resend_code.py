@@ -0,0 +1,134 @@
+"""
+Unit tests for resend-verification coalescing and cooldown.
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.auth import services
+from app.core.singleflight import SingleFlight
+
+
+@pytest.fixture(autouse=True)
+def local_cooldowns(mocker):
+    """Run against the in-process cooldown state, without redis"""
+    mocker.patch("app.auth.services.get_redis", return_value=None)
+    mocker.patch.dict(services._local_cooldowns, clear=True)
+
+
+@pytest.fixture
+def mock_resend(mocker):
+    """Slow code generation so concurrent requests overlap"""
+
+    async def slow_resend(email):
+        await asyncio.sleep(0.01)
+        return MagicMock(), "123456"
+
+    session = AsyncMock()
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=None)
+    mocker.patch("app.auth.services.AsyncSessionLocal", return_value=session)
+    service = MagicMock()
+    service.resend_verification_code = AsyncMock(side_effect=slow_resend)
+    mocker.patch("app.auth.services.UserService", return_value=service)
+    return service
+
+
+@pytest.fixture
+def mock_email(mocker):
+    return mocker.patch(
+        "app.auth.services.send_verification_email", AsyncMock(return_value=True)
+    )
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_calls():
+    """Concurrent calls with the same key run the function once"""
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "done"
+
+    results = await asyncio.gather(*[flight.do("key", work) for _ in range(10)])
+
+    assert results == ["done"] * 10
+    assert calls == 1
+    assert not flight.in_flight("key")
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_exceptions():
+    """Every waiter sees the failure of the shared call"""
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(
+        *[flight.do("key", fail) for _ in range(3)], return_exceptions=True
+    )
+
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_resends_send_one_email(mock_resend, mock_email):
+    """Double clicks cost one code generation and one email"""
+    results = await asyncio.gather(
+        *[services.resend_verification("a@b.com") for _ in range(5)]
+    )
+
+    assert results == [0] * 5
+    mock_resend.resend_verification_code.assert_called_once()
+    mock_email.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_flight_survives_the_request_that_started_it(mock_resend, mock_email):
+    """The shared resend runs on its own session, a disconnected first caller doesn't end it"""
+    first = asyncio.ensure_future(services.resend_verification("a@b.com"))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(services.resend_verification("a@b.com"))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == 0
+    services.AsyncSessionLocal.assert_called_once_with()
+    mock_email.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_repeat_resend_hits_cooldown(mock_resend, mock_email):
+    """A second request in the window is rejected without touching the DB"""
+    assert await services.resend_verification("a@b.com") == 0
+
+    retry_after = await services.resend_verification("A@b.com")
+
+    assert 0 < retry_after <= 60
+    mock_resend.resend_verification_code.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_failed_email_releases_cooldown(mock_resend, mock_email):
+    """If the email couldn't be sent the user may retry immediately"""
+    mock_email.return_value = False
+
+    await services.resend_verification("a@b.com")
+    await services.resend_verification("a@b.com")
+
+    assert mock_email.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_unknown_email_sends_nothing(mock_resend, mock_email):
+    """Unknown or verified addresses look the same as a successful resend"""
+    mock_resend.resend_verification_code = AsyncMock(return_value=None)
+
+    assert await services.resend_verification("x@b.com") == 0
+    mock_email.assert_not_called()
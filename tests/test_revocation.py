@@ -0,0 +1,135 @@
+"""
+Unit tests for logout, token revocation and the per-worker denylist.
+"""
+
+import json
+import time
+import uuid
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from fastapi import HTTPException
+
+from app.auth import revocation, services
+from app.config import dependencies
+from app.config.jwt import create_access_token, create_refresh_token, decode_token
+from app.core.bloom import BloomFilter
+
+
+@pytest.fixture(autouse=True)
+def fresh_denylist(mocker):
+    """Each test starts with an empty local list and no redis"""
+    mocker.patch.object(revocation, "revocations", revocation.RevocationList(1000, 0.001))
+    mocker.patch("app.auth.revocation.get_redis", return_value=None)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    """Everything added is found, and the false positive rate stays near target"""
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    added = [str(uuid.uuid4()) for _ in range(5000)]
+    for item in added:
+        bloom.add(item)
+
+    assert all(item in bloom for item in added)
+    false_positives = sum(str(uuid.uuid4()) in bloom for _ in range(5000))
+    assert false_positives < 5000 * 0.03
+
+
+@pytest.mark.asyncio
+async def test_revoked_token_is_rejected():
+    """Only the revoked token is affected, not other tokens of the same user"""
+    user_id = uuid.uuid4()
+    revoked = decode_token(create_access_token(user_id, "a@example.com"))
+    other = decode_token(create_access_token(user_id, "a@example.com"))
+
+    assert await revocation.revoke_token(revoked)
+
+    assert revocation.is_revoked(revoked)
+    assert not revocation.is_revoked(other)
+
+
+@pytest.mark.asyncio
+async def test_logout_all_cuts_off_earlier_tokens():
+    """Tokens issued before logout-all are revoked, later logins work"""
+    user_id = uuid.uuid4()
+    before = [
+        decode_token(create_access_token(user_id, "a@example.com")),
+        decode_token(create_refresh_token(user_id)),
+    ]
+    bystander = decode_token(create_refresh_token(uuid.uuid4()))
+
+    await revocation.revoke_all_sessions(user_id)
+    time.sleep(0.002)
+    after = decode_token(create_access_token(user_id, "a@example.com"))
+
+    assert all(revocation.is_revoked(payload) for payload in before)
+    assert not revocation.is_revoked(after)
+    assert not revocation.is_revoked(bystander)
+
+
+@pytest.mark.asyncio
+async def test_revocation_is_published(mocker):
+    """Revocations go to redis with the token's exp and are broadcast to other workers"""
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    redis = MagicMock()
+    redis.pipeline.return_value.__aenter__ = AsyncMock(return_value=pipe)
+    redis.pipeline.return_value.__aexit__ = AsyncMock(return_value=False)
+    payload = decode_token(create_refresh_token(uuid.uuid4()))
+
+    await revocation.revoke_token(payload, redis=redis)
+
+    pipe.zadd.assert_called_once_with(revocation.REVOKED_KEY, {payload["jti"]: payload["exp"]})
+    channel, message = pipe.publish.call_args.args
+    assert channel == revocation.CHANNEL
+    assert json.loads(message) == {"jti": payload["jti"], "exp": payload["exp"]}
+
+
+def test_messages_from_other_workers_apply_locally():
+    """A pub/sub message is enough for this worker to reject the token"""
+    payload = decode_token(create_access_token(uuid.uuid4(), "a@example.com"))
+
+    revocation.apply_message(json.dumps({"jti": payload["jti"], "exp": payload["exp"]}))
+    revocation.apply_message("not json")
+
+    assert revocation.is_revoked(payload)
+
+
+def test_snapshot_reload_drops_expired_tokens():
+    """Rebuilding the list forgets ids that are no longer in redis"""
+    payload = decode_token(create_access_token(uuid.uuid4(), "a@example.com"))
+    revocation.revocations.add_token(payload["jti"], payload["exp"])
+
+    revocation.revocations.replace({}, {})
+
+    assert not revocation.is_revoked(payload)
+
+
+@pytest.mark.asyncio
+async def test_current_user_rejects_revoked_access_token():
+    """get_current_user answers 401 without loading the user"""
+    token = create_access_token(uuid.uuid4(), "a@example.com")
+    await revocation.revoke_token(decode_token(token))
+    db = AsyncMock()
+
+    with pytest.raises(HTTPException) as ex:
+        await dependencies.get_current_user(MagicMock(cookies={"access_token": token}), db)
+
+    assert ex.value.status_code == 401
+    db.execute.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_logout_revokes_both_cookies():
+    """Logout revokes the session's access and refresh token and clears the cookies"""
+    user_id = uuid.uuid4()
+    cookies = {
+        "access_token": create_access_token(user_id, "a@example.com"),
+        "refresh_token": create_refresh_token(user_id),
+    }
+    response = MagicMock()
+
+    revoked = await services.logout(MagicMock(cookies=cookies), response)
+
+    assert revoked == 2
+    assert all(revocation.is_revoked(decode_token(t)) for t in cookies.values())
+    assert response.delete_cookie.call_count == 2
@@ -0,0 +1,118 @@
+"""
+Unit tests for refresh-token rotation, reuse detection and session limits.
+"""
+
+import asyncio
+import pytest
+import uuid
+from unittest.mock import AsyncMock, MagicMock
+from fastapi import HTTPException
+
+from app.auth import revocation, services, sessions
+from app.config.jwt import decode_token
+
+
+@pytest.fixture(autouse=True)
+def memory_store(mocker):
+    """In-process session store and denylist, no redis"""
+    store = sessions.MemorySessionStore()
+    mocker.patch("app.auth.services.get_session_store", return_value=store)
+    mocker.patch("app.auth.sessions.get_session_store", return_value=store)
+    mocker.patch("app.auth.revocation.get_redis", return_value=None)
+    mocker.patch.object(revocation, "revocations", revocation.RevocationList(1000, 0.001))
+    return store
+
+
+async def refresh(tokens, db=None):
+    request = MagicMock(cookies={"refresh_token": tokens["refresh_token"]})
+    response = MagicMock()
+    await services.refresh_access_token(request, response, db or AsyncMock())
+    cookies = {c.args[0]: c.kwargs["value"] for c in response.set_cookie.call_args_list}
+    return cookies
+
+
+@pytest.mark.asyncio
+async def test_refresh_rotates_without_database():
+    """Each refresh hands out a new pair in the same session, with no query"""
+    user_id = uuid.uuid4()
+    first = await services.issue_tokens(user_id, "a@example.com")
+    db = AsyncMock()
+
+    second = await refresh(first, db)
+
+    db.execute.assert_not_called()
+    old, new = decode_token(first["refresh_token"]), decode_token(second["refresh_token"])
+    assert new["sid"] == old["sid"]
+    assert new["jti"] != old["jti"]
+    assert decode_token(second["access_token"])["email"] == "a@example.com"
+
+
+@pytest.mark.asyncio
+async def test_reused_refresh_token_revokes_the_family():
+    """Replaying a rotated refresh token kills the session for both holders"""
+    first = await services.issue_tokens(uuid.uuid4(), "a@example.com")
+    second = await refresh(first)
+
+    with pytest.raises(HTTPException) as ex:
+        await refresh(first)
+    assert ex.value.status_code == 401
+
+    # the legitimate client's newer tokens are dead too
+    assert revocation.is_revoked(decode_token(second["access_token"]))
+    with pytest.raises(HTTPException):
+        await refresh(second)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_refresh_has_one_winner():
+    """Two refreshes racing on the same token can't both succeed"""
+    first = await services.issue_tokens(uuid.uuid4(), "a@example.com")
+
+    results = await asyncio.gather(refresh(first), refresh(first), return_exceptions=True)
+
+    assert sum(not isinstance(r, Exception) for r in results) == 1
+
+
+@pytest.mark.asyncio
+async def test_oldest_sessions_are_evicted(mocker, memory_store):
+    """Logging in past the per-user cap drops the least recently refreshed session"""
+    mocker.patch.object(services.settings, "SESSION_MAX_PER_USER", 2)
+    user_id = uuid.uuid4()
+    oldest = await services.issue_tokens(user_id, "a@example.com")
+    middle = await services.issue_tokens(user_id, "a@example.com")
+    await refresh(oldest)
+    await services.issue_tokens(user_id, "a@example.com")
+
+    with pytest.raises(HTTPException):
+        await refresh(middle)
+    assert revocation.is_revoked(decode_token(middle["access_token"]))
+
+
+@pytest.mark.asyncio
+async def test_logout_all_ends_every_session():
+    """Sessions are closed so their refresh tokens fail even after the cutoff lapses"""
+    user_id = uuid.uuid4()
+    a = await services.issue_tokens(user_id, "a@example.com")
+    b = await services.issue_tokens(user_id, "a@example.com")
+
+    await services.logout_all(user_id, MagicMock())
+    revocation.revocations.replace({}, {})
+
+    for tokens in (a, b):
+        with pytest.raises(HTTPException):
+            await refresh(tokens)
+
+
+@pytest.mark.asyncio
+async def test_tokens_without_session_open_one(mocker):
+    """Refresh tokens minted before session families get one after a user check"""
+    from app.config.jwt import create_refresh_token
+
+    user = MagicMock(id=uuid.uuid4(), email="a@example.com")
+    repo = MagicMock(get_user_by_id=AsyncMock(return_value=user))
+    mocker.patch("app.auth.services.UserRepo", return_value=repo)
+
+    tokens = await refresh({"refresh_token": create_refresh_token(user.id)})
+
+    repo.get_user_by_id.assert_awaited_once_with(user.id)
+    assert decode_token(tokens["refresh_token"])["sid"]
@@ -0,0 +1,113 @@
+"""
+Unit tests for soft deletes: the deleted_at stamp, the live-user filters and the batched purge.
+"""
+
+import pytest
+import uuid
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.core import UserRole, UserStatus
+from app.tasks.cleanup import purge_batch, purge_deleted_users, purge_deleted_users_async
+from app.users.models import User
+from app.users.repository import UserRepo
+from app.users.services import AdminService
+
+
+def compiled(stmt) -> str:
+    return str(stmt.compile(dialect=asyncpg.dialect()))
+
+
+def mock_session_factory(mocker, rowcounts):
+    results = [MagicMock(rowcount=n) for n in rowcounts]
+    session = AsyncMock()
+    session.execute = AsyncMock(side_effect=results)
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=None)
+    mocker.patch("app.tasks.cleanup.AsyncSessionLocal", return_value=session)
+    return session
+
+
+@pytest.mark.asyncio
+async def test_admin_delete_stamps_the_row(mocker):
+    """No DELETE inline: the user gets deleted_at, an event, and loses its sessions"""
+    end_sessions = mocker.patch("app.users.services.end_all_sessions", AsyncMock())
+    user = User(id=uuid.uuid4(), email="a@example.com", status=UserStatus.VERIFIED, role=UserRole.USER)
+    db = MagicMock(commit=AsyncMock(), delete=AsyncMock(), refresh=AsyncMock())
+    service = AdminService(db)
+    service.repo.get_user_by_id = AsyncMock(return_value=user)
+
+    await service.delete_user(user.id)
+
+    db.refresh.assert_awaited_once_with(user, with_for_update=True)
+    assert user.deleted_at is not None
+    db.delete.assert_not_awaited()
+    db.commit.assert_awaited_once()
+    end_sessions.assert_awaited_once_with(user.id)
+
+
+@pytest.mark.asyncio
+async def test_deleted_users_are_filtered_out():
+    """Lookups by email and id, listing and batches only see live users"""
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock())
+    repo = UserRepo(db)
+
+    await repo.get_user_by_email("a@example.com")
+    await repo.get_users_by_ids([uuid.uuid4()])
+    await repo.fetch_all_users(limit=10)
+
+    assert db.execute.await_count == 3
+    for call in db.execute.await_args_list:
+        assert "users.deleted_at IS NULL" in compiled(call.args[0])
+
+
+@pytest.mark.asyncio
+async def test_deleted_user_in_identity_map_is_not_returned():
+    """A user deleted earlier in the same session reads as missing"""
+    user = User(id=uuid.uuid4(), email="a@example.com", deleted_at=datetime.now(timezone.utc))
+    db = MagicMock()
+    db.identity_map.get.return_value = user
+
+    assert await UserRepo(db).get_user_by_id(user.id) is None
+
+
+def test_purge_batch_skips_locked_rows():
+    """A batch takes the oldest deleted rows and never waits on another purge"""
+    sql = compiled(purge_batch(100))
+
+    assert sql.startswith("DELETE FROM users WHERE users.id IN (SELECT users.id")
+    assert "users.deleted_at IS NOT NULL ORDER BY users.deleted_at" in sql
+    assert "FOR UPDATE SKIP LOCKED" in sql
+
+
+@pytest.mark.asyncio
+async def test_purge_runs_batches_until_a_short_one(mocker):
+    """Full batches continue, the first short batch ends the run"""
+    session = mock_session_factory(mocker, [3, 3, 1, 3])
+
+    result = await purge_deleted_users_async(batch_size=3, max_batches=10, pause=0)
+
+    assert result["purged_count"] == 7
+    assert result["batches"] == 3
+    assert result["rows_per_second"] > 0
+    assert session.commit.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_purge_stops_at_max_batches(mocker):
+    """A long backlog is left for the next run"""
+    mock_session_factory(mocker, [2] * 10)
+
+    result = await purge_deleted_users_async(batch_size=2, max_batches=4, pause=0)
+
+    assert result["purged_count"] == 8
+    assert result["batches"] == 4
+
+
+def test_purge_task_reports_errors(mocker):
+    """Celery wrapper returns the error instead of raising"""
+    mocker.patch("app.tasks.cleanup.asyncio.run", side_effect=Exception("db down"))
+
+    assert purge_deleted_users() == {"status": "error", "message": "db down"}
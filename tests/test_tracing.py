@@ -0,0 +1,200 @@
+"""
+Unit tests for request tracing: W3C trace context, sampling and child spans.
+"""
+
+import json
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.core import tracing
+from app.core.tracing import (
+    TracingMiddleware,
+    JsonlSpanExporter,
+    configure_tracing,
+    instrument_engine,
+    parse_traceparent,
+    start_span,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+@pytest.fixture
+def exporter():
+    exporter = ListExporter()
+    configure_tracing(sample_rate=0.0, exporter=exporter)
+    yield exporter
+    configure_tracing(sample_rate=0.0, exporter=None)
+
+
+def make_app(engine=None):
+    async def app(scope, receive, send):
+        with start_span("password.hash"):
+            pass
+        if engine is not None:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    return app
+
+
+async def call(app, headers=(), client=("203.0.113.7", 40000)):
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/auth/signup",
+        "headers": list(headers),
+        "client": client,
+    }
+    response = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["headers"] = dict(message["headers"])
+
+    await app(scope, receive, send)
+    return response
+
+
+def test_parse_traceparent():
+    """Valid headers parse, malformed and all-zero ids are rejected"""
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00")[2] is False
+    assert parse_traceparent("garbage") is None
+    assert parse_traceparent(f"00-{'0' * 32}-{PARENT_ID}-01") is None
+
+
+def test_span_outside_trace_is_noop(exporter):
+    """Instrumented code outside a sampled request exports nothing"""
+    with start_span("jwt.encode") as span:
+        assert span is None
+
+    assert exporter.spans == []
+
+
+@pytest.mark.asyncio
+async def test_unsampled_request_has_no_spans(exporter):
+    """With sampling at 0 and no incoming context nothing is recorded"""
+    response = await call(TracingMiddleware(make_app()))
+
+    assert exporter.spans == []
+    assert b"traceparent" not in response["headers"]
+
+
+@pytest.mark.asyncio
+async def test_incoming_trace_context_is_continued(exporter):
+    """A trusted upstream's sampled traceparent is continued and returned with the new span id"""
+    configure_tracing(sample_rate=0.0, exporter=exporter, trusted_upstreams=["10.0.0.0/8"])
+    app = TracingMiddleware(make_app())
+
+    response = await call(
+        app, [(b"traceparent", f"00-{TRACE_ID}-{PARENT_ID}-01".encode())], client=("10.1.2.3", 40000)
+    )
+
+    child, root = exporter.spans
+    assert root.trace_id == child.trace_id == TRACE_ID
+    assert root.parent_id == PARENT_ID
+    assert child.parent_id == root.span_id
+    assert child.name == "password.hash"
+    assert response["headers"][b"traceparent"] == root.traceparent.encode()
+
+
+@pytest.mark.asyncio
+async def test_sampled_out_parent_is_respected(exporter):
+    """A trusted upstream's not-sampled flag wins over the local sample rate"""
+    configure_tracing(sample_rate=1.0, exporter=exporter, trusted_upstreams=["10.1.2.3"])
+
+    await call(
+        TracingMiddleware(make_app()),
+        [(b"traceparent", f"00-{TRACE_ID}-{PARENT_ID}-00".encode())],
+        client=("10.1.2.3", 40000),
+    )
+
+    assert exporter.spans == []
+
+
+@pytest.mark.asyncio
+async def test_untrusted_sampled_flag_goes_through_the_sample_rate(exporter):
+    """Any client can send a sampled traceparent, it doesn't get them traced"""
+    configure_tracing(sample_rate=0.0, exporter=exporter, trusted_upstreams=["10.0.0.0/8"])
+    header = [(b"traceparent", f"00-{TRACE_ID}-{PARENT_ID}-01".encode())]
+
+    response = await call(TracingMiddleware(make_app()), header)
+
+    assert exporter.spans == []
+    assert b"traceparent" not in response["headers"]
+
+    # sampled locally, the trace id is still continued
+    configure_tracing(sample_rate=1.0, exporter=exporter)
+    await call(TracingMiddleware(make_app()), header)
+
+    assert {span.trace_id for span in exporter.spans} == {TRACE_ID}
+
+
+@pytest.mark.asyncio
+async def test_no_spans_without_an_exporter():
+    """Tracing switched off builds nothing, whatever the caller asks for"""
+    configure_tracing(sample_rate=1.0, exporter=None, trusted_upstreams=["10.1.2.3"])
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(tracing.current_span())
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    try:
+        response = await call(
+            TracingMiddleware(app),
+            [(b"traceparent", f"00-{TRACE_ID}-{PARENT_ID}-01".encode())],
+            client=("10.1.2.3", 40000),
+        )
+    finally:
+        configure_tracing(sample_rate=0.0, exporter=None)
+
+    assert seen == [None]
+    assert b"traceparent" not in response["headers"]
+
+
+@pytest.mark.asyncio
+async def test_sql_statements_become_child_spans(exporter):
+    """Engine events add a db.query span per statement"""
+    configure_tracing(sample_rate=1.0, exporter=exporter)
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+
+    await call(TracingMiddleware(make_app(engine)))
+
+    names = [s.name for s in exporter.spans]
+    assert "db.query" in names
+    db_span = next(s for s in exporter.spans if s.name == "db.query")
+    root = exporter.spans[-1]
+    assert db_span.parent_id == root.span_id
+    assert db_span.attributes["db.statement"] == "SELECT 1"
+
+
+def test_jsonl_exporter_writes_otlp_shaped_lines(tmp_path):
+    """Spans end up as one JSON object per line"""
+    path = tmp_path / "spans.jsonl"
+    exporter = JsonlSpanExporter(str(path))
+
+    span = tracing.Span(trace_id=TRACE_ID, span_id=PARENT_ID, name="x")
+    span.end()
+    exporter.export(span)
+    exporter.shutdown()
+
+    record = json.loads(path.read_text().splitlines()[0])
+    assert record["traceId"] == TRACE_ID
+    assert record["status"] == {"code": "OK"}
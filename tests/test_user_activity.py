@@ -0,0 +1,87 @@
+"""
+Unit tests for write-behind last-login / last-seen tracking.
+"""
+
+import pytest
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.users.activity import ActivityTracker
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def session_factory(execute=None):
+    session = AsyncMock()
+    session.execute = execute or AsyncMock()
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=None)
+    return MagicMock(return_value=session), session
+
+
+def test_repeated_activity_buffers_one_row_per_user():
+    """Every request of a user between flushes collapses into its latest timestamps"""
+    tracker = ActivityTracker(max_pending=100)
+    a, b = sorted([uuid.uuid4(), uuid.uuid4()])
+
+    tracker.logged_in(a, T0)
+    for i in range(50):
+        tracker.seen(a, T0 + timedelta(seconds=i))
+        tracker.seen(b, T0 + timedelta(seconds=i))
+
+    assert tracker.drain() == [
+        (a, T0 + timedelta(seconds=49), T0),
+        (b, T0 + timedelta(seconds=49), None),
+    ]
+    assert len(tracker) == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_chunks_as_batched_updates():
+    """One UPDATE ... FROM (VALUES ...) per chunk instead of one per request"""
+    tracker = ActivityTracker(max_pending=100, chunk_size=2)
+    for _ in range(5):
+        tracker.seen(uuid.uuid4(), T0)
+    factory, session = session_factory()
+
+    assert await tracker.flush(factory) == 5
+
+    assert session.execute.await_count == 3
+    sql = str(session.execute.await_args_list[0].args[0].compile(dialect=asyncpg.dialect()))
+    assert "FROM (VALUES" in sql
+    assert "greatest(users.last_seen_at, activity.seen)" in sql
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_newest_timestamps_for_next_interval():
+    """A failed write goes back into the buffer without overwriting newer activity"""
+    tracker = ActivityTracker(max_pending=100)
+    user = uuid.uuid4()
+    tracker.logged_in(user, T0)
+
+    async def record_meanwhile(*args, **kwargs):
+        tracker.seen(user, T0 + timedelta(minutes=1))
+        raise Exception("db down")
+
+    factory, _ = session_factory(AsyncMock(side_effect=record_meanwhile))
+
+    assert await tracker.flush(factory) == 0
+    assert tracker.drain() == [(user, T0 + timedelta(minutes=1), T0)]
+
+
+def test_full_buffer_requests_early_flush_and_drops_on_restore():
+    """At the cap the flusher is woken, and failed rows beyond it are dropped"""
+    tracker = ActivityTracker(max_pending=2)
+    a, b, c = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+    tracker.seen(a, T0)
+    assert not tracker._full.is_set()
+    tracker.seen(b, T0)
+    assert tracker._full.is_set()
+
+    rows = tracker.drain()
+    tracker.seen(c, T0)
+    tracker.restore(rows)
+    assert len(tracker) == 2
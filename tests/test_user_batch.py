@@ -0,0 +1,136 @@
+"""
+Unit tests for batched user lookups: the DataLoader and the coalesced get_user_by_id.
+"""
+
+import asyncio
+import pytest
+import uuid
+from unittest.mock import AsyncMock, MagicMock
+
+from app.core.dataloader import DataLoader
+from app.users.models import User
+from app.users.repository import UserRepo
+from app.users.services import UserService
+
+
+def request_session():
+    """A clean request session, merge hands back the batched object"""
+    session = MagicMock(identity_map={}, new=[], dirty=[], deleted=[])
+    session.merge = AsyncMock(side_effect=lambda obj, load=True: obj)
+    session.execute = AsyncMock()
+    return session
+
+
+def patch_loader_session(mocker, users):
+    session = MagicMock()
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = users
+    session.execute = AsyncMock(return_value=result)
+
+    factory = mocker.patch("app.users.repository.AsyncSessionLocal")
+    factory.return_value.__aenter__ = AsyncMock(return_value=session)
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+    # no shared cache tier, every miss reaches the loader
+    mocker.patch("app.users.cache.get_redis", return_value=None)
+    return session
+
+
+@pytest.mark.asyncio
+async def test_loader_dedupes_keys_into_one_batch():
+    """Concurrent loads of overlapping keys make one batch call with unique keys"""
+    batch_fn = AsyncMock(side_effect=lambda keys: {k: k * 10 for k in keys if k != 3})
+    loader = DataLoader(batch_fn)
+
+    results = await asyncio.gather(*(loader.load(k) for k in [1, 2, 1, 3, 2]))
+
+    assert results == [10, 20, 10, None, 20]
+    batch_fn.assert_awaited_once_with([1, 2, 3])
+
+
+@pytest.mark.asyncio
+async def test_loader_dispatches_full_batches_immediately():
+    """max_batch splits a burst into bounded batches without waiting for the window"""
+    batch_fn = AsyncMock(side_effect=lambda keys: {k: k for k in keys})
+    loader = DataLoader(batch_fn, window=60, max_batch=2)
+
+    assert await asyncio.wait_for(loader.load_many([1, 2, 3, 4]), 1) == [1, 2, 3, 4]
+    assert [c.args[0] for c in batch_fn.await_args_list] == [[1, 2], [3, 4]]
+
+
+@pytest.mark.asyncio
+async def test_loader_propagates_batch_errors_to_every_caller():
+    """A failed batch fails each waiting load, and the next batch starts fresh"""
+    batch_fn = AsyncMock(side_effect=[RuntimeError("db down"), {1: "ok"}])
+    loader = DataLoader(batch_fn)
+
+    results = await asyncio.gather(loader.load(1), loader.load(2), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert await loader.load(1) == "ok"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_batch_cancels_its_waiters():
+    """A batch cancelled mid-flight doesn't leave its callers waiting forever"""
+    started = asyncio.Event()
+
+    async def batch_fn(keys):
+        started.set()
+        await asyncio.Event().wait()
+
+    loader = DataLoader(batch_fn)
+    waiters = [asyncio.ensure_future(loader.load(k)) for k in (1, 2)]
+    await started.wait()
+
+    for task in list(loader._tasks):
+        task.cancel()
+    results = await asyncio.wait_for(asyncio.gather(*waiters, return_exceptions=True), 1)
+
+    assert all(isinstance(r, asyncio.CancelledError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_collapse_into_one_query(mocker):
+    """Lookups from 20 concurrent requests, as get_current_user does them, run one query"""
+    users = [User(id=uuid.uuid4(), email=f"u{i}@example.com") for i in range(5)]
+    loader_session = patch_loader_session(mocker, users)
+    missing = uuid.uuid4()
+    ids = [u.id for u in users] * 3 + [missing] * 5
+    sessions = [request_session() for _ in ids]
+
+    results = await asyncio.gather(
+        *(UserRepo(s).get_user_by_id(i) for s, i in zip(sessions, ids))
+    )
+
+    loader_session.execute.assert_awaited_once()
+    assert all(not s.execute.await_count for s in sessions)
+    assert [r.id if r else None for r in results] == [u.id for u in users] * 3 + [None] * 5
+    # each request gets the row attached to its own session
+    assert sessions[0].merge.await_args.kwargs == {"load": False}
+
+
+@pytest.mark.asyncio
+async def test_session_with_pending_changes_reads_its_own_writes(mocker):
+    """Unflushed changes bypass the shared batch and query through the request session"""
+    loader_session = patch_loader_session(mocker, [])
+    session = request_session()
+    session.dirty = [object()]
+
+    await UserRepo(session).get_user_by_id(uuid.uuid4())
+
+    session.execute.assert_awaited_once()
+    loader_session.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_batch_endpoint_service_keeps_request_order():
+    """Found users follow the requested order, unknown ids are reported once"""
+    a, b = (User(id=uuid.uuid4(), email=f"{n}@example.com") for n in "ab")
+    unknown = uuid.uuid4()
+    service = UserService(MagicMock())
+    service.repo.get_users_by_ids = AsyncMock(return_value=[a, b])
+
+    users, missing = await service.get_users_by_ids([b.id, unknown, a.id, b.id])
+
+    assert users == [b, a]
+    assert missing == [unknown]
+    service.repo.get_users_by_ids.assert_awaited_once_with([b.id, unknown, a.id])
@@ -0,0 +1,183 @@
+"""
+Unit tests for the two-tier user cache: L1/L2 hits, coalesced misses, versioned fills and invalidation.
+"""
+
+import asyncio
+import json
+import pytest
+import uuid
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+from app.core import UserRole, UserStatus
+from app.users.cache import CHANNEL, SECRET_COLUMNS, UserCache, build, dumps, loads, snapshot
+from app.users.models import User
+
+
+def make_snapshot(email="a@example.com"):
+    return snapshot(
+        User(
+            id=uuid.uuid4(),
+            email=email,
+            status=UserStatus.VERIFIED,
+            role=UserRole.USER,
+            created_at=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        )
+    )
+
+
+def make_redis(mocker, mget=(None, None), pointer=None):
+    redis = AsyncMock()
+    redis.mget = AsyncMock(return_value=list(mget))
+    redis.get = AsyncMock(return_value=pointer)
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    redis.pipeline = MagicMock(return_value=MagicMock(
+        __aenter__=AsyncMock(return_value=pipe), __aexit__=AsyncMock(return_value=None)
+    ))
+    mocker.patch("app.users.cache.get_redis", return_value=redis)
+    return redis, pipe
+
+
+def test_snapshot_round_trips_through_json():
+    """Enums, UUIDs and datetimes come back typed, and build gives a detached User"""
+    snap = make_snapshot()
+
+    restored = loads(dumps(snap))
+    user = build(restored)
+
+    assert restored == snap
+    assert restored["status"] is UserStatus.VERIFIED
+    assert user.id == snap["id"]
+    assert user.created_at.tzinfo is not None
+
+
+def test_credentials_are_never_cached():
+    """The digest and the verification code stay out of both tiers"""
+    user = User(
+        id=uuid.uuid4(),
+        email="a@example.com",
+        password="$2b$12$digest",
+        verification_code="123456",
+        verification_code_expires=datetime(2026, 1, 1),
+        status=UserStatus.PENDING,
+        role=UserRole.USER,
+    )
+
+    snap = snapshot(user)
+
+    assert not SECRET_COLUMNS & snap.keys()
+    assert "digest" not in dumps(snap) and "123456" not in dumps(snap)
+
+
+@pytest.mark.asyncio
+async def test_second_lookup_is_an_l1_hit(mocker):
+    """Only the first lookup loads, later ones by id or email are hits"""
+    make_redis(mocker)
+    cache = UserCache(maxsize=10, l1_ttl=60, l2_ttl=300)
+    snap = make_snapshot()
+    load = AsyncMock(return_value=snap)
+
+    assert await cache.get_by_id(snap["id"], load) == snap
+    assert await cache.get_by_id(snap["id"], load) == snap
+    assert await cache.get_by_email(snap["email"], load) == snap
+
+    load.assert_awaited_once()
+    assert cache.stats()["hit_ratio"] == round(2 / 3, 4)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_load_once(mocker):
+    """A cold key requested by many requests at once reaches the database once"""
+    mocker.patch("app.users.cache.get_redis", return_value=None)
+    cache = UserCache(maxsize=10, l1_ttl=60, l2_ttl=300)
+    snap = make_snapshot()
+
+    async def slow_load():
+        await asyncio.sleep(0.01)
+        return snap
+
+    load = AsyncMock(side_effect=slow_load)
+    results = await asyncio.gather(*(cache.get_by_id(snap["id"], load) for _ in range(20)))
+
+    assert results == [snap] * 20
+    load.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_l2_hit_skips_the_database(mocker):
+    """A snapshot another worker stored serves the lookup and fills L1"""
+    snap = make_snapshot()
+    make_redis(mocker, mget=(dumps(snap), "2"))
+    cache = UserCache(maxsize=10, l1_ttl=60, l2_ttl=300)
+    load = AsyncMock()
+
+    assert await cache.get_by_id(snap["id"], load) == snap
+
+    load.assert_not_awaited()
+    assert cache.l1.get(snap["id"]) == snap
+    assert cache.stats()["l2_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fill_is_conditional_on_the_version_read_before_loading(mocker):
+    """The L2 fill carries the version seen before the query, so a write in between wins"""
+    redis, _ = make_redis(mocker, mget=(None, "7"))
+    cache = UserCache(maxsize=10, l1_ttl=60, l2_ttl=300)
+    snap = make_snapshot()
+
+    await cache.get_by_id(snap["id"], AsyncMock(return_value=snap))
+
+    args = redis.eval.await_args.args
+    assert args[2:5] == (
+        f"users:cache:{snap['id']}",
+        f"users:cache:{snap['id']}:version",
+        "users:cache:email:a@example.com",
+    )
+    assert args[5] == "7"
+
+
+@pytest.mark.asyncio
+async def test_stale_email_pointer_reads_as_a_miss(mocker):
+    """An email key left pointing at a user whose email changed falls through to the database"""
+    old = make_snapshot(email="old@example.com")
+    redis, _ = make_redis(mocker, mget=(dumps(old), "1"), pointer=str(old["id"]))
+    cache = UserCache(maxsize=10, l1_ttl=60, l2_ttl=300)
+    current = make_snapshot(email="a@example.com")
+
+    assert await cache.get_by_email("a@example.com", AsyncMock(return_value=current)) == current
+    # the version read belongs to the other id, only fill if this one was never invalidated
+    assert redis.eval.await_args.args[5] == "0"
+
+
+@pytest.mark.asyncio
+async def test_invalidation_during_a_load_keeps_l1_empty(mocker):
+    """A row read before a concurrent write never lands in L1"""
+    mocker.patch("app.users.cache.get_redis", return_value=None)
+    cache = UserCache(maxsize=10, l1_ttl=60, l2_ttl=300)
+    snap = make_snapshot()
+
+    async def load():
+        cache.apply_message(json.dumps([str(snap["id"])]))
+        return snap
+
+    await cache.get_by_id(snap["id"], load)
+
+    assert cache.l1.get(snap["id"]) is None
+
+
+@pytest.mark.asyncio
+async def test_invalidate_drops_both_tiers_and_notifies_workers(mocker):
+    """Local entry dropped, L2 key deleted, version bumped, ids published"""
+    redis, pipe = make_redis(mocker)
+    cache = UserCache(maxsize=10, l1_ttl=60, l2_ttl=300)
+    snap = make_snapshot()
+    cache.l1.set(snap["id"], snap)
+
+    await cache.invalidate([snap["id"]])
+
+    assert cache.l1.get(snap["id"]) is None
+    pipe.delete.assert_called_once_with(f"users:cache:{snap['id']}")
+    pipe.incr.assert_called_once_with(f"users:cache:{snap['id']}:version")
+    pipe.publish.assert_called_once_with(CHANNEL, json.dumps([str(snap["id"])]))
+    pipe.execute.assert_awaited_once()
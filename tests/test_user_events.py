@@ -0,0 +1,211 @@
+"""
+Unit tests for the user change feed: outbox writes, the relay task and stream offsets.
+"""
+
+import asyncio
+import json
+import pytest
+import uuid
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.core import UserRole, UserStatus, UserEventType
+from app.core.lifecycle import Lifecycle
+from app.tasks.cleanup import delete_with_events
+from app.tasks.events import relay_user_events_async
+from app.users import events
+from app.users.models import User, UserEvent
+from app.users.repository import UserRepo
+from app.users.services import AdminService
+
+
+def added_events(db):
+    return [c.args[0] for c in db.add.call_args_list if isinstance(c.args[0], UserEvent)]
+
+
+def make_user(**fields):
+    user = User(id=uuid.uuid4(), email="a@example.com", name="Ann", surname="Lee")
+    user.status, user.role = UserStatus.VERIFIED, UserRole.USER
+    for key, value in fields.items():
+        setattr(user, key, value)
+    return user
+
+
+@pytest.mark.asyncio
+async def test_signup_writes_created_event_in_same_transaction(mocker):
+    """The event is added before the single commit that creates the user"""
+    mocker.patch.object(User, "set_password")
+    db = MagicMock(flush=AsyncMock(), commit=AsyncMock(), refresh=AsyncMock())
+
+    user = await UserRepo(db).create_user("a@example.com", "pw")
+
+    (event,) = added_events(db)
+    assert event.type == UserEventType.CREATED
+    assert event.payload["email"] == "a@example.com"
+    assert event.user_id == user.id
+    db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_admin_update_splits_role_changes():
+    """Role changes get their own event type, no-op updates publish nothing"""
+    user = make_user()
+    db = MagicMock(commit=AsyncMock(), refresh=AsyncMock())
+    service = AdminService(db)
+    service.repo.get_user_by_id = AsyncMock(return_value=user)
+
+    await service.update_user(user.id, {"role": UserRole.ADMIN, "name": "Anna"})
+    types = [e.type for e in added_events(db)]
+    assert types == [UserEventType.ROLE_CHANGED, UserEventType.UPDATED]
+    assert added_events(db)[1].payload["changed"] == ["role", "name"]
+
+    db.add.reset_mock()
+    await service.update_user(user.id, {"name": "Anna"})
+    assert added_events(db) == []
+
+
+@pytest.mark.asyncio
+async def test_admin_update_locks_the_row_before_its_event():
+    """The event id is drawn under the row lock, so one user's events are in commit order"""
+    user = make_user()
+    db = MagicMock(commit=AsyncMock(), refresh=AsyncMock())
+    service = AdminService(db)
+    service.repo.get_user_by_id = AsyncMock(return_value=user)
+
+    await service.update_user(user.id, {"name": "Anna"})
+
+    calls = [name for name, *_ in db.mock_calls if name in ("refresh", "add")]
+    assert calls[:2] == ["refresh", "add"]
+    assert db.refresh.await_args_list[0].kwargs == {"with_for_update": True}
+
+
+def test_cleanup_deletes_and_records_in_one_statement():
+    """Bulk deletes feed their ids straight into the outbox insert"""
+    stmt = delete_with_events(User.status == UserStatus.PENDING, reason="unverified")
+    sql = str(stmt.compile(dialect=asyncpg.dialect()))
+
+    assert sql.startswith("WITH deleted AS \n(UPDATE users SET deleted_at=now()")
+    assert "RETURNING users.id" in sql
+    assert "INSERT INTO user_events (user_id, type, payload) SELECT deleted.id" in sql
+
+
+@pytest.mark.asyncio
+async def test_relay_publishes_in_order_and_marks_published(mocker):
+    """One batch: XADD in id order, then flag the rows in the same transaction"""
+    batch = [
+        UserEvent(id=i, user_id=uuid.uuid4(), type="created", payload={},
+                  created_at=datetime.now(timezone.utc))
+        for i in (7, 8)
+    ]
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = batch
+    session = AsyncMock()
+    session.scalar = AsyncMock(return_value=True)
+    session.execute = AsyncMock(side_effect=[result, MagicMock()])
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=None)
+    mocker.patch("app.tasks.events.AsyncSessionLocal", return_value=session)
+    redis = AsyncMock()
+    redis.__aenter__ = AsyncMock(return_value=redis)
+    redis.__aexit__ = AsyncMock(return_value=None)
+    mocker.patch("app.tasks.events.redis_client", return_value=redis)
+    publish = mocker.patch("app.tasks.events.events.publish", AsyncMock())
+
+    result = await relay_user_events_async(batch_size=10)
+
+    assert result == {"published": 2}
+    publish.assert_awaited_once_with(redis, batch)
+    assert session.execute.call_count == 2
+    session.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_relay_backs_off_when_another_relay_holds_the_lock(mocker):
+    """Concurrent relays would interleave the stream, the second one skips"""
+    session = AsyncMock()
+    session.scalar = AsyncMock(return_value=False)
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=None)
+    mocker.patch("app.tasks.events.AsyncSessionLocal", return_value=session)
+    redis = AsyncMock()
+    redis.__aenter__ = AsyncMock(return_value=redis)
+    redis.__aexit__ = AsyncMock(return_value=None)
+    mocker.patch("app.tasks.events.redis_client", return_value=redis)
+
+    result = await relay_user_events_async()
+
+    assert result["published"] == 0
+    session.execute.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_offsets_older_than_the_stream_trigger_reset():
+    """Resuming before the oldest retained entry tells the consumer to rescan"""
+    redis = AsyncMock()
+    redis.xrange = AsyncMock(return_value=[("1700000000500-0", {})])
+
+    assert await events.resolve_start(redis, "1700000000100-3") == ("1700000000100-3", True)
+    assert await events.resolve_start(redis, "1700000000600-0") == ("1700000000600-0", False)
+
+    redis.xrevrange = AsyncMock(return_value=[("1700000000900-1", {})])
+    assert await events.resolve_start(redis, None) == ("1700000000900-1", False)
+
+
+def test_sse_message_carries_stream_id():
+    """The SSE id is the stream id, so Last-Event-ID resumes exactly there"""
+    message = events.sse_message(
+        "1700000000900-1",
+        {"event_id": "42", "type": "verified", "user_id": "u1",
+         "payload": json.dumps({"email": "a@example.com"}), "created_at": "2026-10-19T10:00:00"},
+    )
+
+    lines = message.rstrip("\n").split("\n")
+    assert lines[0] == "id: 1700000000900-1"
+    assert lines[1] == "event: verified"
+    assert json.loads(lines[2][len("data: "):])["user"] == {"email": "a@example.com"}
+
+
+def stream_redis(xread):
+    redis = AsyncMock()
+    redis.xrevrange = AsyncMock(return_value=[])
+    redis.xread = xread
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_stream_ends_when_draining_starts_mid_read(mocker):
+    """A blocked XREAD doesn't keep the stream, and with it shutdown, waiting"""
+    blocked = asyncio.Event()
+
+    async def xread(*args, **kwargs):
+        blocked.set()
+        await asyncio.Event().wait()
+
+    redis = stream_redis(xread)
+    mocker.patch.object(events, "redis_client", return_value=redis)
+    lifecycle = mocker.patch.object(events, "lifecycle", Lifecycle())
+    request = MagicMock(is_disconnected=AsyncMock(return_value=False))
+
+    async def consume():
+        return [message async for message in events.event_stream(request, None)]
+
+    stream = asyncio.ensure_future(consume())
+    await blocked.wait()
+    lifecycle.begin_drain()
+
+    assert await asyncio.wait_for(stream, 1) == []
+    redis.__aexit__.assert_awaited()
+
+
+@pytest.mark.asyncio
+async def test_stream_ends_at_its_maximum_lifetime(mocker):
+    """Past USER_EVENTS_SSE_MAX_SECONDS the client is sent away to reconnect"""
+    redis = stream_redis(AsyncMock(return_value=[]))
+    mocker.patch.object(events, "redis_client", return_value=redis)
+    mocker.patch.object(events, "lifecycle", Lifecycle())
+    mocker.patch.object(events.settings, "USER_EVENTS_SSE_MAX_SECONDS", 0)
+    request = MagicMock(is_disconnected=AsyncMock(return_value=False))
+
+    assert [message async for message in events.event_stream(request, None)] == []
+    redis.xread.assert_not_called()
@@ -0,0 +1,73 @@
+"""
+Unit tests for the admin user search query and cursor handling.
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+from fastapi import HTTPException
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.users.repository import build_search_query
+from app.users.services import AdminService
+
+
+def sql(stmt):
+    return str(stmt.compile(dialect=asyncpg.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def test_long_terms_match_substrings():
+    """3+ characters use the trigram-friendly '%term%' pattern on all three columns"""
+    query = sql(build_search_query("Smi", 20))
+
+    assert "lower(users.email) LIKE '%smi%'" in query
+    assert "lower(users.name) LIKE '%smi%'" in query
+    assert "lower(users.surname) LIKE '%smi%'" in query
+
+
+def test_short_terms_only_match_prefixes():
+    """Shorter terms can't use trigrams and only prefix match"""
+    query = sql(build_search_query("li", 20))
+
+    assert "LIKE 'li%'" in query
+    assert "'%li%'" not in query
+
+
+def test_like_wildcards_are_escaped():
+    """User input can't inject LIKE wildcards"""
+    query = sql(build_search_query("a_b%", 20))
+
+    assert "'%a!_b!%%' ESCAPE '!'" in query
+
+
+def test_keyset_cursor_adds_row_comparison():
+    """Pages continue after the (rank, id) of the previous page's last row"""
+    last_id = uuid4()
+    query = sql(build_search_query("anna", 20, after=(1, last_id)))
+
+    assert f"> (1, '{last_id}')" in query
+    assert query.rstrip().endswith("LIMIT 20")
+
+
+@pytest.mark.asyncio
+async def test_full_page_returns_cursor():
+    """A full page hands back the cursor of its last row"""
+    users = [MagicMock(id=uuid4()) for _ in range(2)]
+    service = AdminService(AsyncMock())
+    service.repo.search_users = AsyncMock(return_value=[(users[0], 0), (users[1], 2)])
+
+    found, cursor = await service.search_users("anna", limit=2)
+
+    assert found == users
+    assert cursor == f"2:{users[1].id}"
+
+
+@pytest.mark.asyncio
+async def test_invalid_cursor_is_rejected():
+    """Garbage cursors are a 400, not a 500"""
+    service = AdminService(AsyncMock())
+
+    with pytest.raises(HTTPException) as ex:
+        await service.search_users("anna", limit=2, cursor="nope")
+
+    assert ex.value.status_code == 400
@@ -0,0 +1,104 @@
+"""
+Unit tests for the user statistics endpoint service and the reconciliation task.
+"""
+
+import pytest
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock
+
+from app.core import UserRole, UserStatus
+from app.tasks.stats import reconcile_user_stats, reconcile_user_stats_async
+from app.users.services import AdminService
+
+
+@pytest.mark.asyncio
+async def test_stats_aggregate_counter_rows():
+    """Status/role counter rows fold into totals without touching users"""
+    service = AdminService(AsyncMock())
+    service.repo.fetch_status_counts = AsyncMock(
+        return_value=[
+            MagicMock(status=UserStatus.PENDING, role=UserRole.USER, count=3),
+            MagicMock(status=UserStatus.VERIFIED, role=UserRole.USER, count=10),
+            MagicMock(status=UserStatus.VERIFIED, role=UserRole.ADMIN, count=2),
+        ]
+    )
+    service.repo.fetch_signups_since = AsyncMock(
+        return_value=[MagicMock(day=date(2025, 10, 20), signups=4)]
+    )
+
+    stats = await service.get_stats(days=7)
+
+    assert stats["total"] == 15
+    assert stats["by_status"] == {UserStatus.PENDING: 3, UserStatus.VERIFIED: 12}
+    assert stats["by_role"] == {UserRole.USER: 13, UserRole.ADMIN: 2}
+    assert stats["signups_per_day"] == [{"day": date(2025, 10, 20), "signups": 4}]
+
+
+def make_session(mocker, drift_rows, missing_days=()):
+    mock_session = AsyncMock()
+
+    async def execute(stmt, params=None):
+        sql = str(stmt)
+        if "FULL JOIN" in sql:
+            return iter(drift_rows)
+        if "LEFT JOIN user_signups_daily" in sql:
+            return iter(missing_days)
+        return MagicMock()
+
+    mock_session.execute = AsyncMock(side_effect=execute)
+    mock_session.__aenter__ = AsyncMock(return_value=mock_session)
+    mock_session.__aexit__ = AsyncMock(return_value=None)
+    mocker.patch("app.tasks.stats.AsyncSessionLocal", return_value=mock_session)
+    return mock_session
+
+
+def writes(mock_session):
+    return {
+        str(c.args[0]).split("(")[0].strip(): c.args[1]
+        for c in mock_session.execute.call_args_list
+        if str(c.args[0]).lstrip().startswith("INSERT")
+    }
+
+
+@pytest.mark.asyncio
+async def test_reconcile_reads_one_snapshot_without_locking(mocker):
+    """Both recounts run in a REPEATABLE READ snapshot, nothing is locked"""
+    mock_session = make_session(mocker, [])
+
+    result = await reconcile_user_stats_async()
+
+    assert result == {"drift": {}, "signup_days_fixed": 0}
+    mock_session.connection.assert_called_once_with(
+        execution_options={"isolation_level": "REPEATABLE READ"}
+    )
+    statements = [str(c.args[0]) for c in mock_session.execute.call_args_list]
+    assert not any("LOCK" in s for s in statements)
+    assert writes(mock_session) == {}
+
+
+@pytest.mark.asyncio
+async def test_reconcile_applies_drift_as_deltas(mocker):
+    """Drift is reported and added to the counters, which may have moved since"""
+    mock_session = make_session(
+        mocker,
+        [MagicMock(status="pending", role="user", stored=5, actual=3)],
+        [MagicMock(day=date(2025, 10, 20), missing=2)],
+    )
+
+    result = await reconcile_user_stats_async()
+
+    assert result == {"drift": {"pending/user": -2}, "signup_days_fixed": 1}
+    assert writes(mock_session) == {
+        "INSERT INTO user_status_counts": [{"status": "pending", "role": "user", "delta": -2}],
+        "INSERT INTO user_signups_daily": [{"day": date(2025, 10, 20), "missing": 2}],
+    }
+    assert mock_session.commit.call_count == 2
+
+
+def test_reconcile_celery_task_error(mocker):
+    """The Celery wrapper reports errors instead of raising"""
+    mocker.patch("app.tasks.stats.asyncio.run", side_effect=Exception("db down"))
+
+    result = reconcile_user_stats()
+
+    assert result == {"status": "error", "message": "db down"}